@@ -0,0 +1,212 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+from typing import Any
+
+CACHE_FILE_NAME = "ai_review_cache.sqlite3"
+
+
+def git_blob_sha(text: str) -> str:
+    """
+    Compute the Git blob SHA-1 of the given text.
+
+    The value matches ``git hash-object`` for the same content, so a cache entry
+    keyed by it is shared between commits that contain identical blobs.
+
+    :param text: The file content.
+    :return: The hex digest of the blob.
+    """
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()  # noqa: S324
+
+
+class ReviewCache:
+    """
+    Persistent SQLite cache of LLM reviews keyed by content and prompt fingerprint.
+
+    Next to the reviews it counts how often the review of each file was flagged,
+    which ranks the files of later runs by risk.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int = 5000,
+        max_age_days: float = 30.0,
+    ):
+        """
+        Initialize the ReviewCache.
+
+        The database is opened lazily on first use and expired entries are evicted at that point.
+
+        :param path: Path to the SQLite database file.
+        :param max_entries: The maximum number of reviews to keep; the least recently used ones are evicted first.
+        :param max_age_days: Reviews and flagged reviews older than this number of days are evicted.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.saved_seconds = 0.0
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_repo(cls, repo_path: str | Path) -> "ReviewCache | None":
+        """
+        Create a cache stored inside the ``.git`` directory of the repository.
+
+        :param repo_path: Path to the root of the Git working tree.
+        :return: A ReviewCache, or None if the repository has no ``.git`` directory.
+        """
+        git_dir = Path(repo_path) / ".git"
+        if not git_dir.is_dir():
+            return None
+        return cls(git_dir / CACHE_FILE_NAME)
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """
+        Build a cache key from the values that influence a review.
+
+        :param parts: Blob hashes, model settings and prompt fingerprint.
+        :return: A hex digest identifying the review.
+        """
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS reviews ("
+                "key TEXT PRIMARY KEY, review TEXT NOT NULL, tokens INTEGER NOT NULL, "
+                "seconds REAL NOT NULL, created_at REAL NOT NULL, last_used_at REAL NOT NULL)",
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS flagged_reviews (path TEXT NOT NULL, "
+                "review_sha TEXT NOT NULL, flagged_at REAL NOT NULL, PRIMARY KEY (path, review_sha))",
+            )
+            self._evict(self._connection)
+        return self._connection
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.max_age_days * 86400
+        with connection:
+            connection.execute("DELETE FROM reviews WHERE created_at < ?", (cutoff,))
+            connection.execute(
+                "DELETE FROM flagged_reviews WHERE flagged_at < ?",
+                (cutoff,),
+            )
+            connection.execute(
+                "DELETE FROM reviews WHERE key NOT IN "
+                "(SELECT key FROM reviews ORDER BY last_used_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def get(self, key: str) -> str | None:
+        """
+        Return the cached review for the key and update the hit/miss counters.
+
+        :param key: A key built with make_key.
+        :return: The cached review, or None on a miss.
+        """
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT review, tokens, seconds FROM reviews WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with connection:
+                connection.execute(
+                    "UPDATE reviews SET last_used_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            self.hits += 1
+            self.saved_tokens += row[1]
+            self.saved_seconds += row[2]
+            return row[0]
+
+    def set(self, key: str, review: str, tokens: int = 0, seconds: float = 0.0) -> None:
+        """
+        Store a review.
+
+        :param key: A key built with make_key.
+        :param review: The review returned by the LLM.
+        :param tokens: The number of prompt tokens the review cost.
+        :param seconds: How long the LLM took to produce the review.
+        """
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, review, tokens, seconds, now, now),
+                )
+
+    def record_flagged(self, reviews: Mapping[str, str]) -> None:
+        """
+        Remember the reviews that had serious findings.
+
+        A review is counted once however often it is returned, so reviewing the
+        same commit again does not make its files look riskier.
+
+        :param reviews: The flagged reviews keyed by file path.
+        """
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO flagged_reviews VALUES (?, ?, ?)",
+                    [
+                        (path, hashlib.sha256(review.encode()).hexdigest(), now)
+                        for path, review in reviews.items()
+                    ],
+                )
+
+    def flag_counts(self, paths: Iterable[str]) -> dict[str, int]:
+        """
+        Return how often the reviews of files were flagged.
+
+        :param paths: The paths of the files.
+        :return: The number of flagged reviews of each file flagged at least once.
+        """
+        paths = list(paths)
+        with self._lock:
+            connection = self._connect()
+            return dict(
+                connection.execute(
+                    "SELECT path, COUNT(*) FROM flagged_reviews WHERE path IN "
+                    "(SELECT value FROM json_each(?)) GROUP BY path",
+                    (json.dumps(paths),),
+                ),
+            )
+
+    def reset_counters(self) -> None:
+        """Reset the hit/miss counters and savings, for a cache reused for several runs."""
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.saved_seconds = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ReviewCache(path='{self.path}', hits={self.hits}, misses={self.misses})"
+        )
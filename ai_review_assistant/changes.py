@@ -0,0 +1,254 @@
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Literal, NamedTuple
+
+from git import Diff, Repo
+from git.objects import Blob, Commit
+
+from ai_review_assistant.ignore import PathFilter
+
+# Files larger than this are generated code, bundles or data rather than something to review
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+
+# Git itself treats a file as binary if a NUL byte occurs in its first 8000 bytes
+BINARY_SNIFF_BYTES = 8000
+
+# The object id git prints for the missing side of an added or deleted file
+NULL_SHA = "0" * 40
+
+# The tree with no files, which the index of a repository without commits is compared with
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# Submodules are commits of another repository, with no blob to read
+GITLINK_MODE = "160000"
+
+# Options of the raw diff: NUL separated, full object ids, renames detected as GitPython does
+RAW_DIFF_OPTIONS = ("--raw", "-z", "-M", "--abbrev=40", "--full-index", "--no-color")
+
+# GitPython reads objects through a single `git cat-file --batch` process per
+# repository, which interleaves the output when several threads read at once
+_BLOB_READ_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class FileChange:
+    """
+    A changed file whose content is read from Git only when it is reviewed.
+
+    Records are cheap to create and hold no file content, so the changes of a
+    whole commit range can be listed up front while at most one file per worker
+    is in memory. Added files have no content before changes, and renamed files
+    keep their previous path in ``old_path``. ``size`` is the size in bytes of
+    the larger version of the file, known without reading it.
+    """
+
+    path: str
+    read_before: Callable[[], bytes] = field(repr=False, compare=False)
+    read_after: Callable[[], bytes] = field(repr=False, compare=False)
+    skip_reason: str | None = None
+    change_type: Literal["A", "D", "M", "R"] = "M"
+    old_path: str | None = None
+    size: int = field(default=0, compare=False)
+
+    @property
+    def before(self) -> str:
+        return self.read_before().decode("utf-8", errors="replace")
+
+    @property
+    def after(self) -> str:
+        return self.read_after().decode("utf-8", errors="replace")
+
+    @classmethod
+    def from_text(cls, path: str, before: str, after: str) -> "FileChange":
+        """
+        Create a change record from content that is already in memory.
+
+        :param path: The path of the file.
+        :param before: The code before changes.
+        :param after: The code after changes.
+        :return: A change record returning the given content.
+        """
+        return cls(
+            path,
+            before.encode,
+            after.encode,
+            size=max(len(before.encode()), len(after.encode())),
+        )
+
+
+class RawDiff(NamedTuple):
+    """
+    The change of one file as listed by git's raw diff format.
+
+    It has the attributes of GitPython's ``Diff`` that ``iter_file_changes`` uses,
+    but costs only the parsing of one record, while every GitPython ``Diff``
+    loads the submodules of the repository.
+    """
+
+    change_type: str
+    a_path: str | None
+    b_path: str | None
+    a_blob: Blob | None
+    b_blob: Blob | None
+
+
+def diff_commits(previous_commit: Commit, current_commit: Commit) -> list[RawDiff]:
+    """
+    List the changed files between two commits, like ``previous_commit.diff(current_commit)``.
+
+    :param previous_commit: The commit the changes are compared with.
+    :param current_commit: The commit containing the changes.
+    :return: The changes, in the order of git.
+    """
+    repo = current_commit.repo
+    output = repo.git.diff_tree(
+        "-r",
+        *RAW_DIFF_OPTIONS,
+        previous_commit.hexsha,
+        current_commit.hexsha,
+    )
+    return parse_raw_diff(repo, output)
+
+
+def diff_staged(repo: Repo) -> list[RawDiff]:
+    """
+    List the files changed in the index compared with HEAD, like ``git diff --cached``.
+
+    Before the first commit, when HEAD does not exist yet, every staged file is added.
+
+    :param repo: The repository.
+    :return: The changes, in the order of git.
+    """
+    head = "HEAD" if repo.head.is_valid() else EMPTY_TREE_SHA
+    return parse_raw_diff(
+        repo,
+        repo.git.diff_index("--cached", *RAW_DIFF_OPTIONS, head),
+    )
+
+
+def parse_raw_diff(repo: Repo, output: str) -> list[RawDiff]:
+    """
+    Parse the output of a git diff command run with RAW_DIFF_OPTIONS.
+
+    Every record is a ``:`` line of modes, object ids and status, followed by the
+    path, or by the old and new paths of a rename or copy.
+
+    :param repo: The repository the objects belong to.
+    :param output: The output of the command.
+    :return: The changes, in the order of the output.
+    """
+    diffs = []
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields):
+        meta = fields[i].lstrip("\n")
+        i += 1
+        if not meta.startswith(":"):
+            continue
+        a_mode, b_mode, a_sha, b_sha, status = meta[1:].split(" ", 4)
+        a_path = b_path = fields[i]
+        i += 1
+        if status[0] in ("R", "C"):
+            b_path = fields[i]
+            i += 1
+        diffs.append(
+            RawDiff(
+                status[0],
+                a_path,
+                b_path,
+                _blob(repo, a_sha, a_mode, a_path),
+                _blob(repo, b_sha, b_mode, b_path),
+            ),
+        )
+    return diffs
+
+
+def _blob(repo: Repo, sha: str, mode: str, path: str) -> Blob | None:
+    if sha == NULL_SHA or mode == GITLINK_MODE:
+        return None
+    return Blob(repo, bytes.fromhex(sha), int(mode, 8), path)
+
+
+def _read_blob(blob: Blob) -> bytes:
+    with _BLOB_READ_LOCK:
+        return blob.data_stream.read()
+
+
+def _no_content() -> bytes:
+    return b""
+
+
+def _is_binary(blob: Blob) -> bool:
+    # Only the start of the blob is read, the rest of the stream is discarded unread
+    with _BLOB_READ_LOCK:
+        return b"\0" in blob.data_stream.read(BINARY_SNIFF_BYTES)
+
+
+def _skip_reason(blobs: list[Blob], max_file_bytes: int) -> str | None:
+    # The size comes from the object header, so oversized blobs are never read
+    size = max(blob.size for blob in blobs)
+    if size > max_file_bytes:
+        return f"file too large ({size} bytes, limit {max_file_bytes})"
+    if any(_is_binary(blob) for blob in blobs):
+        return "binary file"
+    return None
+
+
+def iter_file_changes(
+    diff_index: Iterable[Diff] | Iterable[RawDiff],
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    path_filter: PathFilter | None = None,
+) -> Iterator[FileChange]:
+    """
+    Yield a change record for each added, deleted, modified or renamed file of a diff.
+
+    Files larger than ``max_file_bytes`` or containing a NUL byte near the start
+    are yielded with a ``skip_reason`` instead of being read. Deleted files are
+    always skipped, since there is nothing left to review. Files not selected by
+    ``path_filter`` are left out by their path alone, before any blob is touched.
+
+    :param diff_index: The diff between two trees, or between a tree and the index.
+    :param max_file_bytes: The maximum size of either version of a reviewed file.
+    :param path_filter: The filter selecting the files to review, or None for all files.
+    :return: An iterator of change records.
+    """
+    for diff in diff_index:
+        path = diff.b_path or diff.a_path
+        if path_filter is not None and path and not path_filter.includes(path):
+            continue
+        if diff.change_type == "A" and diff.b_blob is not None and diff.b_path:
+            yield FileChange(
+                path=diff.b_path,
+                read_before=_no_content,
+                read_after=partial(_read_blob, diff.b_blob),
+                skip_reason=_skip_reason([diff.b_blob], max_file_bytes),
+                change_type="A",
+                size=diff.b_blob.size,
+            )
+        elif diff.change_type == "D" and diff.a_path:
+            yield FileChange(
+                path=diff.a_path,
+                read_before=_no_content,
+                read_after=_no_content,
+                skip_reason="file deleted",
+                change_type="D",
+            )
+        elif (
+            diff.change_type in ("M", "R")
+            and diff.a_blob is not None
+            and diff.b_blob is not None
+            and diff.a_path
+            and diff.b_path
+        ):
+            renamed = diff.change_type == "R"
+            yield FileChange(
+                path=diff.b_path,
+                read_before=partial(_read_blob, diff.a_blob),
+                read_after=partial(_read_blob, diff.b_blob),
+                skip_reason=_skip_reason([diff.a_blob, diff.b_blob], max_file_bytes),
+                change_type="R" if renamed else "M",
+                old_path=diff.a_path if renamed else None,
+                size=max(diff.a_blob.size, diff.b_blob.size),
+            )
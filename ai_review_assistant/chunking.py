@@ -0,0 +1,214 @@
+import difflib
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from itertools import accumulate
+
+# Top-level declarations in the languages we review most often. A chunk boundary
+# placed right before one of them keeps functions and classes in one piece.
+DECLARATION_PATTERN = re.compile(
+    r"^(?:@|(?:async\s+)?def\s|class\s|function\s|func\s|fn\s|pub\s|impl\s|struct\s|"
+    r"interface\s|enum\s|type\s|export\s|public\s|private\s|protected\s|const\s|module\s)",
+)
+
+
+@dataclass(frozen=True)
+class CodeChunk:
+    """Matching regions of the code before and after changes."""
+
+    before: str
+    after: str
+    before_lines: tuple[int, int]
+    after_lines: tuple[int, int]
+
+
+def _is_declaration_start(lines: list[str], index: int) -> bool:
+    if index == 0 or index >= len(lines):
+        return index == 0
+    if not DECLARATION_PATTERN.match(lines[index]):
+        return False
+    # Keep decorators attached to the definition that follows them
+    previous = next(
+        (line for line in reversed(lines[:index]) if line.strip()),
+        "",
+    )
+    return not previous.startswith("@")
+
+
+def _take_lines(costs: list[int], start: int, stop: int, budget: int) -> int:
+    end = start
+    used = 0
+    while end < stop and used + costs[end] <= budget:
+        used += costs[end]
+        end += 1
+    return end
+
+
+def _find_cut(
+    cut_points: list[tuple[int, int, bool]],
+    cost: Callable[[int, int], int],
+    max_tokens: int,
+) -> tuple[int, int] | None:
+    best: tuple[int, int] | None = None
+    best_declaration: tuple[int, int] | None = None
+    for i, j, is_declaration in cut_points:
+        point_cost = cost(i, j)
+        if point_cost > max_tokens:
+            break
+        best = (i, j)
+        if is_declaration and point_cost * 2 >= max_tokens:
+            best_declaration = (i, j)
+
+    if best is None or best == cut_points[-1][:2]:
+        return best
+    return best_declaration or best
+
+
+def chunk_changes(
+    before_code: str,
+    after_code: str,
+    count_tokens: Callable[[str], int],
+    max_tokens: int,
+    count_tokens_batch: Callable[[list[str]], list[int]] | None = None,
+) -> list[CodeChunk]:
+    """
+    Split the code before and after changes into aligned chunks that fit a token budget.
+
+    Chunks are cut only where both versions are identical, so every chunk pairs a
+    region of the old code with the matching region of the new code. Cuts right
+    before a top-level function or class are preferred over arbitrary lines.
+    A changed region that does not fit the budget on its own is split by lines.
+
+    :param before_code: The code before changes.
+    :param after_code: The code after changes.
+    :param count_tokens: Function returning the number of tokens in a text.
+    :param max_tokens: The maximum number of code tokens in one chunk, before and after combined.
+    :param count_tokens_batch: Optional function counting the tokens of many lines at once.
+    :return: The list of chunks, in file order.
+    """
+    before_lines = before_code.splitlines(keepends=True)
+    after_lines = after_code.splitlines(keepends=True)
+    if count_tokens_batch is not None:
+        before_costs = count_tokens_batch(before_lines)
+        after_costs = count_tokens_batch(after_lines)
+    else:
+        before_costs = [count_tokens(line) for line in before_lines]
+        after_costs = [count_tokens(line) for line in after_lines]
+    before_offsets = [0, *accumulate(before_costs)]
+    after_offsets = [0, *accumulate(after_costs)]
+
+    # Positions where both versions can be cut without separating matching code
+    cut_points: list[tuple[int, int, bool]] = []
+    matcher = difflib.SequenceMatcher(None, before_lines, after_lines, autojunk=False)
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == "equal":
+            cut_points.extend(
+                (i, j1 + i - i1, _is_declaration_start(before_lines, i))
+                for i in range(i1, i2 + 1)
+            )
+    cut_points.append((len(before_lines), len(after_lines), True))
+
+    chunks: list[CodeChunk] = []
+    start_before, start_after = 0, 0
+    first = 0
+    while start_before < len(before_lines) or start_after < len(after_lines):
+        while (
+            cut_points[first][0] <= start_before and cut_points[first][1] <= start_after
+        ):
+            first += 1
+
+        def cost(
+            i: int,
+            j: int,
+            from_before: int = start_before,
+            from_after: int = start_after,
+        ) -> int:
+            return (
+                before_offsets[i]
+                - before_offsets[from_before]
+                + after_offsets[j]
+                - after_offsets[from_after]
+            )
+
+        cut = _find_cut(cut_points[first:], cost, max_tokens)
+        if cut is not None:
+            end_before, end_after = cut
+        else:
+            # The next changed region alone exceeds the budget, so split it by lines
+            stop_before, stop_after, _ = cut_points[first]
+            end_before = _take_lines(
+                before_costs,
+                start_before,
+                stop_before,
+                max_tokens // 2,
+            )
+            end_after = _take_lines(
+                after_costs,
+                start_after,
+                stop_after,
+                max_tokens - cost(end_before, start_after),
+            )
+            if (end_before, end_after) == (start_before, start_after):
+                # A single line larger than the whole budget still has to be sent
+                if start_before < stop_before:
+                    end_before += 1
+                else:
+                    end_after += 1
+
+        chunks.append(
+            CodeChunk(
+                before="".join(before_lines[start_before:end_before]),
+                after="".join(after_lines[start_after:end_after]),
+                before_lines=(start_before + 1, end_before),
+                after_lines=(start_after + 1, end_after),
+            ),
+        )
+        start_before, start_after = end_before, end_after
+
+    return chunks
+
+
+def pack_hunks(
+    hunks: list[str],
+    count_tokens: Callable[[str], int],
+    max_tokens: int,
+) -> list[list[str]]:
+    """
+    Group diff hunks into batches that fit a token budget.
+
+    Hunks stay whole whenever possible. A hunk larger than the budget is split by
+    lines, and every piece after the first repeats the hunk's ``@@`` header.
+
+    :param hunks: The hunks of a unified diff, as returned by split_hunks.
+    :param count_tokens: Function returning the number of tokens in a text.
+    :param max_tokens: The maximum number of tokens in one batch.
+    :return: The list of batches, each a list of hunks.
+    """
+    pieces: list[tuple[str, int]] = []
+    for hunk in hunks:
+        hunk_tokens = count_tokens(hunk)
+        if hunk_tokens <= max_tokens:
+            pieces.append((hunk, hunk_tokens))
+            continue
+        header, *lines = hunk.split("\n")
+        header_tokens = count_tokens(header)
+        piece: list[str] = [header]
+        piece_tokens = header_tokens
+        for line in lines:
+            line_tokens = count_tokens(line)
+            if len(piece) > 1 and piece_tokens + line_tokens > max_tokens:
+                pieces.append(("\n".join(piece), piece_tokens))
+                piece, piece_tokens = [header], header_tokens
+            piece.append(line)
+            piece_tokens += line_tokens
+        pieces.append(("\n".join(piece), piece_tokens))
+
+    batches: list[list[str]] = []
+    batch_tokens = 0
+    for text, tokens in pieces:
+        if not batches or batch_tokens + tokens > max_tokens:
+            batches.append([])
+            batch_tokens = 0
+        batches[-1].append(text)
+        batch_tokens += tokens
+    return batches
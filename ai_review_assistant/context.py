@@ -0,0 +1,100 @@
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+from ai_review_assistant.ignore import PathFilter
+
+
+def _mtime(path: Path) -> float | None:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+class ReviewContext:
+    """
+    Values that are the same for every file and chunk reviewed in one run.
+
+    The project structure, the prompt template and the path filter are computed
+    on first use and reused afterwards. Each value is recomputed when the
+    modification time of the path it depends on changes, so a long-lived context
+    never serves stale data after pyproject.toml is edited or files are added to
+    the repository root. Files added in subdirectories do not change that time,
+    so a context reused across runs is invalidated at the start of every run.
+    """
+
+    def __init__(
+        self,
+        repo_path: str,
+        scan_structure: Callable[[str, int], str],
+        read_template: Callable[[], str | None],
+        read_path_filter: Callable[[bool], PathFilter] | None = None,
+    ):
+        """
+        Initialize the ReviewContext.
+
+        :param repo_path: Path to the Git repository.
+        :param scan_structure: Function building the project structure for a path and depth.
+        :param read_template: Function reading the custom prompt template, if any.
+        :param read_path_filter: Function reading the include and exclude patterns, with or without the settings files.
+        """
+        self.repo_path = repo_path
+        self._scan_structure = scan_structure
+        self._read_template = read_template
+        self._read_path_filter = read_path_filter or (lambda _: PathFilter())
+        self._lock = threading.Lock()
+        self._structures: dict[int, tuple[float | None, str]] = {}
+        self._template: tuple[float | None, str | None] | None = None
+        self._path_filters: dict[bool, tuple[float | None, PathFilter]] = {}
+
+    def project_structure(self, depth: int) -> str:
+        """
+        Get the project structure of the repository, scanning it only when needed.
+
+        :param depth: The depth of the structure to return.
+        :return: The project structure up to the given depth.
+        """
+        if depth == 0:
+            return ""
+        mtime = _mtime(Path(self.repo_path))
+        with self._lock:
+            cached = self._structures.get(depth)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, self._scan_structure(self.repo_path, depth))
+                self._structures[depth] = cached
+            return cached[1]
+
+    def prompt_template(self) -> str | None:
+        """
+        Get the custom prompt template from pyproject.toml, parsing it only when needed.
+
+        :return: The template, or None if the repository does not define one.
+        """
+        mtime = _mtime(Path(self.repo_path) / "pyproject.toml")
+        with self._lock:
+            if self._template is None or self._template[0] != mtime:
+                self._template = (mtime, self._read_template())
+            return self._template[1]
+
+    def path_filter(self, ignore_settings_files: bool) -> PathFilter:
+        """
+        Get the filter selecting the files to review, compiling it only when needed.
+
+        :param ignore_settings_files: Whether settings and config files are excluded too.
+        :return: The path filter.
+        """
+        mtime = _mtime(Path(self.repo_path) / "pyproject.toml")
+        with self._lock:
+            cached = self._path_filters.get(ignore_settings_files)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, self._read_path_filter(ignore_settings_files))
+                self._path_filters[ignore_settings_files] = cached
+            return cached[1]
+
+    def invalidate(self) -> None:
+        """Forget the memoized values so the next access recomputes them."""
+        with self._lock:
+            self._structures.clear()
+            self._template = None
+            self._path_filters.clear()
@@ -0,0 +1,546 @@
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+import click
+
+from ai_review_assistant import __version__
+from ai_review_assistant.cache import ReviewCache
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.diff import TokenSavings
+from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.runner import ReviewResult, iter_reviews
+from ai_review_assistant.state import ReviewState
+from ai_review_assistant.stats import CallStats, FileStats, ReviewStats
+from ai_review_assistant.usage import PromptCacheUsage
+
+SOCKET_FILE_NAME = "ai_review_assistant.sock"
+
+# A daemon started by the CLI exits after this many seconds without requests
+DEFAULT_IDLE_TIMEOUT = 3600.0
+
+# How long the CLI waits for a daemon it started to accept connections
+START_TIMEOUT = 10.0
+
+Message = dict[str, Any]
+
+
+class DaemonError(Exception):
+    """The review daemon could not be reached or failed to handle a request."""
+
+
+def default_socket_path() -> Path:
+    """
+    Get the socket path of the current user's review daemon.
+
+    :return: A path in ``$XDG_RUNTIME_DIR``, or in the temporary directory with the user id in its name.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / SOCKET_FILE_NAME
+    return Path(tempfile.gettempdir()) / f"ai_review_assistant-{os.getuid()}.sock"
+
+
+def check_socket_owner(socket_path: str | Path) -> None:
+    """
+    Check that a socket was created by the current user's daemon before talking to it.
+
+    The socket may be in a directory shared by all users, where another user could
+    bind the path first and receive the API key and source code sent to the daemon.
+
+    :param socket_path: Path of the Unix socket the daemon listens on.
+    :raises DaemonError: If the path is not a socket owned by the current user, or other users can access it.
+    """
+    try:
+        status = os.lstat(socket_path)
+    except FileNotFoundError as e:
+        raise DaemonError(f"No review daemon is listening on {socket_path}") from e
+    if (
+        not stat.S_ISSOCK(status.st_mode)
+        or status.st_uid != os.getuid()
+        or stat.S_IMODE(status.st_mode) & 0o077
+    ):
+        raise DaemonError(
+            f"{socket_path} is not a socket of the current user with mode 0600",
+        )
+
+
+def create_assistant(repo_path: str, settings: dict[str, Any]) -> CodeReviewAssistant:
+    """
+    Create an assistant from the settings sent by a client.
+
+    :param repo_path: Path to the Git repository.
+    :param settings: CodeReviewAssistant arguments, with ``cache`` and ``incremental`` as flags.
+    :return: The assistant, using the review cache and state of the repository if enabled.
+    """
+    options = dict(settings)
+    cache = options.pop("cache", False)
+    incremental = options.pop("incremental", False)
+    return CodeReviewAssistant(
+        repo_path=repo_path,
+        cache=ReviewCache.for_repo(repo_path) if cache else None,
+        review_state=ReviewState.for_repo(repo_path) if incremental else None,
+        **options,
+    )
+
+
+def run_report(assistant: CodeReviewAssistant) -> Message:
+    """
+    Collect the measurements of the last run of an assistant.
+
+    :param assistant: The assistant that reviewed the files.
+    :return: The stats, token savings, prompt cache usage and cache counters as JSON values.
+    """
+    cache = assistant.cache
+    review_state = assistant.review_state
+    return {
+        "calls": [asdict(call) for call in assistant.stats.calls],
+        "files": [asdict(file_stats) for file_stats in assistant.stats.files],
+        "token_savings": {
+            "full_file_tokens": assistant.token_savings.full_file_tokens,
+            "sent_tokens": assistant.token_savings.sent_tokens,
+        },
+        "prompt_cache_usage": {
+            "prompt_tokens": assistant.prompt_cache_usage.prompt_tokens,
+            "cached_tokens": assistant.prompt_cache_usage.cached_tokens,
+            "cache_write_tokens": assistant.prompt_cache_usage.cache_write_tokens,
+        },
+        "cache": (
+            None
+            if cache is None
+            else [cache.hits, cache.misses, cache.saved_tokens, cache.saved_seconds]
+        ),
+        "review_state": (
+            None if review_state is None else [review_state.hits, review_state.misses]
+        ),
+    }
+
+
+def apply_run_report(assistant: CodeReviewAssistant, report: Message) -> None:
+    """
+    Copy the measurements of a run made by the daemon to the client's assistant.
+
+    The CLI then reports stats and savings the same way as for a run in its own process.
+
+    :param assistant: The client's assistant.
+    :param report: The report built by run_report.
+    """
+    assistant.stats = ReviewStats(
+        calls=[CallStats(**call) for call in report["calls"]],
+        files=[FileStats(**file_stats) for file_stats in report["files"]],
+    )
+    assistant.token_savings = TokenSavings(**report["token_savings"])
+    assistant.prompt_cache_usage = PromptCacheUsage(**report["prompt_cache_usage"])
+    if assistant.cache is not None and report["cache"] is not None:
+        (
+            assistant.cache.hits,
+            assistant.cache.misses,
+            assistant.cache.saved_tokens,
+            assistant.cache.saved_seconds,
+        ) = report["cache"]
+    if assistant.review_state is not None and report["review_state"] is not None:
+        assistant.review_state.hits, assistant.review_state.misses = report[
+            "review_state"
+        ]
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, review_daemon: "ReviewDaemon"):
+        self.review_daemon = review_daemon
+        super().__init__(socket_path, _DaemonRequestHandler)
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    server: _DaemonServer
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        # Tokens are streamed from the review workers while results come from this thread
+        lock = threading.Lock()
+
+        def send(message: Message) -> None:
+            with lock:
+                self.wfile.write(json.dumps(message).encode() + b"\n")
+
+        review_daemon = self.server.review_daemon
+        review_daemon.request_started()
+        try:
+            review_daemon.handle(json.loads(line), send)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, there is nobody left to tell
+            pass
+        except Exception as e:
+            with contextlib.suppress(OSError):
+                send({"event": "failed", "error": f"{type(e).__name__}: {e}"})
+        finally:
+            review_daemon.request_finished()
+
+
+class ReviewDaemon:
+    """
+    Long-lived local server reviewing changes for CLI clients over a Unix socket.
+
+    Every ``ai_review_assistant review`` otherwise starts a new process that imports
+    LangChain, opens new TLS connections and loads the tokenizer before the first
+    request. The daemon keeps one CodeReviewAssistant per repository and settings,
+    with its chat model and HTTP connection pool, tokenizer, token counts, review
+    context, rate limiter and review cache, and reuses it for every run. Runs of
+    the same assistant take turns, since each one reports its own measurements.
+    """
+
+    def __init__(self, socket_path: str | Path, idle_timeout: float | None = None):
+        """
+        Initialize the ReviewDaemon.
+
+        :param socket_path: Path of the Unix socket to listen on.
+        :param idle_timeout: Stop after this many seconds without requests, or None to run until stopped.
+        """
+        self.socket_path = Path(socket_path)
+        self.idle_timeout = idle_timeout
+        self.assistants: dict[str, CodeReviewAssistant] = {}
+        self.ready = threading.Event()
+        self._run_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._last_request = time.monotonic()
+        self._server: _DaemonServer | None = None
+
+    def _assistant(
+        self,
+        repo_path: str,
+        settings: dict[str, Any],
+    ) -> tuple[CodeReviewAssistant, threading.Lock]:
+        key = hashlib.sha256(
+            json.dumps([repo_path, settings], sort_keys=True).encode(),
+        ).hexdigest()
+        with self._lock:
+            if key not in self.assistants:
+                self.assistants[key] = create_assistant(repo_path, settings)
+                self._run_locks[key] = threading.Lock()
+            return self.assistants[key], self._run_locks[key]
+
+    def request_started(self) -> None:
+        with self._lock:
+            self._active_requests += 1
+            self._last_request = time.monotonic()
+
+    def request_finished(self) -> None:
+        with self._lock:
+            self._active_requests -= 1
+            self._last_request = time.monotonic()
+
+    def handle(self, request: Message, send: Callable[[Message], None]) -> None:
+        """
+        Handle one request of a client.
+
+        :param request: The request, with a ``command`` of "ping", "stop" or "review".
+        :param send: Function sending a message back to the client.
+        """
+        command = request.get("command")
+        if command == "ping":
+            send({"event": "pong", "version": __version__, "pid": os.getpid()})
+        elif command == "stop":
+            send({"event": "stopping"})
+            self.stop()
+        elif command == "review":
+            self._review(request, send)
+        else:
+            send({"event": "failed", "error": f"Unknown command: {command}"})
+
+    def _review(self, request: Message, send: Callable[[Message], None]) -> None:
+        assistant, run_lock = self._assistant(request["repo_path"], request["settings"])
+        changes = [
+            FileChange(
+                item["path"],
+                item["before"].encode,
+                item["after"].encode,
+                change_type=item["change_type"],
+                old_path=item["old_path"],
+                size=item["size"],
+            )
+            for item in request["changes"]
+        ]
+
+        def send_token(file_path: str, text: str) -> None:
+            send({"event": "token", "path": file_path, "text": text})
+
+        with run_lock:
+            assistant.start_run()
+            results = iter_reviews(
+                assistant,
+                changes,
+                request["workers"],
+                send_token if request["stream_tokens"] else None,
+                request["batch_tokens"],
+                request.get("fail_on"),
+                request.get("deadline"),
+            )
+            for file_path, review, error in results:
+                send(
+                    {
+                        "event": "result",
+                        "path": file_path,
+                        "review": review,
+                        "error": error,
+                    },
+                )
+            send({"event": "done", "report": run_report(assistant)})
+
+    def serve(self) -> None:
+        """
+        Listen on the socket until stopped, or until idle for ``idle_timeout`` seconds.
+
+        A socket file left behind by a daemon that is no longer running is replaced.
+        Only the current user can connect, since requests carry the API key.
+        """
+        if self.socket_path.exists():
+            if DaemonClient(self.socket_path).ping() is not None:
+                raise DaemonError(
+                    f"A review daemon is already listening on {self.socket_path}",
+                )
+            self.socket_path.unlink()
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _DaemonServer(str(self.socket_path), self)
+        finally:
+            os.umask(previous_umask)
+
+        if self.idle_timeout is not None:
+            threading.Thread(target=self._stop_when_idle, daemon=True).start()
+        self.ready.set()
+        try:
+            self._server.serve_forever(poll_interval=0.2)
+        finally:
+            self._server.server_close()
+            self._server = None
+            with contextlib.suppress(FileNotFoundError):
+                self.socket_path.unlink()
+            for assistant in self.assistants.values():
+                if assistant.cache is not None:
+                    assistant.cache.close()
+                if assistant.review_state is not None:
+                    assistant.review_state.close()
+
+    def _stop_when_idle(self) -> None:
+        assert self.idle_timeout is not None
+        while self._server is not None:
+            time.sleep(min(self.idle_timeout, 1.0))
+            with self._lock:
+                idle = (
+                    self._active_requests == 0
+                    and time.monotonic() - self._last_request >= self.idle_timeout
+                )
+            if idle:
+                self.stop()
+                return
+
+    def stop(self) -> None:
+        """Stop serving, without waiting for the server loop to finish."""
+        server = self._server
+        if server is not None:
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+
+class DaemonClient:
+    """Client of a review daemon, used by the CLI instead of reviewing in its own process."""
+
+    def __init__(self, socket_path: str | Path):
+        """
+        Initialize the DaemonClient.
+
+        :param socket_path: Path of the Unix socket the daemon listens on.
+        """
+        self.socket_path = Path(socket_path)
+
+    def _request(self, request: Message) -> Iterator[Message]:
+        check_socket_owner(self.socket_path)
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(str(self.socket_path))
+        except OSError as e:
+            connection.close()
+            raise DaemonError(
+                f"No review daemon is listening on {self.socket_path}",
+            ) from e
+        with connection, connection.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if message["event"] == "failed":
+                    raise DaemonError(f"The review daemon failed: {message['error']}")
+                yield message
+
+    def ping(self) -> Message | None:
+        """
+        Check whether the daemon is running.
+
+        :return: The daemon's version and process id, or None if it is not running.
+        """
+        try:
+            return next(self._request({"command": "ping"}), None)
+        except DaemonError:
+            return None
+
+    def stop(self) -> None:
+        """Ask the daemon to stop."""
+        with contextlib.suppress(DaemonError):
+            next(self._request({"command": "stop"}), None)
+
+    def iter_reviews(
+        self,
+        settings: dict[str, Any],
+        assistant: CodeReviewAssistant,
+        changes: Sequence[FileChange],
+        workers: int = 1,
+        on_token: Callable[[str, str], None] | None = None,
+        batch_tokens: int = 0,
+        fail_on: str | None = None,
+        deadline: float | None = None,
+    ) -> Iterator[ReviewResult]:
+        """
+        Review the changed files in the daemon and yield each result as soon as it is ready.
+
+        Takes the same arguments as ``iter_reviews`` after the settings. The content
+        of the changes is read here and sent along, and the measurements of the run
+        are copied to ``assistant`` when it finishes.
+
+        :param settings: The settings the daemon creates its assistant with, see create_assistant.
+        :param assistant: The client's assistant, naming the repository and receiving the measurements.
+        :param changes: The changed files to review.
+        :param workers: The maximum number of requests sent at the same time.
+        :param on_token: Optional callback receiving (file_path, text) for every streamed piece of a review.
+        :param batch_tokens: The maximum number of code tokens of a multi-file request, 0 to review every file on its own.
+        :param fail_on: The least severe finding that cancels the remaining reviews, one of SEVERITIES, or None.
+        :param deadline: The number of seconds after which the remaining reviews are cancelled, or None.
+        :return: An iterator of (file_path, review, error) tuples.
+        """
+        request = {
+            "command": "review",
+            "repo_path": str(assistant.repo_path),
+            "settings": settings,
+            "changes": [
+                {
+                    "path": change.path,
+                    "before": change.before,
+                    "after": change.after,
+                    "change_type": change.change_type,
+                    "old_path": change.old_path,
+                    "size": change.size,
+                }
+                for change in changes
+            ],
+            "workers": workers,
+            "batch_tokens": batch_tokens,
+            "fail_on": fail_on,
+            "deadline": deadline,
+            "stream_tokens": on_token is not None,
+        }
+        for message in self._request(request):
+            if message["event"] == "token" and on_token is not None:
+                on_token(message["path"], message["text"])
+            elif message["event"] == "result":
+                yield message["path"], message["review"], message["error"]
+            elif message["event"] == "done":
+                apply_run_report(assistant, message["report"])
+                return
+        raise DaemonError(
+            "The review daemon closed the connection before the run finished",
+        )
+
+
+def connect_or_start(
+    socket_path: str | Path,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    start_timeout: float = START_TIMEOUT,
+) -> DaemonClient:
+    """
+    Connect to the review daemon, starting it in the background if it is not running.
+
+    A daemon of another version, left running across an upgrade, is replaced.
+
+    :param socket_path: Path of the Unix socket the daemon listens on.
+    :param idle_timeout: Seconds without requests after which a started daemon exits.
+    :param start_timeout: Seconds to wait for a started daemon to accept connections.
+    :return: A client of the running daemon.
+    :raises DaemonError: If the socket path is taken by another user, or the daemon could not be started.
+    """
+    if os.path.lexists(socket_path):
+        check_socket_owner(socket_path)
+    client = DaemonClient(socket_path)
+    info = client.ping()
+    if info is not None and info["version"] == __version__:
+        return client
+
+    deadline = time.monotonic() + start_timeout
+    if info is not None:
+        client.stop()
+        while client.ping() is not None:
+            if time.monotonic() > deadline:
+                raise DaemonError(f"The review daemon on {socket_path} did not stop")
+            time.sleep(0.05)
+
+    subprocess.Popen(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "ai_review_assistant.daemon",
+            "--socket",
+            str(socket_path),
+            "--idle-timeout",
+            str(idle_timeout),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # Keep running after the terminal or hook that started it is gone
+        start_new_session=True,
+    )
+    while client.ping() is None:
+        if time.monotonic() > deadline:
+            raise DaemonError(f"The review daemon did not start on {socket_path}")
+        time.sleep(0.05)
+    return client
+
+
+@click.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=default_socket_path,
+    show_default="$XDG_RUNTIME_DIR/ai_review_assistant.sock",
+    help="Unix socket to listen on",
+)
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0),
+    help="Exit after this many seconds without requests (default: run until stopped)",
+)
+def serve(socket_path: Path, idle_timeout: float | None) -> None:
+    """Run the review daemon in the foreground"""
+    try:
+        ReviewDaemon(socket_path, idle_timeout).serve()
+    except DaemonError as e:
+        raise click.ClickException(str(e)) from e
+
+
+if __name__ == "__main__":
+    serve()
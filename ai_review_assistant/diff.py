@@ -0,0 +1,78 @@
+import difflib
+import threading
+from dataclasses import dataclass, field
+
+
+def build_unified_diff(
+    file_path: str,
+    before_code: str,
+    after_code: str,
+    context_lines: int = 3,
+    old_path: str | None = None,
+) -> str:
+    """
+    Build a unified diff between two versions of a file.
+
+    Unchanged regions further than ``context_lines`` from a change are folded away,
+    so the size of the diff follows the size of the change rather than the file.
+
+    :param file_path: The path of the file, used in the diff header.
+    :param before_code: The code before changes.
+    :param after_code: The code after changes.
+    :param context_lines: The number of unchanged lines to keep around each change.
+    :param old_path: The previous path of a renamed file, used in the diff header.
+    :return: The unified diff, or an empty string if the contents are identical.
+    """
+    return "\n".join(
+        difflib.unified_diff(
+            before_code.splitlines(),
+            after_code.splitlines(),
+            fromfile=f"a/{old_path or file_path}",
+            tofile=f"b/{file_path}",
+            n=context_lines,
+            lineterm="",
+        ),
+    )
+
+
+def split_hunks(diff: str) -> tuple[str, list[str]]:
+    """
+    Split a unified diff into its file header and its hunks.
+
+    :param diff: A unified diff produced by build_unified_diff.
+    :return: A tuple of (header, hunks), each hunk starting with its ``@@`` line.
+    """
+    header: list[str] = []
+    hunks: list[list[str]] = []
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            header.append(line)
+    return "\n".join(header), ["\n".join(hunk) for hunk in hunks]
+
+
+@dataclass
+class TokenSavings:
+    """Running total of code tokens sent in diff mode compared with full files."""
+
+    full_file_tokens: int = 0
+    sent_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, full_file_tokens: int, sent_tokens: int) -> None:
+        with self._lock:
+            self.full_file_tokens += full_file_tokens
+            self.sent_tokens += sent_tokens
+
+    def summary(self) -> str:
+        saved = self.full_file_tokens - self.sent_tokens
+        percent = 100 * saved / self.full_file_tokens if self.full_file_tokens else 0.0
+        # The diff of a small file with many changes can be longer than the file
+        comparison = f"{percent:.0f}% fewer" if saved >= 0 else f"{-percent:.0f}% more"
+        return (
+            f"Diff mode sent {self.sent_tokens} code tokens instead of "
+            f"{self.full_file_tokens} for full files ({comparison})"
+        )
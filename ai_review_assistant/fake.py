@@ -0,0 +1,129 @@
+"""
+A deterministic stand-in for a vendor chat model.
+
+The ``fake`` vendor answers every request locally, so the overhead of the review
+pipeline can be measured without network access or an API key. Latency, jitter
+and the error rate are read from environment variables by the vendor backend:
+
+- ``AI_REVIEW_FAKE_LATENCY``: seconds to wait before answering (default 0)
+- ``AI_REVIEW_FAKE_JITTER``: maximum seconds added to or removed from the latency (default 0)
+- ``AI_REVIEW_FAKE_ERROR_RATE``: fraction of requests that fail, from 0 to 1 (default 0)
+- ``AI_REVIEW_FAKE_SEED``: seed of the random latency and failures (default 0)
+
+Asked for structured findings, it reports one for every line of the prompt with a
+comment such as ``# critical: the token is logged``.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models import LanguageModelInput, SimpleChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.pydantic_v1 import BaseModel, PrivateAttr
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from ai_review_assistant.findings import SEVERITIES
+from ai_review_assistant.review import BATCH_FILE_DELIMITER, BATCH_REVIEW_DELIMITER
+
+_BATCH_FILE_PATTERN = re.compile(
+    r"^[ \t]*" + re.escape(BATCH_FILE_DELIMITER).replace(r"\{path\}", "(.+)") + "$",
+    re.MULTILINE,
+)
+_FINDING_COMMENT_PATTERN = re.compile(
+    r"#\s*(" + "|".join(SEVERITIES) + r"):\s*(.+)$",
+    re.MULTILINE,
+)
+
+
+class FakeLLMError(RuntimeError):
+    """A simulated failure of a request to the vendor API, retryable like a rate limit."""
+
+    status_code = 429
+
+
+class FakeReviewChatModel(SimpleChatModel):
+    """
+    Chat model that answers after a simulated latency and sometimes fails.
+
+    The latency and the failures are drawn from a random generator seeded with
+    ``seed``, the prompt and how often it was sent before, so every attempt of a
+    prompt always behaves the same way, whatever the order in which concurrent
+    requests arrive.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    _attempts: dict[str, int] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def from_env(cls) -> "FakeReviewChatModel":
+        return cls(
+            latency=float(os.environ.get("AI_REVIEW_FAKE_LATENCY", "0")),
+            jitter=float(os.environ.get("AI_REVIEW_FAKE_JITTER", "0")),
+            error_rate=float(os.environ.get("AI_REVIEW_FAKE_ERROR_RATE", "0")),
+            seed=int(os.environ.get("AI_REVIEW_FAKE_SEED", "0")),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-review-chat-model"
+
+    def _call(self, messages: Any, *_: Any, **__: Any) -> str:
+        prompt = str(messages[-1].content)
+        self._simulate_request(prompt)
+
+        # Batch prompts are answered file by file, as a real model is asked to
+        paths = _BATCH_FILE_PATTERN.findall(prompt)
+        if not paths:
+            return "The changes look good."
+        return "\n".join(
+            f"{BATCH_REVIEW_DELIMITER.format(path=path)}\nThe changes look good."
+            for path in paths
+        )
+
+    def with_structured_output(
+        self,
+        schema: dict | type,  # noqa: ARG002
+        *,
+        include_raw: bool = False,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> Runnable[LanguageModelInput, dict | BaseModel]:
+        # The answer always follows FINDINGS_SCHEMA, the only schema the assistant asks for
+        def answer(messages: Any) -> dict[str, Any]:
+            prompt = str(messages[-1].content)
+            self._simulate_request(prompt)
+            findings = [
+                {"severity": severity, "message": message.strip()}
+                for severity, message in _FINDING_COMMENT_PATTERN.findall(prompt)
+            ]
+            parsed = {
+                "summary": (
+                    "The changes need work." if findings else "The changes look good."
+                ),
+                "findings": findings,
+            }
+            if not include_raw:
+                return parsed
+            return {
+                "raw": AIMessage(content=""),
+                "parsed": parsed,
+                "parsing_error": None,
+            }
+
+        return RunnableLambda(answer)
+
+    def _simulate_request(self, prompt: str) -> None:
+        with self._lock:
+            attempt = self._attempts.get(prompt, 0)
+            self._attempts[prompt] = attempt + 1
+        rng = random.Random(f"{self.seed}:{prompt}:{attempt}")
+        time.sleep(max(self.latency + rng.uniform(-self.jitter, self.jitter), 0.0))
+        if rng.random() < self.error_rate:
+            raise FakeLLMError("Simulated vendor API error")
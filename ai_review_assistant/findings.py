@@ -0,0 +1,141 @@
+import re
+from dataclasses import asdict, dataclass
+from typing import Any
+
+# From least to most severe
+SEVERITIES = ("info", "minor", "major", "critical")
+
+# Heading of the earlier review appended to an incremental review, whose findings are not current
+EARLIER_REVIEW_HEADING = "Earlier review of this file"
+
+# JSON schema of the answer requested through the chat model's structured output
+FINDINGS_SCHEMA: dict[str, Any] = {
+    "title": "report_review_findings",
+    "description": "Report the findings of the code review of the changes in the request.",
+    "type": "object",
+    "properties": {
+        "summary": {
+            "type": "string",
+            "description": "The overall assessment of the changes in one or two sentences.",
+        },
+        "findings": {
+            "type": "array",
+            "description": "The issues found in the changes, most severe first. Empty if there are none.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "severity": {
+                        "type": "string",
+                        "enum": list(SEVERITIES),
+                        "description": "critical: must be fixed before the change is merged, such as bugs, "
+                        "security issues or data loss; major: should be fixed; minor: worth improving; "
+                        "info: a remark that needs no change.",
+                    },
+                    "line_start": {
+                        "type": "integer",
+                        "description": "The first line of the issue in the file after changes, if it has one.",
+                    },
+                    "line_end": {
+                        "type": "integer",
+                        "description": "The last line of the issue in the file after changes, if it has one.",
+                    },
+                    "message": {
+                        "type": "string",
+                        "description": "The issue and how to fix it.",
+                    },
+                },
+                "required": ["severity", "message"],
+            },
+        },
+    },
+    "required": ["summary", "findings"],
+}
+
+_FINDING_PATTERN = re.compile(
+    r"^- \[(" + "|".join(SEVERITIES) + r")\](?: lines? (\d+)(?:-(\d+))?:)? (.+)$",
+    re.MULTILINE,
+)
+
+
+@dataclass(frozen=True)
+class Finding:
+    """An issue reported by a structured review."""
+
+    path: str
+    severity: str
+    message: str
+    line_start: int | None = None
+    line_end: int | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def format_findings(answer: dict[str, Any]) -> str:
+    """
+    Render the structured answer of the model as the text of a review.
+
+    Every finding gets a line of its own starting with its severity, which
+    parse_findings reads back, so a review can be cached and sent between
+    processes as text without losing its findings.
+
+    :param answer: The answer, as described by FINDINGS_SCHEMA.
+    :return: The summary followed by one line per finding.
+    """
+    lines = [str(answer.get("summary") or "").strip()]
+    findings = answer.get("findings") or []
+    if findings:
+        lines.append("")
+    for finding in findings:
+        severity = str(finding.get("severity", "")).lower()
+        if severity not in SEVERITIES:
+            severity = "info"
+        message = " ".join(str(finding.get("message", "")).split())
+        start, end = finding.get("line_start"), finding.get("line_end")
+        if isinstance(start, int) and isinstance(end, int) and end > start:
+            lines.append(f"- [{severity}] lines {start}-{end}: {message}")
+        elif isinstance(start, int):
+            lines.append(f"- [{severity}] line {start}: {message}")
+        else:
+            lines.append(f"- [{severity}] {message}")
+    return "\n".join(lines).strip()
+
+
+def parse_findings(path: str, review: str) -> list[Finding]:
+    """
+    Read the findings of a review written by format_findings.
+
+    The findings of an earlier review appended to an incremental review are not
+    read. A prose review has no findings.
+
+    :param path: The path of the reviewed file.
+    :param review: The text of the review.
+    :return: The findings, in the order of the review.
+    """
+    review = review.split(f"\n\n{EARLIER_REVIEW_HEADING}", 1)[0]
+    return [
+        Finding(
+            path,
+            match.group(1),
+            match.group(4).strip(),
+            int(match.group(2)) if match.group(2) else None,
+            int(match.group(3) or match.group(2)) if match.group(2) else None,
+        )
+        for match in _FINDING_PATTERN.finditer(review)
+    ]
+
+
+def blocking_findings(findings: list[Finding], fail_on: str) -> list[Finding]:
+    """
+    Select the findings at least as severe as a threshold.
+
+    :param findings: The findings to check.
+    :param fail_on: The least severe severity that blocks, one of SEVERITIES.
+    :return: The findings of that severity or a more severe one.
+    """
+    threshold = SEVERITIES.index(fail_on)
+    return [
+        finding
+        for finding in findings
+        if SEVERITIES.index(finding.severity) >= threshold
+    ]
@@ -10,8 +10,8 @@ def install_pre_commit_hook() -> NoReturn:
         exit 0
     fi
 
-    # Run the Python script for analysis
-    ai_review_assistant review
+    # Review the changes staged for this commit
+    ai_review_assistant review --staged
 
     # Check the script execution status
     if [ $? -ne 0 ]; then
@@ -0,0 +1,159 @@
+import re
+from collections.abc import Sequence
+
+# Settings, documentation and dot files, skipped unless --review-all-files is given.
+# They are matched against the file name only, so files inside dot directories
+# such as .github/ are still reviewed
+SETTINGS_FILE_PATTERNS = (
+    ".*",
+    "*.toml",
+    "*.lock",
+    "*.md",
+    "*.txt",
+    "*.in",
+    "*.ini",
+    "*.cfg",
+)
+
+
+def _translate(pattern: str) -> str:
+    # Slashes delimit directories: `*` and `?` stay within one, `**` spans any number
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", i + 2)) != -1:
+            content = pattern[i + 1 : end]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex.append(f"[{content}]")
+            i = end + 1
+            continue
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "".join(regex)
+
+
+def _compile(
+    patterns: Sequence[str],
+    name_patterns: Sequence[str] = (),
+) -> tuple[re.Pattern[str] | None, list[bool]]:
+    alternatives = []
+    negated = []
+    # Name patterns match the last path component only, never a directory
+    rules = [(line, True) for line in name_patterns] + [
+        (line, False) for line in patterns
+    ]
+    for line, name_only in rules:
+        pattern = line.strip()
+        if not pattern or pattern.startswith("#"):
+            continue
+        negate = pattern.startswith("!")
+        pattern = pattern.removeprefix("!")
+        if pattern.startswith(("\\!", "\\#")):
+            pattern = pattern[1:]
+        if name_only:
+            regex = "(?:.*/)?" + _translate(pattern)
+            alternatives.append(f"({regex})")
+            negated.append(negate)
+            continue
+        directory = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # A slash other than a trailing one anchors the pattern to the repository root
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        regex = ("" if anchored else "(?:.*/)?") + _translate(pattern)
+        # A pattern matching a directory matches everything inside it
+        regex += "/.*" if directory else "(?:/.*)?"
+        alternatives.append(f"({regex})")
+        negated.append(negate)
+    if not alternatives:
+        return None, []
+    # The last matching pattern decides, so the alternatives are tried from the last
+    # one and the single capturing group of the one that matched identifies it
+    alternatives.reverse()
+    negated.reverse()
+    return re.compile("|".join(alternatives)), negated
+
+
+class PathFilter:
+    """
+    Select the files to review with gitignore-style include and exclude patterns.
+
+    The patterns of each list are compiled into a single regular expression, so
+    testing a path costs one match however many patterns there are. As in
+    ``.gitignore``, ``*`` and ``?`` do not match ``/``, ``**`` matches any number
+    of directories, a pattern containing a slash is relative to the repository
+    root while one without matches at any depth, a trailing slash matches only
+    directories, ``!`` re-includes what an earlier pattern excluded, and the last
+    matching pattern wins. A file inside a matching directory matches too.
+    """
+
+    def __init__(
+        self,
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        exclude_names: Sequence[str] = (),
+    ):
+        """
+        Initialize the PathFilter.
+
+        :param include: Patterns of the files to review; if empty, all files are reviewed unless excluded.
+        :param exclude: Patterns of the files not to review.
+        :param exclude_names: Patterns of the names of files not to review, tested before ``exclude``
+                       against the file name alone, so they never exclude a directory.
+        """
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.exclude_names = list(exclude_names)
+        self._include, self._include_negated = _compile(self.include)
+        self._exclude, self._exclude_negated = _compile(
+            self.exclude,
+            self.exclude_names,
+        )
+
+    def includes(self, path: str) -> bool:
+        """
+        Check whether a file is reviewed.
+
+        :param path: The path of the file relative to the repository root, with forward slashes.
+        :return: True if the file is included and not excluded.
+        """
+        if self._include is not None and not self._decides(
+            self._include,
+            self._include_negated,
+            path,
+        ):
+            return False
+        return self._exclude is None or not self._decides(
+            self._exclude,
+            self._exclude_negated,
+            path,
+        )
+
+    @staticmethod
+    def _decides(regex: re.Pattern[str], negated: list[bool], path: str) -> bool:
+        match = regex.fullmatch(path)
+        return match is not None and not negated[(match.lastindex or 1) - 1]
+
+    def __repr__(self) -> str:
+        return (
+            f"PathFilter(include={self.include!r}, exclude={self.exclude!r}, "
+            f"exclude_names={self.exclude_names!r})"
+        )
@@ -1,17 +1,58 @@
 import sys
+import time
+from collections.abc import Callable, Iterator, Sequence
+from functools import partial
 from pathlib import Path
-from typing import Literal, cast
+from typing import Any, Literal, TextIO, cast
 
 import click
-from git import InvalidGitRepositoryError, Repo
+from git import BadName, InvalidGitRepositoryError, Repo
 from git.objects import Commit
 from rich.console import Console
-from rich.markdown import Markdown
+from rich.markup import escape
 from rich.panel import Panel
-from rich.syntax import Syntax
+from rich.table import Table
 
 from ai_review_assistant import __version__
+from ai_review_assistant.cache import ReviewCache
+from ai_review_assistant.changes import (
+    DEFAULT_MAX_FILE_BYTES,
+    FileChange,
+    diff_commits,
+    diff_staged,
+    iter_file_changes,
+)
+from ai_review_assistant.daemon import (
+    DaemonError,
+    connect_or_start,
+    default_socket_path,
+)
+from ai_review_assistant.diff import TokenSavings
+from ai_review_assistant.findings import (
+    SEVERITIES,
+    Finding,
+    blocking_findings,
+    parse_findings,
+)
+from ai_review_assistant.ignore import PathFilter
+from ai_review_assistant.output import (
+    MACHINE_FORMATS,
+    OUTPUT_FORMATS,
+    ReviewWriter,
+    RichReviewWriter,
+    create_writer,
+)
+from ai_review_assistant.priority import churn_stats, flagged_reviews, prioritize
 from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.runner import (
+    CANCELLED_ERROR,
+    DEADLINE_ERROR,
+    ReviewResult,
+    iter_reviews,
+)
+from ai_review_assistant.state import ReviewState
+from ai_review_assistant.stats import ReviewStats
+from ai_review_assistant.usage import PromptCacheUsage
 
 console = Console()
 
@@ -25,28 +66,116 @@ def find_git_root(path: Path) -> str | None:
         return None
 
 
-def get_current_and_previous_commit(repo: Repo) -> tuple[Commit, Commit | None]:
-    """Get the current commit and its parent."""
-    current_commit = repo.head.commit
-    previous_commit = current_commit.parents[0] if current_commit.parents else None
-    return current_commit, previous_commit
+def get_current_and_previous_commit(
+    repo: Repo,
+    base: str | None = None,
+    head: str | None = None,
+) -> tuple[Commit, Commit | None]:
+    """
+    Get the current commit and the commit to compare it with.
+
+    Without ``base`` the current commit is compared with its first parent. With
+    ``base`` it is compared with the merge base of both revisions, as in
+    ``git diff base...head``, so a branch is reviewed by what it changes even if
+    the base branch has moved on.
+
+    :param repo: The repository to resolve the revisions in.
+    :param base: Optional revision the changes are based on.
+    :param head: Optional revision to review instead of HEAD.
+    :return: A tuple of (current commit, previous commit or None).
+    """
+    current_commit = repo.commit(head) if head else repo.head.commit
+    if base is None:
+        previous_commit = current_commit.parents[0] if current_commit.parents else None
+        return current_commit, previous_commit
+
+    merge_bases = repo.merge_base(repo.commit(base), current_commit)
+    if not merge_bases or not isinstance(merge_bases[0], Commit):
+        msg = f"{base} and {head or 'HEAD'} have no common history"
+        raise ValueError(msg)
+    return current_commit, merge_bases[0]
+
+
+def count_per_commit_changes(
+    repo: Repo,
+    current_commit: Commit,
+    previous_commit: Commit,
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    path_filter: PathFilter | None = None,
+) -> tuple[int, int]:
+    """
+    Count the reviewable file changes of every commit between two commits.
+
+    This is the number of reviews needed to go through a range commit by commit,
+    which reviewing the net changes of the range replaces with one review per file.
+    Changes are counted with the same rules as the review, so deleted, binary,
+    oversized and filtered out files are not.
+
+    :param repo: The repository containing the commits.
+    :param current_commit: The last commit of the range.
+    :param previous_commit: The commit the range starts after.
+    :param max_file_bytes: The maximum size of either version of a reviewed file.
+    :param path_filter: The filter selecting the files to review, or None for all files.
+    :return: A tuple of (number of commits, number of reviewable files summed over all commits).
+    """
+    commits = 0
+    file_changes = 0
+    for commit in repo.iter_commits(
+        f"{previous_commit.hexsha}..{current_commit.hexsha}",
+    ):
+        commits += 1
+        if commit.parents:
+            file_changes += sum(
+                1
+                for change in iter_file_changes(
+                    diff_commits(commit.parents[0], commit),
+                    max_file_bytes,
+                    path_filter,
+                )
+                if change.skip_reason is None
+            )
+    return commits, file_changes
 
 
 def get_file_changes(
     current_commit: Commit,
     previous_commit: Commit | None,
-) -> dict[str, dict[str, str]]:
-    """Get the changes for each modified file between two commits."""
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    path_filter: PathFilter | None = None,
+) -> Iterator[FileChange]:
+    """
+    Get the changes for each modified file between two commits.
+
+    File content is read only when a change is reviewed, and binary files or files
+    larger than ``max_file_bytes`` are yielded with a skip reason instead. Files
+    not selected by ``path_filter`` are left out before their blobs are touched.
+    """
     if previous_commit is None:
-        return {}
-    diff_index = previous_commit.diff(current_commit)
-    changes = {}
-    for diff in diff_index.iter_change_type("M"):
-        changes[diff.a_path] = {
-            "before": diff.a_blob.data_stream.read().decode("utf-8"),
-            "after": diff.b_blob.data_stream.read().decode("utf-8"),
-        }
-    return changes
+        return iter(())
+    return iter_file_changes(
+        diff_commits(previous_commit, current_commit),
+        max_file_bytes,
+        path_filter,
+    )
+
+
+def get_staged_changes(
+    repo: Repo,
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    path_filter: PathFilter | None = None,
+) -> Iterator[FileChange]:
+    """
+    Get the changes for each modified file staged in the index, compared with HEAD.
+
+    This is what ``git commit`` is about to record, so it is what a pre-commit hook
+    should review. Staged content is read from the object database, not from the
+    working tree, so unstaged edits are not reviewed.
+    """
+    return iter_file_changes(
+        diff_staged(repo),
+        max_file_bytes,
+        path_filter,
+    )
 
 
 def parse_languages(value: str) -> list[str]:
@@ -57,9 +186,9 @@ def parse_languages(value: str) -> list[str]:
 @click.option("--version", is_flag=True, help="Show the version and exit.")
 @click.option(
     "--vendor",
-    type=click.Choice(["openai", "anthropic"]),
+    type=click.Choice(["openai", "anthropic", "fake"]),
     default="openai",
-    help="AI vendor to use",
+    help="AI vendor to use ('fake' answers locally, for benchmarks)",
 )
 @click.option("--model", default="gpt-3.5-turbo", help="Model name to use")
 @click.option("--api-key", envvar="AI_API_KEY", help="API key for the AI vendor")
@@ -75,6 +204,16 @@ def parse_languages(value: str) -> list[str]:
     default=0,
     help="Depth of code structure to include in review",
 )
+@click.option(
+    "--symbol-context",
+    "symbol_context_tokens",
+    type=click.IntRange(min=0),
+    default=0,
+    metavar="TOKENS",
+    help="Add the definitions called by the changed Python code and the code calling the changed "
+    "definitions in other files, up to this many tokens per file, from a symbol index kept in .git "
+    "(default: 0, disabled)",
+)
 @click.option(
     "--program-language",
     default="Python",
@@ -92,6 +231,64 @@ def parse_languages(value: str) -> list[str]:
     default=True,
     help="Ignore settings and config files (default: True)",
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse reviews of unchanged files stored in .git (default: True)",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Review files reviewed before only for the changes since their last reviewed revision, "
+    "recorded in .git (default: False)",
+)
+@click.option(
+    "--structured/--no-structured",
+    default=False,
+    help="Ask the model for findings with a line range, severity and message instead of a prose review "
+    "(default: False)",
+)
+@click.option(
+    "--diff-mode",
+    type=click.Choice(["hunks", "full"]),
+    default="hunks",
+    help="Send only the changed hunks or the full files before and after changes",
+)
+@click.option(
+    "--context-lines",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Unchanged lines to include around each change in hunks mode",
+)
+@click.option(
+    "--requests-per-minute",
+    type=click.IntRange(min=1),
+    help="Budget of LLM requests per minute (default: the vendor's rate limit headers)",
+)
+@click.option(
+    "--tokens-per-minute",
+    type=click.IntRange(min=1),
+    help="Budget of prompt tokens per minute (default: the vendor's rate limit headers)",
+)
+@click.option(
+    "--max-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="Times a rate limited or failed LLM request is sent again, with backoff",
+)
+@click.option(
+    "--daemon/--no-daemon",
+    default=False,
+    help="Review in a long-lived local daemon that keeps model clients, connections and the tokenizer warm, "
+    "starting it if it is not running (default: False)",
+)
+@click.option(
+    "--daemon-socket",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="AI_REVIEW_DAEMON_SOCKET",
+    help="Unix socket of the review daemon (default: $XDG_RUNTIME_DIR/ai_review_assistant.sock)",
+)
 @click.pass_context
 def cli(
     ctx: click.Context,
@@ -101,9 +298,20 @@ def cli(
     api_key: str,
     temperature: float,
     code_depth: int,
+    symbol_context_tokens: int,
     program_language: list[str],
     result_output_language: str,
     ignore_settings_files: bool,
+    cache: bool,
+    incremental: bool,
+    structured: bool,
+    diff_mode: str,
+    context_lines: int,
+    requests_per_minute: int | None,
+    tokens_per_minute: int | None,
+    max_retries: int,
+    daemon: bool,
+    daemon_socket: Path | None,
 ) -> None:
     if version:
         click.echo(f"AI Review Assistant version {__version__}")
@@ -125,88 +333,659 @@ def cli(
         sys.exit(1)
 
     repo = Repo(git_root)
-    current_commit, previous_commit = get_current_and_previous_commit(repo)
+    review_cache = ReviewCache.for_repo(git_root) if cache else None
+    review_state = ReviewState.for_repo(git_root) if incremental else None
+
+    # The daemon creates its own assistant from the same settings
+    settings: dict[str, Any] = {
+        "vendor_name": cast(Literal["openai", "anthropic", "fake"], vendor),
+        "model_name": model,
+        "api_key": api_key,
+        "temperature": temperature,
+        "code_depth": code_depth,
+        "program_language": program_language,
+        "result_output_language": result_output_language,
+        "ignore_settings_files": ignore_settings_files,
+        "diff_mode": cast(Literal["full", "hunks"], diff_mode),
+        "context_lines": context_lines,
+        "requests_per_minute": requests_per_minute,
+        "tokens_per_minute": tokens_per_minute,
+        "max_retries": max_retries,
+        "structured": structured,
+        "symbol_context_tokens": symbol_context_tokens,
+    }
 
     ctx.obj = {
         "assistant": CodeReviewAssistant(
             repo_path=git_root,
-            vendor_name=cast(Literal["openai", "anthropic"], vendor),
-            model_name=model,
-            api_key=api_key,
-            temperature=temperature,
-            code_depth=code_depth,
-            program_language=program_language,
-            result_output_language=result_output_language,
-            ignore_settings_files=ignore_settings_files,
+            cache=review_cache,
+            review_state=review_state,
+            **settings,
         ),
+        "settings": {**settings, "cache": cache, "incremental": incremental},
+        "daemon_socket": (daemon_socket or default_socket_path()) if daemon else None,
+        "cache": review_cache,
+        "review_state": review_state,
         "repo": repo,
-        "current_commit": current_commit,
-        "previous_commit": previous_commit,
     }
 
 
+def review_files(
+    assistant: CodeReviewAssistant,
+    changes: Sequence[FileChange],
+    workers: int = 1,
+    batch_tokens: int = 0,
+    iterate: Callable[..., Iterator[ReviewResult]] = iter_reviews,
+    fail_on: str | None = None,
+    deadline: float | None = None,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Review the changed files, running up to ``workers`` reviews concurrently.
+
+    Reviews are returned in the order of ``changes`` regardless of which one
+    finishes first, and an exception raised while reviewing one file is
+    recorded for that file instead of aborting the remaining reviews.
+
+    :param assistant: The assistant used to review each file.
+    :param changes: The changed files to review.
+    :param workers: The maximum number of files reviewed at the same time.
+    :param batch_tokens: The maximum number of code tokens of a multi-file request, 0 to review every file on its own.
+    :param iterate: The function reviewing the files, iter_reviews or the iter_reviews of a daemon client.
+    :param fail_on: The least severe finding that cancels the remaining reviews, whose error is then CANCELLED_ERROR.
+    :param deadline: The number of seconds after which the remaining reviews are cancelled with DEADLINE_ERROR.
+    :return: A tuple of (reviews, errors), both keyed by file path.
+    """
+    results: dict[str, str | None] = {}
+    errors: dict[str, str] = {}
+
+    with click.progressbar(
+        range(len(changes)),
+        label="Reviewing changes",
+        # stderr when stdout is reserved for a machine readable format
+        file=cast(TextIO, console.file),
+    ) as bar:
+        results_iter = iterate(
+            assistant,
+            changes,
+            workers,
+            batch_tokens=batch_tokens,
+            fail_on=fail_on,
+            deadline=deadline,
+        )
+        for file_path, review, error in results_iter:
+            results[file_path] = review
+            if error is not None:
+                errors[file_path] = error
+            bar.update(1)
+
+    paths = [change.path for change in changes]
+    reviews = {
+        file_path: review
+        for file_path in paths
+        if (review := results.get(file_path)) is not None
+    }
+    ordered_errors = {
+        file_path: errors[file_path] for file_path in paths if file_path in errors
+    }
+    return reviews, ordered_errors
+
+
+def stream_reviews(
+    assistant: CodeReviewAssistant,
+    changes: Sequence[FileChange],
+    workers: int = 1,
+    stream_tokens: bool = False,
+    batch_tokens: int = 0,
+    iterate: Callable[..., Iterator[ReviewResult]] = iter_reviews,
+    writer: ReviewWriter | None = None,
+    fail_on: str | None = None,
+    deadline: float | None = None,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Review the changed files and write each review as soon as it completes.
+
+    With ``stream_tokens`` the text of each review is written while the model is
+    still generating it. The time until the first output appears is reported,
+    since that is what a developer waiting on the terminal notices.
+
+    :param assistant: The assistant used to review each file.
+    :param changes: The changed files to review.
+    :param workers: The maximum number of files reviewed at the same time.
+    :param stream_tokens: Whether to print reviews token by token.
+    :param batch_tokens: The maximum number of code tokens of a multi-file request, 0 to review every file on its own.
+    :param iterate: The function reviewing the files, iter_reviews or the iter_reviews of a daemon client.
+    :param writer: The writer of the reviews, by default Rich panels on the console.
+    :param fail_on: The least severe finding that cancels the remaining reviews, whose error is then CANCELLED_ERROR.
+    :param deadline: The number of seconds after which the remaining reviews are cancelled with DEADLINE_ERROR.
+    :return: A tuple of (reviews, errors), both keyed by file path, in completion order.
+    """
+    writer = writer or RichReviewWriter(console)
+    reviews: dict[str, str] = {}
+    errors: dict[str, str] = {}
+    streamed: set[str] = set()
+    start = time.perf_counter()
+    first_feedback: float | None = None
+
+    def print_token(file_path: str, text: str) -> None:
+        nonlocal first_feedback
+        if first_feedback is None:
+            first_feedback = time.perf_counter() - start
+        if file_path not in streamed:
+            if streamed:
+                writer.end_tokens()
+            streamed.add(file_path)
+            writer.start_tokens(file_path)
+        writer.write_token(text)
+
+    console.print(f"Reviewing changes in {len(changes)} files...", highlight=False)
+    results = iterate(
+        assistant,
+        changes,
+        workers,
+        on_token=print_token if stream_tokens else None,
+        batch_tokens=batch_tokens,
+        fail_on=fail_on,
+        deadline=deadline,
+    )
+    for file_path, review, error in results:
+        if error is not None:
+            errors[file_path] = error
+            _write_error(writer, file_path, error)
+        elif review is not None:
+            reviews[file_path] = review
+            if file_path not in streamed:
+                writer.write_review(file_path, review)
+        else:
+            continue
+        if first_feedback is None:
+            first_feedback = time.perf_counter() - start
+
+    if streamed:
+        writer.end_tokens()
+    if first_feedback is not None:
+        console.print(
+            f"[dim]First feedback after {first_feedback:.2f}s, "
+            f"{len(reviews)} files reviewed in {time.perf_counter() - start:.2f}s[/dim]",
+        )
+    return reviews, errors
+
+
 @cli.command()
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of files to review concurrently",
+)
+@click.option(
+    "--staged",
+    is_flag=True,
+    help="Review the changes staged for the next commit instead of the current commit",
+)
+@click.option(
+    "--stream/--no-stream",
+    default=None,
+    help="Print each review as soon as it completes instead of all at the end in the order of the changes "
+    "(default: on for rich and markdown, off for json, jsonl and sarif)",
+)
+@click.option(
+    "--stream-tokens",
+    is_flag=True,
+    help="Print reviews while the model is generating them (requires --workers 1)",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    help="Output format of the reviews (default: rich on a terminal, markdown otherwise). "
+    "json, jsonl and sarif write only the results to stdout and everything else to stderr",
+)
+@click.option(
+    "--base",
+    help="Review the net changes of all commits since the merge base with this revision",
+)
+@click.option(
+    "--head",
+    help="Revision to review instead of HEAD",
+)
+@click.option(
+    "--max-file-bytes",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MAX_FILE_BYTES,
+    show_default=True,
+    help="Skip files larger than this instead of reviewing them",
+)
+@click.option(
+    "--batch-tokens",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Review small changes of several files in one request of up to this many code tokens (0 disables batching)",
+)
+@click.option(
+    "--fail-on",
+    type=click.Choice(SEVERITIES),
+    help="Fail as soon as a finding of this severity or a more severe one is found, "
+    "cancelling the remaining reviews (requires --structured)",
+)
+@click.option(
+    "--prioritize",
+    "prioritize_changes",
+    is_flag=True,
+    help="Review the riskiest changes first, ranked by churn, file type, path and how often "
+    "reviews of the file were flagged before (implied by --max-tokens and --deadline)",
+)
+@click.option(
+    "--max-tokens",
+    type=click.IntRange(min=1),
+    help="Review only the riskiest changes fitting into this many estimated prompt tokens "
+    "and report the others as skipped",
+)
+@click.option(
+    "--deadline",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Stop reviewing after this many seconds and report the unfinished files as skipped",
+)
+@click.option(
+    "--stats",
+    "show_stats",
+    is_flag=True,
+    help="Print the latency and token usage of every reviewed file",
+)
+@click.option(
+    "--stats-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Write the latency and token usage of every LLM call, file and the run as JSON lines",
+)
 @click.pass_context
-def review(ctx: click.Context) -> None:
-    """Review changes in the current commit"""
+def review(
+    ctx: click.Context,
+    workers: int,
+    staged: bool,
+    stream: bool | None,
+    stream_tokens: bool,
+    output_format: str | None,
+    base: str | None,
+    head: str | None,
+    max_file_bytes: int,
+    batch_tokens: int,
+    fail_on: str | None,
+    prioritize_changes: bool,
+    max_tokens: int | None,
+    deadline: float | None,
+    show_stats: bool,
+    stats_file: Path | None,
+) -> None:
+    """Review changes in the current commit or a range of commits"""
     assistant: CodeReviewAssistant = ctx.obj["assistant"]
-    current_commit: Commit = ctx.obj["current_commit"]
-    previous_commit: Commit | None = ctx.obj["previous_commit"]
+    if staged and (base or head):
+        raise click.UsageError("--staged cannot be combined with --base or --head")
+    output_format, stream = _check_review_options(
+        ctx,
+        workers,
+        stream,
+        stream_tokens,
+        output_format,
+        batch_tokens,
+        fail_on,
+    )
+    # HEAD is resolved only to review commits, so the first commit of a repository can be staged
+    commits = None if staged else _resolve_commits(ctx, base, head)
+    writer = _open_writer(ctx, output_format)
+
+    revisions: tuple[Commit, Commit] | None = None
+    if commits is None:
+        changes = list(
+            get_staged_changes(
+                ctx.obj["repo"],
+                max_file_bytes,
+                assistant.path_filter(),
+            ),
+        )
+    else:
+        current_commit, previous_commit = commits
+        if previous_commit is None:
+            click.echo(
+                "This is the initial commit. No changes to review.",
+                err=console.stderr,
+            )
+            return
+        revisions = (previous_commit, current_commit)
+        changes = list(
+            get_file_changes(
+                current_commit,
+                previous_commit,
+                max_file_bytes,
+                assistant.path_filter(),
+            ),
+        )
+    _write_skipped(writer, changes)
+    changes = [change for change in changes if change.skip_reason is None]
+    changed_files = len(changes)
+    if prioritize_changes or max_tokens or deadline:
+        changes = _prioritize(
+            ctx,
+            writer,
+            changes,
+            revisions,
+            max_tokens,
+        )
+
+    iterate = _review_iterator(ctx) if changes else iter_reviews
+    if stream or stream_tokens:
+        reviews, errors = stream_reviews(
+            assistant,
+            changes,
+            workers,
+            stream_tokens,
+            batch_tokens,
+            iterate,
+            writer,
+            fail_on,
+            deadline,
+        )
+    else:
+        reviews, errors = review_files(
+            assistant,
+            changes,
+            workers,
+            batch_tokens,
+            iterate,
+            fail_on,
+            deadline,
+        )
+        _write_results(writer, changes, reviews, errors)
+    cancelled = [path for path, error in errors.items() if error == CANCELLED_ERROR]
+    past_deadline = [path for path, error in errors.items() if error == DEADLINE_ERROR]
+    errors = {
+        path: error
+        for path, error in errors.items()
+        if error not in (CANCELLED_ERROR, DEADLINE_ERROR)
+    }
+    _record_flagged(ctx, reviews)
+
+    _report_stats(getattr(assistant, "stats", None), show_stats, stats_file)
 
-    if not previous_commit:
-        click.echo("This is the initial commit. No changes to review.")
+    if staged and not reviews and not errors:
+        # Nothing reviewable is staged, which must not block the commit
+        click.echo("No staged changes to review.", err=console.stderr)
         return
 
-    changes = get_file_changes(current_commit, previous_commit)
-    reviews: dict[str, str] = {}
+    if base and revisions is not None:
+        _print_range_savings(
+            *count_per_commit_changes(
+                ctx.obj["repo"],
+                revisions[1],
+                revisions[0],
+                max_file_bytes,
+                assistant.path_filter(),
+            ),
+            changed_files,
+        )
+    _print_cache_stats(ctx.obj["cache"])
+    _print_review_state_stats(ctx.obj.get("review_state"))
+    _print_token_savings(getattr(assistant, "token_savings", None))
+    _print_prompt_cache_usage(getattr(assistant, "prompt_cache_usage", None))
+    if past_deadline:
+        console.print(
+            f"[dim]Deadline of {deadline:g}s reached, skipped the reviews of "
+            f"{len(past_deadline)} files[/dim]",
+        )
+    _check_fail_on(reviews, fail_on, len(cancelled))
+    if not reviews and not past_deadline:
+        _print_no_reviews()
+    if errors:
+        sys.exit(1)
 
-    with click.progressbar(changes.items(), label="Reviewing changes") as bar:
-        for file_path, file_changes in bar:
-            review = assistant.review_changes(
-                file_path,
-                file_changes["before"],
-                file_changes["after"],
-            )
-            if review is not None:
-                reviews[file_path] = review
 
-    _print_reviews(reviews)
+def _check_review_options(
+    ctx: click.Context,
+    workers: int,
+    stream: bool | None,
+    stream_tokens: bool,
+    output_format: str | None,
+    batch_tokens: int,
+    fail_on: str | None,
+) -> tuple[str, bool]:
+    if stream_tokens and (workers > 1 or batch_tokens):
+        raise click.UsageError(
+            "--stream-tokens cannot be combined with --workers > 1 or --batch-tokens",
+        )
+    output_format = output_format or ("rich" if console.is_terminal else "markdown")
+    if stream_tokens and output_format in MACHINE_FORMATS:
+        raise click.UsageError(
+            f"--stream-tokens cannot be combined with --format {output_format}",
+        )
+    if fail_on and not ctx.obj["settings"]["structured"]:
+        raise click.UsageError("--fail-on requires --structured")
+    if stream is None:
+        # Programs reading the results get them in a stable order, whatever finishes first
+        stream = output_format not in MACHINE_FORMATS
+    return output_format, stream
 
 
-def _print_reviews(reviews: dict[str, str]) -> None:
-    if reviews:
-        for file_path, review in reviews.items():
-            console.print(
-                Panel(f"[bold green]File:[/bold green] {file_path}", expand=False),
-            )
-            console.print("[bold yellow]Review:[/bold yellow]")
-
-            # Split the review into parts
-            parts = review.split("```")
-            for i, part in enumerate(parts):
-                if i % 2 == 0:
-                    # This is regular text, print as Markdown
-                    md = Markdown(part.strip())
-                    console.print(md)
-                else:
-                    # This is code, use Pygments for syntax highlighting
-                    # The first word after ``` is typically the language
-                    code_lines = part.strip().split("\n")
-                    if code_lines:
-                        lang = code_lines[0].strip().lower()
-                        code = "\n".join(code_lines[1:])
-                        syntax = Syntax(code, lang, theme="monokai", line_numbers=True)
-                        console.print(Panel(syntax, expand=False))
-
-            console.print()
+def _open_writer(ctx: click.Context, output_format: str) -> ReviewWriter:
+    writer = create_writer(output_format, console, sys.stdout)
+    if output_format in MACHINE_FORMATS:
+        # Keep stdout a valid document by moving everything else to stderr
+        console.stderr = True
+        ctx.call_on_close(partial(setattr, console, "stderr", False))
+    # Closed when the command exits, early or with an error, so the document is always complete
+    ctx.call_on_close(writer.close)
+    return writer
+
+
+def _write_skipped(writer: ReviewWriter, changes: list[FileChange]) -> None:
+    for change in changes:
+        if change.skip_reason is not None:
+            writer.write_skipped(change.path, change.skip_reason)
+
+
+def _write_results(
+    writer: ReviewWriter,
+    changes: list[FileChange],
+    reviews: dict[str, str],
+    errors: dict[str, str],
+) -> None:
+    # In the order of the changes, so the output is the same whichever review finished first
+    for change in changes:
+        if change.path in errors:
+            _write_error(writer, change.path, errors[change.path])
+        elif change.path in reviews:
+            writer.write_review(change.path, reviews[change.path])
+
+
+def _write_error(writer: ReviewWriter, file_path: str, error: str) -> None:
+    if error == CANCELLED_ERROR:
+        writer.write_skipped(file_path, "cancelled after a blocking finding")
+    elif error == DEADLINE_ERROR:
+        writer.write_skipped(file_path, "review deadline reached")
     else:
+        writer.write_error(file_path, error)
+
+
+def _prioritize(
+    ctx: click.Context,
+    writer: ReviewWriter,
+    changes: list[FileChange],
+    commits: tuple[Commit | None, Commit] | None,
+    max_tokens: int | None,
+) -> list[FileChange]:
+    assistant: CodeReviewAssistant = ctx.obj["assistant"]
+    cache: ReviewCache | None = ctx.obj["cache"]
+    paths = [change.path for change in changes]
+    churn = (
+        churn_stats(ctx.obj["repo"], *commits)
+        if commits
+        else churn_stats(ctx.obj["repo"], None)
+    )
+    selected, over_budget = prioritize(
+        changes,
+        churn,
+        cache.flag_counts(paths) if cache else {},
+        assistant.diff_mode,
+        assistant.context_lines,
+        assistant.count_tokens(assistant.construct_system_prompt()),
+        max_tokens,
+    )
+    for prioritized in over_budget:
+        writer.write_skipped(
+            prioritized.change.path,
+            "low priority, over the --max-tokens budget",
+        )
+    if over_budget:
         console.print(
-            Panel(
-                "[bold red]No changes detected or review failed.[/bold red]",
-                expand=False,
-            ),
+            f"[dim]Reviewing the {len(selected)} riskiest files within ~{max_tokens} "
+            f"prompt tokens, skipped {len(over_budget)} files[/dim]",
         )
-        sys.exit(1)
+    return [prioritized.change for prioritized in selected]
+
+
+def _record_flagged(ctx: click.Context, reviews: dict[str, str]) -> None:
+    # Only structured reviews have findings telling how serious they are
+    cache: ReviewCache | None = ctx.obj["cache"]
+    if cache is not None and ctx.obj["settings"]["structured"]:
+        cache.record_flagged(flagged_reviews(reviews))
+
+
+def _review_iterator(ctx: click.Context) -> Callable[..., Iterator[ReviewResult]]:
+    socket_path = ctx.obj["daemon_socket"]
+    if socket_path is None:
+        return iter_reviews
+    try:
+        client = connect_or_start(socket_path)
+    except DaemonError as e:
+        console.print(f"[dim]{e}, reviewing without the daemon[/dim]")
+        return iter_reviews
+    return partial(client.iter_reviews, ctx.obj["settings"])
+
+
+def _resolve_commits(
+    ctx: click.Context,
+    base: str | None,
+    head: str | None,
+) -> tuple[Commit, Commit | None]:
+    try:
+        return get_current_and_previous_commit(ctx.obj["repo"], base, head)
+    except (BadName, ValueError) as e:
+        raise click.UsageError(str(e)) from e
+
+
+def _print_cache_stats(cache: ReviewCache | None) -> None:
+    if cache is None or cache.hits + cache.misses == 0:
+        return
+    console.print(
+        f"[dim]Review cache: {cache.hits} hits, {cache.misses} misses, "
+        f"saved ~{cache.saved_tokens} prompt tokens and {cache.saved_seconds:.1f}s of LLM time[/dim]",
+    )
+
+
+def _print_review_state_stats(review_state: ReviewState | None) -> None:
+    if review_state is None or review_state.hits + review_state.misses == 0:
+        return
+    console.print(
+        f"[dim]Incremental review: {review_state.hits} files had an earlier reviewed "
+        f"revision, {review_state.misses} had none[/dim]",
+    )
+
+
+def _print_range_savings(commits: int, per_commit_changes: int, files: int) -> None:
+    console.print(
+        f"[dim]Reviewed {files} files changed across {commits} commits once each "
+        f"instead of {per_commit_changes} per-commit file reviews, "
+        f"saving {max(per_commit_changes - files, 0)} LLM calls[/dim]",
+    )
+
+
+def _print_token_savings(token_savings: TokenSavings | None) -> None:
+    if isinstance(token_savings, TokenSavings) and token_savings.full_file_tokens:
+        console.print(f"[dim]{token_savings.summary()}[/dim]")
+
+
+def _print_prompt_cache_usage(usage: PromptCacheUsage | None) -> None:
+    if isinstance(usage, PromptCacheUsage) and usage.prompt_tokens:
+        console.print(f"[dim]{usage.summary()}[/dim]")
+
+
+def _report_stats(
+    stats: ReviewStats | None,
+    show_stats: bool,
+    stats_file: Path | None,
+) -> None:
+    if not isinstance(stats, ReviewStats):
+        return
+    if show_stats:
+        _print_stats(stats)
+    if stats_file is not None:
+        stats.write_jsonl(stats_file)
+
+
+def _print_stats(stats: ReviewStats) -> None:
+    if not stats.files:
+        return
+    table = Table(title="Review stats")
+    table.add_column("File")
+    for column in ("Prompt build", "Tokenize", "LLM", "Total"):
+        table.add_column(column, justify="right")
+    for column in ("Calls", "Input tokens", "Output tokens", "Cached tokens"):
+        table.add_column(column, justify="right")
+    for file_stats in stats.files:
+        table.add_row(
+            file_stats.file_path,
+            f"{file_stats.prompt_build_seconds:.3f}s",
+            f"{file_stats.tokenize_seconds:.3f}s",
+            f"{file_stats.llm_seconds:.3f}s",
+            f"{file_stats.total_seconds:.3f}s",
+            str(file_stats.calls),
+            str(file_stats.input_tokens),
+            str(file_stats.output_tokens),
+            str(file_stats.cached_tokens),
+        )
+    console.print(table)
+
+    summary = stats.summary()
+    console.print(
+        f"[dim]{summary['files']} files, {summary['calls']} LLM calls, "
+        f"{summary['input_tokens']} input / {summary['output_tokens']} output / "
+        f"{summary['cached_tokens']} cached tokens. "
+        f"File latency p50 {summary['file_p50_seconds']:.2f}s, p95 {summary['file_p95_seconds']:.2f}s; "
+        f"LLM call latency p50 {summary['call_p50_seconds']:.2f}s, p95 {summary['call_p95_seconds']:.2f}s. "
+        f"{summary['retries']} retries, {summary['wait_seconds']:.1f}s waiting for the rate limit[/dim]",
+    )
+
+
+def _check_fail_on(
+    reviews: dict[str, str],
+    fail_on: str | None,
+    cancelled: int,
+) -> None:
+    if fail_on is None:
+        return
+    blocking: list[Finding] = []
+    for file_path, review in reviews.items():
+        blocking.extend(blocking_findings(parse_findings(file_path, review), fail_on))
+    if not blocking:
+        return
+    for finding in blocking:
+        lines = f":{finding.line_start}" if finding.line_start is not None else ""
+        console.print(
+            f"[bold red]{finding.severity.capitalize()} finding in "
+            f"{escape(finding.path)}{lines}:[/bold red] {escape(finding.message)}",
+        )
+    if cancelled:
+        console.print(f"[dim]Cancelled the reviews of {cancelled} files[/dim]")
+    sys.exit(1)
+
+
+def _print_no_reviews() -> None:
+    console.print(
+        Panel(
+            "[bold red]No changes detected or review failed.[/bold red]",
+            expand=False,
+        ),
+    )
+    sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,374 @@
+import json
+from abc import ABC, abstractmethod
+from typing import IO, Any
+
+from rich.console import Console
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.syntax import Syntax
+
+from ai_review_assistant import __version__
+from ai_review_assistant.findings import Finding, parse_findings
+
+OUTPUT_FORMATS = ("rich", "markdown", "json", "jsonl", "sarif")
+# Formats read by programs, so nothing but the results may be written to stdout
+MACHINE_FORMATS = ("json", "jsonl", "sarif")
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_RULE_ID = "ai-review"
+TOOL_NAME = "ai_review_assistant"
+TOOL_URI = "https://github.com/vandriichuk/ai_review_assistant"
+SARIF_LEVELS = {
+    "critical": "error",
+    "major": "warning",
+    "minor": "note",
+    "info": "note",
+}
+
+
+class ReviewWriter(ABC):
+    """
+    Writes the outcome of every file as soon as it is known.
+
+    Each subclass writes one format. Records are written in the order the methods
+    are called and flushed right away, so a consumer reading the output sees each
+    file when its review finishes, not when the whole run does.
+    """
+
+    def __init__(self, stream: IO[str]):
+        """
+        Initialize the ReviewWriter.
+
+        :param stream: The text stream the results are written to.
+        """
+        self.stream = stream
+
+    @abstractmethod
+    def write_review(self, file_path: str, review: str) -> None:
+        """
+        Write the review of a file.
+
+        :param file_path: The path of the reviewed file.
+        :param review: The review of the file.
+        """
+
+    @abstractmethod
+    def write_error(self, file_path: str, error: str) -> None:
+        """
+        Write that the review of a file failed.
+
+        :param file_path: The path of the file.
+        :param error: The error that made the review fail.
+        """
+
+    @abstractmethod
+    def write_skipped(self, file_path: str, reason: str) -> None:
+        """
+        Write that a file was not reviewed.
+
+        :param file_path: The path of the file.
+        :param reason: Why the file was skipped.
+        """
+
+    @abstractmethod
+    def start_tokens(self, file_path: str) -> None:
+        """
+        Start a review written token by token, followed by write_token calls.
+
+        :param file_path: The path of the reviewed file.
+        """
+
+    @abstractmethod
+    def write_token(self, text: str) -> None:
+        """
+        Write a piece of the review started by start_tokens.
+
+        :param text: The next piece of the review.
+        """
+
+    @abstractmethod
+    def end_tokens(self) -> None:
+        """End the review started by start_tokens."""
+
+    def close(self) -> None:
+        """Finish the output, which for document formats completes the document."""
+        self.stream.flush()
+
+    def _write(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()
+
+
+class RichReviewWriter(ReviewWriter):
+    """Renders reviews as Rich panels with highlighted code blocks, for terminals."""
+
+    def __init__(self, console: Console):
+        """
+        Initialize the RichReviewWriter.
+
+        :param console: The console the reviews are rendered on.
+        """
+        super().__init__(console.file)
+        self.console = console
+
+    def _write_header(self, file_path: str) -> None:
+        self.console.print(
+            Panel(f"[bold green]File:[/bold green] {file_path}", expand=False),
+        )
+        self.console.print("[bold yellow]Review:[/bold yellow]")
+
+    def write_review(self, file_path: str, review: str) -> None:
+        self._write_header(file_path)
+
+        # Split the review into parts
+        parts = review.split("```")
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                # This is regular text, print as Markdown
+                md = Markdown(part.strip())
+                self.console.print(md)
+            else:
+                # This is code, use Pygments for syntax highlighting
+                # The first word after ``` is typically the language
+                code_lines = part.strip().split("\n")
+                if code_lines:
+                    lang = code_lines[0].strip().lower()
+                    code = "\n".join(code_lines[1:])
+                    syntax = Syntax(code, lang, theme="monokai", line_numbers=True)
+                    self.console.print(Panel(syntax, expand=False))
+
+        self.console.print()
+
+    def write_error(self, file_path: str, error: str) -> None:
+        self.console.print(
+            Panel(
+                f"[bold red]Review failed:[/bold red] {file_path}\n{error}",
+                expand=False,
+            ),
+        )
+
+    def write_skipped(self, file_path: str, reason: str) -> None:
+        self.console.print(f"[dim]Skipped {file_path}: {reason}[/dim]")
+
+    def start_tokens(self, file_path: str) -> None:
+        self._write_header(file_path)
+
+    def write_token(self, text: str) -> None:
+        self.console.print(text, end="", markup=False, highlight=False)
+
+    def end_tokens(self) -> None:
+        self.console.print("\n")
+
+
+class MarkdownReviewWriter(ReviewWriter):
+    """Writes reviews as plain Markdown sections, without rendering them."""
+
+    def write_review(self, file_path: str, review: str) -> None:
+        self._write(f"## {file_path}\n\n{review.strip()}\n\n")
+
+    def write_error(self, file_path: str, error: str) -> None:
+        self._write(f"## {file_path}\n\n**Review failed:** {error}\n\n")
+
+    def write_skipped(self, file_path: str, reason: str) -> None:
+        self._write(f"_Skipped {file_path}: {reason}_\n\n")
+
+    def start_tokens(self, file_path: str) -> None:
+        self._write(f"## {file_path}\n\n")
+
+    def write_token(self, text: str) -> None:
+        self._write(text)
+
+    def end_tokens(self) -> None:
+        self._write("\n\n")
+
+
+class _CollectingReviewWriter(ReviewWriter):
+    """A writer of whole records, which collects a streamed review and writes it when it ends."""
+
+    def __init__(self, stream: IO[str]):
+        super().__init__(stream)
+        self._token_path: str | None = None
+        self._tokens: list[str] = []
+
+    def start_tokens(self, file_path: str) -> None:
+        self._token_path = file_path
+        self._tokens = []
+
+    def write_token(self, text: str) -> None:
+        self._tokens.append(text)
+
+    def end_tokens(self) -> None:
+        if self._token_path is not None:
+            self.write_review(self._token_path, "".join(self._tokens))
+        self._token_path = None
+        self._tokens = []
+
+
+class JsonLinesReviewWriter(_CollectingReviewWriter):
+    """
+    Writes one JSON object per file and line, with a status of reviewed, failed or skipped.
+
+    Reviewed files carry the findings of a structured review, an empty list for a prose one.
+    """
+
+    def _write_record(self, record: dict[str, Any]) -> None:
+        self._write(json.dumps(record) + "\n")
+
+    def write_review(self, file_path: str, review: str) -> None:
+        self._write_record(
+            {
+                "path": file_path,
+                "status": "reviewed",
+                "review": review,
+                "findings": [
+                    finding.to_dict() for finding in parse_findings(file_path, review)
+                ],
+            },
+        )
+
+    def write_error(self, file_path: str, error: str) -> None:
+        self._write_record({"path": file_path, "status": "failed", "error": error})
+
+    def write_skipped(self, file_path: str, reason: str) -> None:
+        self._write_record({"path": file_path, "status": "skipped", "reason": reason})
+
+
+class JsonReviewWriter(JsonLinesReviewWriter):
+    """
+    Writes the records of JsonLinesReviewWriter as one JSON array.
+
+    The array is opened right away and every record is written when it is known,
+    so the output is a valid document once close has been called.
+    """
+
+    def __init__(self, stream: IO[str]):
+        super().__init__(stream)
+        self._records = 0
+        self._write("[")
+
+    def _write_record(self, record: dict[str, Any]) -> None:
+        separator = ",\n" if self._records else "\n"
+        self._records += 1
+        self._write(separator + json.dumps(record))
+
+    def close(self) -> None:
+        self._write("\n]\n" if self._records else "]\n")
+
+
+class SarifReviewWriter(_CollectingReviewWriter):
+    """
+    Writes a SARIF 2.1.0 log for code scanning tools.
+
+    Every finding of a structured review is a result, with a level following its
+    severity and a region for its lines. A prose review is one note result for
+    the whole file. Results are written as reviews finish. Failed and skipped files are not
+    results, so they are collected and written as tool execution notifications
+    when the log is closed.
+    """
+
+    def __init__(self, stream: IO[str]):
+        super().__init__(stream)
+        self._results = 0
+        self._notifications: list[dict[str, Any]] = []
+        driver = {
+            "name": TOOL_NAME,
+            "version": __version__,
+            "informationUri": TOOL_URI,
+            "rules": [
+                {
+                    "id": SARIF_RULE_ID,
+                    "shortDescription": {"text": "AI code review feedback"},
+                },
+            ],
+        }
+        header = json.dumps({"tool": {"driver": driver}})
+        self._write(
+            f'{{"version": "2.1.0", "$schema": "{SARIF_SCHEMA}", "runs": [\n'
+            f'{header[:-1]}, "results": [',
+        )
+
+    @staticmethod
+    def _location(
+        file_path: str,
+        finding: Finding | None = None,
+    ) -> list[dict[str, Any]]:
+        location: dict[str, Any] = {"artifactLocation": {"uri": file_path}}
+        if finding is not None and finding.line_start is not None:
+            location["region"] = {
+                "startLine": finding.line_start,
+                "endLine": finding.line_end or finding.line_start,
+            }
+        return [{"physicalLocation": location}]
+
+    def write_review(self, file_path: str, review: str) -> None:
+        results = [
+            {
+                "ruleId": SARIF_RULE_ID,
+                "level": SARIF_LEVELS[finding.severity],
+                "message": {"text": finding.message},
+                "locations": self._location(file_path, finding),
+            }
+            for finding in parse_findings(file_path, review)
+        ] or [
+            {
+                "ruleId": SARIF_RULE_ID,
+                "level": "note",
+                "message": {"text": review},
+                "locations": self._location(file_path),
+            },
+        ]
+        for result in results:
+            separator = ",\n" if self._results else "\n"
+            self._results += 1
+            self._write(separator + json.dumps(result))
+
+    def write_error(self, file_path: str, error: str) -> None:
+        self._notifications.append(
+            {
+                "level": "error",
+                "message": {"text": f"Review failed: {error}"},
+                "locations": self._location(file_path),
+            },
+        )
+
+    def write_skipped(self, file_path: str, reason: str) -> None:
+        self._notifications.append(
+            {
+                "level": "note",
+                "message": {"text": f"Skipped: {reason}"},
+                "locations": self._location(file_path),
+            },
+        )
+
+    def close(self) -> None:
+        invocation = {
+            "executionSuccessful": not any(
+                notification["level"] == "error" for notification in self._notifications
+            ),
+            "toolExecutionNotifications": self._notifications,
+        }
+        self._write(f'\n], "invocations": [{json.dumps(invocation)}]}}\n]}}\n')
+
+
+def create_writer(
+    output_format: str,
+    console: Console,
+    stream: IO[str],
+) -> ReviewWriter:
+    """
+    Create the writer of an output format.
+
+    :param output_format: One of OUTPUT_FORMATS.
+    :param console: The console the rich format renders on.
+    :param stream: The text stream the other formats are written to.
+    :return: The writer of the format.
+    """
+    if output_format == "rich":
+        return RichReviewWriter(console)
+    writers: dict[str, type[ReviewWriter]] = {
+        "markdown": MarkdownReviewWriter,
+        "json": JsonReviewWriter,
+        "jsonl": JsonLinesReviewWriter,
+        "sarif": SarifReviewWriter,
+    }
+    return writers[output_format](stream)
@@ -0,0 +1,242 @@
+import math
+import re
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+from git import Repo
+from git.objects import Commit
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.findings import blocking_findings, parse_findings
+
+# Rough sizes used to estimate the prompt tokens of a change before its content is read
+BYTES_PER_TOKEN = 4
+TOKENS_PER_LINE = 10
+
+# Relative risk of a change by file type; extensions not listed are treated as code
+LOW_RISK_EXTENSIONS = frozenset(
+    {
+        ".md",
+        ".rst",
+        ".txt",
+        ".json",
+        ".yaml",
+        ".yml",
+        ".toml",
+        ".ini",
+        ".cfg",
+        ".lock",
+        ".csv",
+        ".svg",
+        ".snap",
+    },
+)
+LOW_RISK_WEIGHT = 0.3
+
+# Paths whose changes are more or less likely to matter, checked in order, first match wins
+RISK_PATH_PATTERNS: tuple[tuple[re.Pattern[str], float], ...] = (
+    (re.compile(r"(^|/)(vendor|third_party|node_modules|dist|build)/"), 0.2),
+    (re.compile(r"(\.min\.js|_pb2\.py|\.generated\.\w+)$"), 0.2),
+    (re.compile(r"(^|/)(tests?|spec|__tests__|fixtures|docs?|examples?)/"), 0.6),
+    (re.compile(r"(^|/)test_[^/]*$|_test\.\w+$|\.spec\.\w+$"), 0.6),
+    (
+        re.compile(
+            r"auth|login|password|secret|token|crypt|secur|permission|payment|billing|"
+            r"migration|schema|sql",
+            re.IGNORECASE,
+        ),
+        1.5,
+    ),
+)
+
+# A review with a finding of this severity or a more severe one counts as flagged
+FLAG_SEVERITY = "major"
+
+# Every earlier flagged review of a file adds this fraction to its risk, up to MAX_FLAGS times
+FLAG_WEIGHT = 0.5
+MAX_FLAGS = 5
+
+
+@dataclass(frozen=True)
+class PrioritizedChange:
+    """A change with its risk score and the estimated prompt tokens of its review."""
+
+    change: FileChange
+    risk: float
+    estimated_tokens: int
+
+
+def churn_stats(
+    repo: Repo,
+    previous_commit: Commit | None,
+    current_commit: Commit | None = None,
+) -> dict[str, tuple[int, int]]:
+    """
+    Count the added and removed lines of every changed file with ``git diff --numstat``.
+
+    Git computes the counts itself, so no blob is read into Python. Without
+    ``current_commit`` the changes staged in the index are counted.
+
+    :param repo: The repository containing the commits.
+    :param previous_commit: The commit the changes are compared with, HEAD for staged changes.
+    :param current_commit: The commit containing the changes, or None for the index.
+    :return: A tuple of (added lines, removed lines) keyed by the path after changes; binary files are left out.
+    """
+    if current_commit is None:
+        output = repo.git.diff("--cached", "--numstat", "-z", "-M")
+    elif previous_commit is None:
+        return {}
+    else:
+        output = repo.git.diff(
+            previous_commit.hexsha,
+            current_commit.hexsha,
+            "--numstat",
+            "-z",
+            "-M",
+        )
+    return parse_numstat(output)
+
+
+def parse_numstat(output: str) -> dict[str, tuple[int, int]]:
+    """
+    Parse the output of ``git diff --numstat -z``.
+
+    A renamed file is a record with an empty path followed by the old and new
+    paths as two more fields.
+
+    :param output: The output of the command.
+    :return: A tuple of (added lines, removed lines) keyed by the path after changes.
+    """
+    churn: dict[str, tuple[int, int]] = {}
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields):
+        record = fields[i]
+        i += 1
+        if not record.strip():
+            continue
+        added, removed, path = record.lstrip("\n").split("\t", 2)
+        if not path:
+            # Renamed: the old path and the new path follow
+            path = fields[i + 1]
+            i += 2
+        if added.isdigit() and removed.isdigit():
+            churn[path] = (int(added), int(removed))
+    return churn
+
+
+def risk_score(change: FileChange, added: int, removed: int, flags: int = 0) -> float:
+    """
+    Score how likely the change of a file needs attention.
+
+    The score grows with the logarithm of the changed lines and is weighted by
+    the file type, the path and how often reviews of the file were flagged
+    before. Only the order of scores is meaningful.
+
+    :param change: The changed file.
+    :param added: The number of added lines.
+    :param removed: The number of removed lines.
+    :param flags: How many earlier reviews of the file had serious findings.
+    :return: The risk score, higher for riskier changes.
+    """
+    score = 1.0 + math.log2(1 + added + removed)
+    if PurePosixPath(change.path).suffix.lower() in LOW_RISK_EXTENSIONS:
+        score *= LOW_RISK_WEIGHT
+    for pattern, weight in RISK_PATH_PATTERNS:
+        if pattern.search(change.path):
+            score *= weight
+            break
+    return score * (1 + FLAG_WEIGHT * min(flags, MAX_FLAGS))
+
+
+def estimate_tokens(
+    change: FileChange,
+    added: int,
+    removed: int,
+    diff_mode: str,
+    context_lines: int,
+) -> int:
+    """
+    Estimate the code tokens sent to review a change, without reading its content.
+
+    :param change: The changed file, with the size of its larger version.
+    :param added: The number of added lines.
+    :param removed: The number of removed lines.
+    :param diff_mode: 'hunks' or 'full', as used by the assistant.
+    :param context_lines: The number of unchanged lines around each change in 'hunks' mode.
+    :return: The estimated number of tokens.
+    """
+    file_tokens = change.size // BYTES_PER_TOKEN
+    if change.change_type == "A":
+        return file_tokens
+    if diff_mode == "full":
+        return 2 * file_tokens
+    diff_tokens = (added + removed + 2 * context_lines) * TOKENS_PER_LINE
+    return min(diff_tokens, 2 * file_tokens) if file_tokens else diff_tokens
+
+
+def prioritize(
+    changes: Sequence[FileChange],
+    churn: Mapping[str, tuple[int, int]],
+    flags: Mapping[str, int],
+    diff_mode: str,
+    context_lines: int,
+    request_tokens: int = 0,
+    max_tokens: int | None = None,
+) -> tuple[list[PrioritizedChange], list[PrioritizedChange]]:
+    """
+    Order changes from the highest to the lowest risk and cut them at a token budget.
+
+    Changes are selected by risk until the next one would exceed ``max_tokens``;
+    smaller changes further down the order are still selected if they fit.
+
+    :param changes: The changes to review.
+    :param churn: The added and removed lines of each path, from churn_stats.
+    :param flags: How many earlier reviews of each path were flagged.
+    :param diff_mode: 'hunks' or 'full', as used by the assistant.
+    :param context_lines: The number of unchanged lines around each change in 'hunks' mode.
+    :param request_tokens: The tokens sent with every request next to the code, such as the system prompt.
+    :param max_tokens: The budget of estimated prompt tokens, or None for no budget.
+    :return: A tuple of (selected changes, changes over the budget), both ordered by risk.
+    """
+    scored = []
+    for change in changes:
+        added, removed = churn.get(change.path, (0, 0))
+        scored.append(
+            PrioritizedChange(
+                change,
+                risk_score(change, added, removed, flags.get(change.path, 0)),
+                estimate_tokens(change, added, removed, diff_mode, context_lines)
+                + request_tokens,
+            ),
+        )
+    # The sort is stable, so changes of equal risk keep the order of the diff
+    scored.sort(key=lambda prioritized: -prioritized.risk)
+    if max_tokens is None:
+        return scored, []
+
+    selected: list[PrioritizedChange] = []
+    over_budget: list[PrioritizedChange] = []
+    remaining = max_tokens
+    for prioritized in scored:
+        if prioritized.estimated_tokens <= remaining:
+            selected.append(prioritized)
+            remaining -= prioritized.estimated_tokens
+        else:
+            over_budget.append(prioritized)
+    return selected, over_budget
+
+
+def flagged_reviews(reviews: Mapping[str, str]) -> dict[str, str]:
+    """
+    Select the reviews with a finding of at least FLAG_SEVERITY.
+
+    :param reviews: The reviews keyed by file path.
+    :return: The flagged reviews keyed by file path.
+    """
+    return {
+        path: review
+        for path, review in reviews.items()
+        if blocking_findings(parse_findings(path, review), FLAG_SEVERITY)
+    }
@@ -0,0 +1,288 @@
+import random
+import re
+import threading
+import time
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+# Vendors enforce per-minute limits over shorter windows, so the budget of only this
+# many seconds can be used at once and requests are paced rather than sent in a burst
+BURST_SECONDS = 1.0
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429})
+
+# Connection failures carry no status code, so they are recognised by name
+_RETRYABLE_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError"})
+
+# OpenAI writes reset times such as "1s", "6m0s" or "120ms"
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Names of the rate limit headers of each vendor, for requests and for tokens
+_LIMIT_HEADERS = {
+    "requests": (
+        "x-ratelimit-limit-requests",
+        "anthropic-ratelimit-requests-limit",
+    ),
+    "tokens": (
+        "x-ratelimit-limit-tokens",
+        "anthropic-ratelimit-tokens-limit",
+    ),
+}
+_REMAINING_HEADERS = {
+    "requests": (
+        "x-ratelimit-remaining-requests",
+        "anthropic-ratelimit-requests-remaining",
+    ),
+    "tokens": (
+        "x-ratelimit-remaining-tokens",
+        "anthropic-ratelimit-tokens-remaining",
+    ),
+}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check whether a failed request to the vendor API is worth sending again.
+
+    :param error: The exception raised by the chat model.
+    :return: True for rate limits, timeouts, server errors and connection failures.
+    """
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return type(error).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def error_headers(error: BaseException) -> Mapping[str, str]:
+    """
+    Get the HTTP response headers of a failed request, if the error carries them.
+
+    :param error: The exception raised by the chat model.
+    :return: The response headers, or an empty mapping.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    return headers if isinstance(headers, Mapping) else {}
+
+
+def parse_duration(value: str) -> float | None:
+    """
+    Parse a rate limit reset or retry delay into seconds.
+
+    :param value: A number of seconds, a duration such as "6m0s", or an RFC 3339 timestamp.
+    :return: The number of seconds, or None if the value cannot be parsed.
+    """
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        reset = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if reset.tzinfo is None:
+        reset = reset.replace(tzinfo=UTC)
+    return max((reset - datetime.now(UTC)).total_seconds(), 0.0)
+
+
+def retry_after(headers: Mapping[str, str]) -> float | None:
+    """
+    Read how long the vendor asks to wait before the next request.
+
+    :param headers: The HTTP response headers of a rate limited request.
+    :return: The delay in seconds, or None if the headers do not say.
+    """
+    lowered = {name.lower(): value for name, value in headers.items()}
+    if "retry-after-ms" in lowered:
+        delay = parse_duration(lowered["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    if "retry-after" in lowered:
+        return parse_duration(lowered["retry-after"])
+    return None
+
+
+@dataclass
+class TokenBucket:
+    """A budget per minute that refills continuously and may be overdrawn."""
+
+    per_minute: float
+    level: float
+    updated: float
+
+    @property
+    def capacity(self) -> float:
+        return self.per_minute * BURST_SECONDS / 60
+
+    def refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity,
+            self.level + (now - self.updated) * self.per_minute / 60,
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # Requests larger than the bucket wait for a full bucket, then overdraw it
+        missing = min(amount, self.capacity) - self.level
+        return max(missing * 60 / self.per_minute, 0.0)
+
+
+class RateLimiter:
+    """
+    Schedule requests within a requests-per-minute and tokens-per-minute budget.
+
+    Every request takes one request and its estimated prompt tokens from two
+    token buckets, waiting until both have enough left. The buckets hold about a
+    second of the budget, so requests are paced evenly. They also follow the
+    rate limit headers of the vendor: the limits are adopted when no budget is
+    configured, and the remaining quota, which other clients of the same API key
+    also use up, lowers the buckets. A rate limited request pauses all requests,
+    for as long as the vendor asks or else with jittered exponential backoff.
+
+    One limiter is shared by all requests of a run, so concurrent workers stay
+    within the budget together.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        """
+        Initialize the RateLimiter.
+
+        :param requests_per_minute: The request budget, or None to follow the vendor's headers only.
+        :param tokens_per_minute: The prompt token budget, or None to follow the vendor's headers only.
+        :param base_backoff: The backoff in seconds after the first failed attempt.
+        :param max_backoff: The longest backoff in seconds.
+        :param clock: Monotonic clock, replaceable in tests.
+        :param sleep: Sleep function, replaceable in tests.
+        """
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._buckets: dict[str, TokenBucket] = {}
+        for kind, per_minute in (
+            ("requests", requests_per_minute),
+            ("tokens", tokens_per_minute),
+        ):
+            if per_minute:
+                self._add_bucket(kind, per_minute, clock())
+
+    def _add_bucket(self, kind: str, per_minute: float, now: float) -> TokenBucket:
+        bucket = TokenBucket(per_minute, 0.0, now)
+        bucket.level = bucket.capacity
+        self._buckets[kind] = bucket
+        return bucket
+
+    @property
+    def limits_tokens(self) -> bool:
+        return "tokens" in self._buckets
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Wait until a request with the given prompt size fits in the budget, and take it.
+
+        :param tokens: The estimated number of tokens of the request.
+        :return: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                amounts = {"requests": 1, "tokens": tokens}
+                wait = self._paused_until - now
+                for kind, bucket in self._buckets.items():
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amounts[kind]))
+                if wait <= 0:
+                    for kind, bucket in self._buckets.items():
+                        bucket.level -= amounts[kind]
+                    return waited
+            self._sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Correct the token bucket once the real usage of a request is known.
+
+        :param estimated_tokens: The tokens taken by acquire.
+        :param actual_tokens: The tokens the vendor counted, 0 if unknown.
+        """
+        if not actual_tokens:
+            return
+        with self._lock:
+            bucket = self._buckets.get("tokens")
+            if bucket is not None:
+                bucket.level -= actual_tokens - estimated_tokens
+
+    def update_from_headers(self, headers: Mapping[str, str] | None) -> None:
+        """
+        Adapt the budget to the rate limit headers of a response.
+
+        :param headers: The HTTP response headers, or None if the vendor does not expose them.
+        """
+        if not headers:
+            return
+        lowered = {name.lower(): value for name, value in headers.items()}
+        with self._lock:
+            now = self._clock()
+            for kind in ("requests", "tokens"):
+                limit = _header_number(lowered, _LIMIT_HEADERS[kind])
+                remaining = _header_number(lowered, _REMAINING_HEADERS[kind])
+                bucket = self._buckets.get(kind)
+                if bucket is None:
+                    if not limit:
+                        continue
+                    bucket = self._add_bucket(kind, limit, now)
+                bucket.refill(now)
+                if limit and limit < bucket.per_minute:
+                    bucket.per_minute = limit
+                if remaining is not None:
+                    bucket.level = min(bucket.level, remaining)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Pause all requests after a failed attempt.
+
+        :param attempt: The number of the failed attempt, starting with 0.
+        :param error: The exception raised by the chat model.
+        :return: The pause in seconds.
+        """
+        headers = error_headers(error)
+        delay = retry_after(headers)
+        if delay is None:
+            # Full jitter keeps workers that failed together from retrying together
+            delay = random.uniform(
+                0,
+                min(self.max_backoff, self.base_backoff * 2**attempt),
+            )
+        self.update_from_headers(headers)
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+        return delay
+
+
+def _header_number(headers: Mapping[str, str], names: tuple[str, ...]) -> float | None:
+    for name in names:
+        if name in headers:
+            try:
+                return float(headers[name])
+            except ValueError:
+                return None
+    return None
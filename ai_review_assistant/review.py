@@ -1,20 +1,174 @@
+import hashlib
+import importlib
+import re
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Any, Literal
 
-import tiktoken
 import toml
-from langchain_anthropic import ChatAnthropic
-from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import HumanMessage
-from langchain_core.pydantic_v1 import SecretStr
-from langchain_openai import ChatOpenAI
+
+from ai_review_assistant.cache import ReviewCache, git_blob_sha
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.chunking import chunk_changes, pack_hunks
+from ai_review_assistant.context import ReviewContext
+from ai_review_assistant.diff import TokenSavings, build_unified_diff, split_hunks
+from ai_review_assistant.findings import (
+    EARLIER_REVIEW_HEADING,
+    FINDINGS_SCHEMA,
+    format_findings,
+)
+from ai_review_assistant.ignore import SETTINGS_FILE_PATTERNS, PathFilter
+from ai_review_assistant.priority import BYTES_PER_TOKEN
+from ai_review_assistant.ratelimit import RateLimiter, is_retryable
+from ai_review_assistant.state import ReviewedFile, ReviewState
+from ai_review_assistant.stats import CallStats, ReviewStats
+from ai_review_assistant.structure import scan_project_structure
+from ai_review_assistant.symbols import SymbolIndex
+from ai_review_assistant.tokens import TokenCounter
+from ai_review_assistant.usage import PromptCacheUsage, message_token_usage
+
+# Beta header enabling cache_control blocks in the Anthropic Messages API
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+# Stands in for the file path in the system prompt, which must be the same for every file
+SYSTEM_PROMPT_FILE_PATH = "the file named in the request below"
+
+# Delimiter lines separating files in a batch prompt and their reviews in the answer
+BATCH_FILE_DELIMITER = "=== FILE: {path} ==="
+BATCH_REVIEW_DELIMITER = "=== REVIEW: {path} ==="
+_BATCH_REVIEW_PATTERN = re.compile(
+    r"^[ \t#*]*=== REVIEW: (.+?) ===[ \t*]*$",
+    re.MULTILINE,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import BaseMessage
+    from langchain_core.runnables import Runnable
+    from tiktoken import Encoding
+
+# Vendor SDKs and tiktoken are imported on first use, so commands that never talk to
+# the LLM (--help, --version, a hook run with nothing to review) do not load LangChain.
+_LAZY_IMPORTS: dict[str, tuple[str, str | None]] = {
+    "tiktoken": ("tiktoken", None),
+    "ChatOpenAI": ("langchain_openai", "ChatOpenAI"),
+    "ChatAnthropic": ("langchain_anthropic", "ChatAnthropic"),
+    "HumanMessage": ("langchain_core.messages", "HumanMessage"),
+    "SystemMessage": ("langchain_core.messages", "SystemMessage"),
+    "SecretStr": ("langchain_core.pydantic_v1", "SecretStr"),
+    "FakeReviewChatModel": ("ai_review_assistant.fake", "FakeReviewChatModel"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name: str) -> Any:
+    """Resolve a lazily imported name, honouring values patched onto this module."""
+    return getattr(sys.modules[__name__], name)
+
+
+def _create_openai_llm(assistant: "CodeReviewAssistant") -> "BaseChatModel":
+    return _lazy("ChatOpenAI")(
+        model=assistant.model_name,
+        temperature=assistant.temperature,
+        # Retries are scheduled by the assistant's rate limiter, which reads these headers
+        max_retries=0,
+        api_key=_lazy("SecretStr")(assistant.api_key),
+        include_response_headers=True,
+    )
+
+
+def _create_anthropic_llm(assistant: "CodeReviewAssistant") -> "BaseChatModel":
+    return _lazy("ChatAnthropic")(
+        model_name=assistant.model_name,
+        temperature=assistant.temperature,
+        # Retries are scheduled by the assistant's rate limiter
+        max_retries=0,
+        api_key=_lazy("SecretStr")(assistant.api_key),
+        stop=None,
+        timeout=None,
+        base_url=None,
+        default_headers={"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA},
+    )
+
+
+def _create_fake_llm(_: "CodeReviewAssistant") -> "BaseChatModel":
+    return _lazy("FakeReviewChatModel").from_env()
+
+
+def _plain_system_message(text: str) -> "BaseMessage":
+    # OpenAI caches the longest previously seen prompt prefix automatically
+    return _lazy("SystemMessage")(content=text)
+
+
+def _cached_system_message(text: str) -> "BaseMessage":
+    # Anthropic caches the prompt up to the last block marked with cache_control
+    return _lazy("SystemMessage")(
+        content=[
+            {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}},
+        ],
+    )
+
+
+def _create_openai_tokenizer(assistant: "CodeReviewAssistant") -> "Encoding":
+    return _lazy("tiktoken").encoding_for_model(assistant.model_name)
+
+
+def _create_cl100k_tokenizer(_: "CodeReviewAssistant") -> "Encoding":
+    return _lazy("tiktoken").get_encoding("cl100k_base")
+
+
+class ReviewCancelledError(Exception):
+    """Raised instead of sending a request after the run was cancelled."""
+
+
+@dataclass(frozen=True)
+class VendorBackend:
+    """Factories for the chat model, the tokenizer and the system message of an AI vendor."""
+
+    create_llm: Callable[["CodeReviewAssistant"], "BaseChatModel"]
+    create_tokenizer: Callable[["CodeReviewAssistant"], "Encoding"]
+    create_system_message: Callable[[str], "BaseMessage"] = _plain_system_message
+
+
+VENDOR_BACKENDS: dict[str, VendorBackend] = {
+    "openai": VendorBackend(_create_openai_llm, _create_openai_tokenizer),
+    "anthropic": VendorBackend(
+        _create_anthropic_llm,
+        _create_cl100k_tokenizer,
+        _cached_system_message,
+    ),
+    # Answers locally, for measuring the pipeline without network access
+    "fake": VendorBackend(_create_fake_llm, _create_cl100k_tokenizer),
+}
 
 
 class CodeReviewAssistant:
+    # Tokens kept free in every request for the model's answer
+    RESPONSE_TOKEN_RESERVE = 4096
+    # Smallest amount of code worth sending in one request, even with a tiny batch size
+    MIN_CHUNK_TOKENS = 512
+    # Tokens of an earlier review kept as context for, and appended to, an incremental review
+    PREVIOUS_REVIEW_TOKENS = 1000
+
     def __init__(
         self,
         repo_path: str,
-        vendor_name: Literal["openai", "anthropic"],
+        vendor_name: Literal["openai", "anthropic", "fake"],
         model_name: str,
         api_key: str,
         temperature: float = 0.0,
@@ -23,12 +177,23 @@ class CodeReviewAssistant:
         result_output_language: str = "English",
         batch_size: int = 100000,
         ignore_settings_files: bool = True,
+        cache: ReviewCache | None = None,
+        diff_mode: Literal["full", "hunks"] = "full",
+        context_lines: int = 3,
+        max_structure_entries: int = 2000,
+        max_structure_tokens: int = 8000,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_retries: int = 5,
+        review_state: ReviewState | None = None,
+        structured: bool = False,
+        symbol_context_tokens: int = 0,
     ):
         """
         Initialize the CodeReviewAssistant.
 
         :param repo_path: Path to the Git repository.
-        :param vendor_name: The name of the AI vendor ('openai' or 'anthropic').
+        :param vendor_name: The name of the AI vendor ('openai', 'anthropic' or 'fake').
         :param model_name: The model name or identifier provided by the vendor.
         :param api_key: The API key for the chosen vendor.
         :param temperature: The temperature setting for the LLM (0.0 to 1.0).
@@ -37,6 +202,22 @@ class CodeReviewAssistant:
         :param result_output_language: The language for the output review.
         :param batch_size: The maximum number of tokens to process in a single batch when reviewing large files.
                        Defaults to 100000. Larger values may improve performance but increase memory usage.
+        :param ignore_settings_files: Whether to skip settings and config files.
+        :param cache: Optional cache of previous reviews. When set, unchanged files are not sent to the LLM again.
+        :param diff_mode: 'full' sends the whole file before and after changes, 'hunks' sends only a unified diff.
+        :param context_lines: The number of unchanged lines kept around each change in 'hunks' mode.
+        :param max_structure_entries: The maximum number of files and directories listed in the project structure.
+        :param max_structure_tokens: The maximum number of tokens of the project structure.
+        :param requests_per_minute: The budget of requests per minute, or None to follow the vendor's rate limit headers.
+        :param tokens_per_minute: The budget of prompt tokens per minute, or None to follow the vendor's rate limit headers.
+        :param max_retries: How many times a rate limited or failed request is sent again.
+        :param review_state: Optional record of the last reviewed revision of every file. When set, a file reviewed
+                       before is reviewed only for the changes since that revision.
+        :param structured: Whether to ask the model for findings with a severity and line range through its
+                       structured output, instead of a prose review. Files are then never reviewed in batches.
+        :param symbol_context_tokens: The maximum number of tokens of related code from other files, the definitions
+                       called by the changed lines and the code calling the changed definitions, added to the review
+                       of a single file. 0 disables the symbol index.
         """
         self.repo_path = repo_path
         self.vendor_name = vendor_name.lower()
@@ -48,36 +229,146 @@ class CodeReviewAssistant:
         self.result_output_language = result_output_language
         self.batch_size = batch_size
         self.ignore_settings_files = ignore_settings_files
+        self.cache = cache
+        self.review_state = review_state
+        self.structured = structured
+        self.symbol_context_tokens = symbol_context_tokens
+        self.symbol_index = (
+            SymbolIndex.for_repo(repo_path) if symbol_context_tokens > 0 else None
+        )
+        self.diff_mode = diff_mode
+        self.context_lines = context_lines
+        self.max_structure_entries = max_structure_entries
+        self.max_structure_tokens = max_structure_tokens
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.token_savings = TokenSavings()
+        self.prompt_cache_usage = PromptCacheUsage()
+        self.stats = ReviewStats()
+        self.context = ReviewContext(
+            repo_path,
+            self.get_project_structure,
+            self.read_prompt_template_from_toml,
+            self.read_path_filter_from_toml,
+        )
 
-        self.llm = self._initialize_llm()
-
-        if self.vendor_name == "openai":
-            self.tokenizer = tiktoken.encoding_for_model(self.model_name)
-        elif self.vendor_name == "anthropic":
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
-        else:
+        if self.vendor_name not in VENDOR_BACKENDS:
             raise ValueError(f"Vendor '{self.vendor_name}' is not supported.")
 
-    def _initialize_llm(self) -> BaseChatModel:
-        if self.vendor_name == "openai":
-            return ChatOpenAI(
-                model=self.model_name,
-                temperature=self.temperature,
-                max_retries=2,
-                api_key=SecretStr(self.api_key),
-            )
-        elif self.vendor_name == "anthropic":
-            return ChatAnthropic(
-                model_name=self.model_name,
-                temperature=self.temperature,
-                max_retries=2,
-                api_key=SecretStr(self.api_key),
-                stop=None,
-                timeout=None,
-                base_url=None,
-            )
-        else:
+        # The chat model and the tokenizer are created on first use
+        self._llm: BaseChatModel | None = None
+        self._structured_llm: Runnable[Any, Any] | None = None
+        self._tokenizer: Encoding | None = None
+        self._init_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        # The run a review started in, bound to the thread reviewing it
+        self._bound = threading.local()
+        self.token_counter = TokenCounter(lambda: self.tokenizer)
+
+    def start_run(self) -> None:
+        """
+        Reset the measurements of the previous run, for an assistant reused for several runs.
+
+        The chat model, the tokenizer, cached token counts and the rate limiter are
+        kept, which is what makes reusing the assistant fast. The review context is
+        computed again on first use, since files may have been added anywhere in the
+        repository since the last run.
+        """
+        self.stats = ReviewStats()
+        self.token_savings = TokenSavings()
+        self.prompt_cache_usage = PromptCacheUsage()
+        if self.cache is not None:
+            self.cache.reset_counters()
+        if self.review_state is not None:
+            self.review_state.reset_counters()
+        self.context.invalidate()
+        if self.symbol_index is not None:
+            self.symbol_index.invalidate()
+        # A new event rather than clearing the old one, so reviews still running
+        # from a cancelled run stay cancelled
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Cancel the current run, making requests not sent yet raise ReviewCancelledError.
+
+        Requests already sent are not interrupted. Reviews of the next run, after
+        start_run, send requests again; the ones left over from this run do not.
+        """
+        self._cancelled.set()
+
+    @contextmanager
+    def _bind_run(self) -> Iterator[None]:
+        # Requests check the cancellation and record their stats of the run they
+        # started in, not the one current when they return
+        if getattr(self._bound, "run", None) is not None:
+            yield
+            return
+        self._bound.run = (self._cancelled, self.stats)
+        try:
+            yield
+        finally:
+            self._bound.run = None
+
+    def _current_run(self) -> tuple[threading.Event, ReviewStats]:
+        return getattr(self._bound, "run", None) or (self._cancelled, self.stats)
+
+    @contextmanager
+    def _count_sent_tokens(self) -> Iterator[list[int]]:
+        # Sums the prompt tokens of the requests sent inside the block, what the
+        # review actually cost whether whole files, a diff or a batch were sent
+        sent = [0]
+        self._bound.sent_tokens = sent
+        try:
+            yield sent
+        finally:
+            self._bound.sent_tokens = None
+
+    @property
+    def llm(self) -> "BaseChatModel":
+        if self._llm is None:
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm = self._initialize_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm: "BaseChatModel") -> None:
+        self._llm = llm
+        self._structured_llm = None
+
+    @property
+    def structured_llm(self) -> "Runnable[Any, Any]":
+        """The chat model answering with the raw message and the findings parsed from it."""
+        if self._structured_llm is None:
+            llm = self.llm
+            with self._init_lock:
+                if self._structured_llm is None:
+                    self._structured_llm = llm.with_structured_output(
+                        FINDINGS_SCHEMA,
+                        include_raw=True,
+                    )
+        return self._structured_llm
+
+    @property
+    def tokenizer(self) -> "Encoding":
+        if self._tokenizer is None:
+            with self._init_lock:
+                if self._tokenizer is None:
+                    self._tokenizer = VENDOR_BACKENDS[
+                        self.vendor_name
+                    ].create_tokenizer(self)
+        return self._tokenizer
+
+    @tokenizer.setter
+    def tokenizer(self, tokenizer: "Encoding") -> None:
+        self._tokenizer = tokenizer
+
+    def _initialize_llm(self) -> "BaseChatModel":
+        backend = VENDOR_BACKENDS.get(self.vendor_name)
+        if backend is None:
             raise ValueError(f"Vendor '{self.vendor_name}' is not supported.")
+        return backend.create_llm(self)
 
     def count_tokens(self, text: str) -> int:
         """
@@ -86,109 +377,792 @@ class CodeReviewAssistant:
         :param text: The text to count tokens for.
         :return: The number of tokens in the text.
         """
-        return len(self.tokenizer.encode(text))
+        with self.stats.time_tokenize():
+            return self.token_counter.count(text)
+
+    def count_tokens_batch(self, texts: Sequence[str]) -> list[int]:
+        """
+        Count the number of tokens in several texts at once.
+
+        :param texts: The texts to count tokens for.
+        :return: The number of tokens in each text, in order.
+        """
+        with self.stats.time_tokenize():
+            return self.token_counter.count_batch(texts)
+
+    def fits_token_budget(self, budget: int, *texts: str) -> bool:
+        """
+        Check whether texts fit a token budget, without encoding texts that clearly do.
+
+        :param budget: The maximum number of tokens.
+        :param texts: The texts to check.
+        :return: True if the texts have at most ``budget`` tokens together.
+        """
+        with self.stats.time_tokenize():
+            return self.token_counter.fits(budget, *texts)
+
+    def path_filter(self) -> PathFilter:
+        """
+        Get the filter selecting the files to review.
+
+        It combines the settings files skipped with ``ignore_settings_files`` and the
+        ``include`` and ``exclude`` patterns of ``[tool.code_review_assistant]`` in
+        pyproject.toml, and is compiled once per run.
+
+        :return: The path filter.
+        """
+        return self.context.path_filter(self.ignore_settings_files)
 
     def should_ignore_file(self, file_path: str) -> bool:
         """
-        Check if the file should be ignored based on its name or extension.
+        Check if the file should be ignored based on the include and exclude patterns.
 
         :param file_path: Path to the file
         :return: True if the file should be ignored, False otherwise
         """
-        if not self.ignore_settings_files:
-            return False
-
-        file_name = Path(file_path).name
-        ignored_extensions = (".toml", ".lock", ".md", ".txt", ".in", ".ini", ".cfg")
-        return file_name.startswith(".") or (
-            self.ignore_settings_files and file_name.endswith(ignored_extensions)
-        )
+        return not self.path_filter().includes(file_path)
 
     def review_changes(
         self,
         file_path: str,
         before_code: str,
         after_code: str,
+        on_token: Callable[[str], None] | None = None,
+        old_path: str | None = None,
     ) -> str | None:
         """
         Review the changes made to a file.
 
+        An added file is reviewed from its content alone. A renamed file is
+        reviewed as a change against its previous path, so a pure rename costs
+        nothing.
+
         :param file_path: The path of the file being reviewed.
-        :param before_code: The code before changes.
+        :param before_code: The code before changes, empty for an added file.
         :param after_code: The code after changes.
+        :param on_token: Optional callback receiving the review text as the model streams it.
+        :param old_path: The previous path of a renamed file.
         :return: A string containing the review of the changes.
         """
-        if self.should_ignore_file(file_path):
+        if self.should_ignore_file(file_path) or before_code == after_code:
+            return None
+
+        with self._bind_run(), self.stats.track_file(file_path):
+            file_header = self._file_header(file_path, old_path)
+            related_code = self._related_code(file_path, before_code, after_code)
+            if related_code:
+                file_header = f"{file_header}\n\n{related_code}"
+
+            if self.cache is None:
+                return self._review_since(
+                    self._previous_review(file_path, old_path),
+                    file_path,
+                    file_header,
+                    before_code,
+                    after_code,
+                    on_token,
+                    old_path,
+                )
+
+            cache_key = self._cache_key(file_header, before_code, after_code)
+            cached_review = self.cache.get(cache_key)
+            if cached_review is not None:
+                self._remember_review(file_path, after_code, cached_review)
+                return cached_review
+
+            start = time.perf_counter()
+            with self._count_sent_tokens() as sent:
+                review = self._review_since(
+                    self._previous_review(file_path, old_path),
+                    file_path,
+                    file_header,
+                    before_code,
+                    after_code,
+                    on_token,
+                    old_path,
+                )
+            self._cache_review(cache_key, review, sent[0], time.perf_counter() - start)
+            return review
+
+    def review_changes_batch(
+        self,
+        changes: Sequence[FileChange],
+    ) -> dict[str, str | None]:
+        """
+        Review several small changes in a single request.
+
+        The base prompt and project structure are sent once for all files, and
+        the model is asked to start the review of every file with a delimiter
+        line. Files whose review cannot be found in the response, files with an
+        earlier reviewed revision in ``review_state``, and all files of a
+        structured review are reviewed with a request of their own.
+
+        :param changes: The changed files to review together, as grouped by pack_changes.
+        :return: The review of each file, or None for ignored and unchanged files.
+        """
+        with self._bind_run(), self.stats.track_file(
+            ", ".join(change.path for change in changes),
+        ):
+            reviews: dict[str, str | None] = {}
+            pending: list[
+                tuple[FileChange, str, str, str, str | None, ReviewedFile | None]
+            ] = []
+            for change in changes:
+                before_code, after_code = change.before, change.after
+                if self.should_ignore_file(change.path) or before_code == after_code:
+                    reviews[change.path] = None
+                    continue
+                file_header = self._file_header(change.path, change.old_path)
+                cache_key = None
+                if self.cache is not None:
+                    cache_key = self._cache_key(file_header, before_code, after_code)
+                    cached_review = self.cache.get(cache_key)
+                    if cached_review is not None:
+                        self._remember_review(change.path, after_code, cached_review)
+                        reviews[change.path] = cached_review
+                        continue
+                previous = self._previous_review(change.path, change.old_path)
+                pending.append(
+                    (change, file_header, before_code, after_code, cache_key, previous),
+                )
+
+            # Files reviewed before are reviewed on their own, against that revision
+            batched = [
+                (change, before, after)
+                for change, _, before, after, _, previous in pending
+                if previous is None
+            ]
+            if len(batched) > 1 and not self.structured:
+                start = time.perf_counter()
+                with self._count_sent_tokens() as sent:
+                    parsed = self.split_batch_review(
+                        self.get_review(self.construct_batch_prompt(batched)),
+                    )
+                seconds = (time.perf_counter() - start) / len(batched)
+                tokens = sent[0] // len(batched)
+            else:
+                parsed, seconds, tokens = {}, 0.0, 0
+
+            for (
+                change,
+                file_header,
+                before_code,
+                after_code,
+                cache_key,
+                previous,
+            ) in pending:
+                review = parsed.get(change.path)
+                if review:
+                    self._remember_review(change.path, after_code, review)
+                else:
+                    # The file is missing from the combined answer, or it was the only one left
+                    start = time.perf_counter()
+                    with self._count_sent_tokens() as sent:
+                        review = self._review_since(
+                            previous,
+                            change.path,
+                            file_header,
+                            before_code,
+                            after_code,
+                            old_path=change.old_path,
+                        )
+                    seconds = time.perf_counter() - start
+                    tokens = sent[0]
+                reviews[change.path] = review
+                if cache_key is not None:
+                    self._cache_review(cache_key, review, tokens, seconds)
+            return {
+                change.path: reviews[change.path]
+                for change in changes
+                if change.path in reviews
+            }
+
+    def pack_changes(
+        self,
+        changes: Sequence[FileChange],
+        max_tokens: int,
+    ) -> list[list[FileChange]]:
+        """
+        Group small changes into batches that are reviewed in a single request.
+
+        Changes are packed in order until the code of a batch would exceed
+        ``max_tokens``, estimated from the size of each file so that no content
+        is read before the reviews start. Changes larger than that and ignored
+        files end up in a batch of their own.
+
+        :param changes: The changed files to review.
+        :param max_tokens: The maximum number of code tokens in one batch.
+        :return: The list of batches, each a list of changes.
+        """
+        batches: list[list[FileChange]] = []
+        batch: list[FileChange] = []
+        batch_tokens = 0
+        for change in changes:
+            tokens = change.size // BYTES_PER_TOKEN
+            # Full mode sends both versions of a changed file
+            if self.diff_mode == "full" and change.change_type != "A":
+                tokens *= 2
+            if self.should_ignore_file(change.path) or tokens > max_tokens:
+                batches.append([change])
+                continue
+            if batch and batch_tokens + tokens > max_tokens:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(change)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _file_header(self, file_path: str, old_path: str | None = None) -> str:
+        return self.construct_file_header(
+            (
+                f"{file_path} (renamed from {old_path})"
+                if old_path and old_path != file_path
+                else file_path
+            ),
+        )
+
+    def _related_code(self, file_path: str, before_code: str, after_code: str) -> str:
+        # Only single file reviews get related code, a batch shares one budget between files
+        if self.symbol_index is None:
+            return ""
+        return self.symbol_index.related_code(
+            file_path,
+            before_code,
+            after_code,
+            self.symbol_context_tokens,
+            self.count_tokens,
+        )
+
+    def _cache_key(self, file_header: str, before_code: str, after_code: str) -> str:
+        return ReviewCache.make_key(
+            before_blob=git_blob_sha(before_code),
+            after_blob=git_blob_sha(after_code),
+            vendor=self.vendor_name,
+            model=self.model_name,
+            temperature=self.temperature,
+            prompt=hashlib.sha256(
+                f"{self.construct_system_prompt()}\n{file_header}".encode(),
+            ).hexdigest(),
+            result_output_language=self.result_output_language,
+            diff_mode=self.diff_mode,
+            context_lines=self.context_lines,
+            **self._answer_format(),
+        )
+
+    def _cache_review(
+        self,
+        cache_key: str,
+        review: str,
+        tokens: int,
+        seconds: float,
+    ) -> None:
+        if self.cache is None:
+            return
+        self.cache.set(cache_key, review, tokens=tokens, seconds=seconds)
+
+    def _state_fingerprint(self) -> str:
+        # The instructions without the project structure, so adding or removing a file
+        # elsewhere in the repository keeps the reviewed revisions of all other files
+        instructions = self.construct_system_prompt(project_structure="")
+        return ReviewCache.make_key(
+            vendor=self.vendor_name,
+            model=self.model_name,
+            prompt=hashlib.sha256(instructions.encode()).hexdigest(),
+            code_depth=self.code_depth,
+            result_output_language=self.result_output_language,
+            **self._answer_format(),
+        )
+
+    def _answer_format(self) -> dict[str, str]:
+        # Left out for prose reviews, which keeps the keys of reviews stored before structured ones existed
+        return {"answer": "findings"} if self.structured else {}
+
+    def _previous_review(
+        self,
+        file_path: str,
+        old_path: str | None = None,
+    ) -> ReviewedFile | None:
+        if self.review_state is None:
             return None
+        fingerprint = self._state_fingerprint()
+        previous = self.review_state.get(file_path, fingerprint)
+        if previous is None and old_path and old_path != file_path:
+            previous = self.review_state.get(old_path, fingerprint)
+        return previous
+
+    def _remember_review(self, file_path: str, after_code: str, review: str) -> None:
+        if self.review_state is not None:
+            self.review_state.set(
+                file_path,
+                self._state_fingerprint(),
+                after_code,
+                review,
+            )
+
+    def _review_since(
+        self,
+        previous: ReviewedFile | None,
+        file_path: str,
+        file_header: str,
+        before_code: str,
+        after_code: str,
+        on_token: Callable[[str], None] | None = None,
+        old_path: str | None = None,
+    ) -> str:
+        """
+        Review a change, only for the edits since an earlier reviewed revision if there is one.
+
+        The earlier revision is used when the diff from it is not larger than the
+        diff of the change itself, so after fix-up commits only the new edits are
+        sent, together with the findings of the earlier review. The review is
+        recorded in ``review_state`` as the review of the code after changes.
+
+        :param previous: The last reviewed revision of the file, from _previous_review.
+        :param file_path: The path of the file being reviewed.
+        :param file_header: The text sent in front of the code in the user message.
+        :param before_code: The code before changes, empty for an added file.
+        :param after_code: The code after changes.
+        :param on_token: Optional callback receiving the review text as the model streams it.
+        :param old_path: The previous path of a renamed file.
+        :return: The review of the code after changes.
+        """
+        if previous is not None and previous.blob == git_blob_sha(after_code):
+            return previous.review
+
+        if previous is not None and len(
+            build_unified_diff(file_path, previous.content, after_code, 0),
+        ) <= len(build_unified_diff(file_path, before_code, after_code, 0)):
+            review = self._review_incremental(
+                file_path,
+                file_header,
+                previous,
+                after_code,
+                on_token,
+            )
+        else:
+            review = self._review_code(
+                file_path,
+                file_header,
+                before_code,
+                after_code,
+                on_token,
+                old_path,
+            )
+        self._remember_review(file_path, after_code, review)
+        return review
+
+    def _review_incremental(
+        self,
+        file_path: str,
+        file_header: str,
+        previous: ReviewedFile,
+        after_code: str,
+        on_token: Callable[[str], None] | None = None,
+    ) -> str:
+        revision = previous.blob[:7]
+        earlier_review = self._shorten(previous.review, self.PREVIOUS_REVIEW_TOKENS)
+        incremental_header = (
+            f"{file_header}\n\n"
+            f"Revision {revision} of this file was reviewed before, with these findings:\n"
+            f"{earlier_review}\n\n"
+            "Only the changes made since that revision follow. Review them, and "
+            "mention which of the earlier findings they resolve."
+        )
+        review = self._review_diff(
+            file_path,
+            incremental_header,
+            previous.content,
+            after_code,
+            on_token,
+        )
+        earlier = (
+            f"\n\n{EARLIER_REVIEW_HEADING} (revision {revision}):\n{earlier_review}"
+        )
+        if on_token is not None:
+            on_token(earlier)
+        return review + earlier
 
-        project_structure = self.get_project_structure(self.repo_path, self.code_depth)
-        base_prompt = self.construct_base_prompt(file_path, project_structure)
+    def _shorten(self, text: str, max_tokens: int) -> str:
+        if self.fits_token_budget(max_tokens, text):
+            return text
+        lines = text.splitlines()
+        kept: list[str] = []
+        tokens = 0
+        for line, line_tokens in zip(
+            lines,
+            self.count_tokens_batch(lines),
+            strict=True,
+        ):
+            tokens += line_tokens
+            if tokens > max_tokens:
+                break
+            kept.append(line)
+        return "\n".join([*kept, "[...]"])
+
+    def _review_code(
+        self,
+        file_path: str,
+        file_header: str,
+        before_code: str,
+        after_code: str,
+        on_token: Callable[[str], None] | None = None,
+        old_path: str | None = None,
+    ) -> str:
+        if not before_code:
+            # A diff of an added file only repeats its content with "+" markers
+            return self._review_new_file(file_header, after_code, on_token)
 
-        before_tokens = self.count_tokens(before_code)
-        after_tokens = self.count_tokens(after_code)
+        if self.diff_mode == "hunks":
+            return self._review_diff(
+                file_path,
+                file_header,
+                before_code,
+                after_code,
+                on_token,
+                old_path,
+            )
 
-        if before_tokens + after_tokens <= self.batch_size:
-            full_prompt = self.construct_prompt(file_path, before_code, after_code)
-            return self.get_review(full_prompt)
+        budget = self._chunk_token_budget(file_header)
+        if self.fits_token_budget(budget, before_code, after_code):
+            return self.get_review(
+                self._construct_full_prompt(file_header, before_code, after_code),
+                on_token,
+            )
 
-        # If the code is too large, split it into parts
+        # If the code is too large, split it into aligned parts that fit the budget
+        chunks = chunk_changes(
+            before_code,
+            after_code,
+            self.count_tokens,
+            budget,
+            self.count_tokens_batch,
+        )
         reviews = []
-        for i in range(0, len(before_code), self.batch_size):
-            before_batch = before_code[i : i + self.batch_size]
-            after_batch = after_code[i : i + self.batch_size]
+        for i, chunk in enumerate(chunks, start=1):
+            if on_token is not None and i > 1:
+                on_token("\n\n")
+            part = f"part {i} of {len(chunks)}"
             batch_prompt = (
-                f"{base_prompt}\n\n"
-                f"Code before changes (part {i // self.batch_size + 1}):\n"
-                f"```{self.program_language}\n{before_batch}\n```\n\n"
-                f"Code after changes (part {i // self.batch_size + 1}):\n"
-                f"```{self.program_language}\n{after_batch}\n```\n\n"
+                f"{file_header}\n\n"
+                f"Code before changes ({part}, lines {chunk.before_lines[0]}-{chunk.before_lines[1]}):\n"
+                f"```{self.program_language}\n{chunk.before}\n```\n\n"
+                f"Code after changes ({part}, lines {chunk.after_lines[0]}-{chunk.after_lines[1]}):\n"
+                f"```{self.program_language}\n{chunk.after}\n```\n\n"
                 f"Please provide your review for this part in {self.result_output_language}."
             )
-            reviews.append(self.get_review(batch_prompt))
+            reviews.append(self.get_review(batch_prompt, on_token))
 
         return "\n\n".join(reviews)
 
-    def get_review(self, prompt: str) -> str:
+    def _review_diff(
+        self,
+        file_path: str,
+        file_header: str,
+        before_code: str,
+        after_code: str,
+        on_token: Callable[[str], None] | None = None,
+        old_path: str | None = None,
+    ) -> str:
+        diff = build_unified_diff(
+            file_path,
+            before_code,
+            after_code,
+            self.context_lines,
+            old_path,
+        )
+        diff_tokens, *full_file_tokens = self.count_tokens_batch(
+            [diff, before_code, after_code],
+        )
+        self.token_savings.add(sum(full_file_tokens), diff_tokens)
+
+        budget = self._chunk_token_budget(file_header)
+        if diff_tokens <= budget:
+            return self.get_review(
+                self._construct_diff_prompt(file_header, diff),
+                on_token,
+            )
+
+        # If the diff is too large, send the hunks in batches that fit the budget
+        header, hunks = split_hunks(diff)
+        batches = pack_hunks(
+            hunks,
+            self.count_tokens,
+            budget - self.count_tokens(header),
+        )
+        reviews = []
+        for i, batch in enumerate(batches, start=1):
+            if on_token is not None and i > 1:
+                on_token("\n\n")
+            batch_diff = "\n".join([header, *batch])
+            batch_prompt = self._construct_diff_prompt(
+                file_header,
+                batch_diff,
+                f" (part {i} of {len(batches)})",
+            )
+            reviews.append(self.get_review(batch_prompt, on_token))
+        return "\n\n".join(reviews)
+
+    def _review_new_file(
+        self,
+        file_header: str,
+        code: str,
+        on_token: Callable[[str], None] | None = None,
+    ) -> str:
+        budget = self._chunk_token_budget(file_header)
+        if self.fits_token_budget(budget, code):
+            return self.get_review(
+                self._construct_new_file_prompt(file_header, code),
+                on_token,
+            )
+
+        chunks = chunk_changes(
+            "",
+            code,
+            self.count_tokens,
+            budget,
+            self.count_tokens_batch,
+        )
+        reviews = []
+        for i, chunk in enumerate(chunks, start=1):
+            if on_token is not None and i > 1:
+                on_token("\n\n")
+            batch_prompt = self._construct_new_file_prompt(
+                file_header,
+                chunk.after,
+                f" (part {i} of {len(chunks)}, lines {chunk.after_lines[0]}-{chunk.after_lines[1]})",
+            )
+            reviews.append(self.get_review(batch_prompt, on_token))
+        return "\n\n".join(reviews)
+
+    def _chunk_token_budget(self, file_header: str) -> int:
+        """
+        Get the number of code tokens that fit in one request next to the instructions.
+
+        :param file_header: The text sent in front of the code in the user message.
+        :return: The token budget for the code in one request.
+        """
+        budget = (
+            self.batch_size
+            - self.count_tokens(self.construct_system_prompt())
+            - self.count_tokens(file_header)
+            - self.RESPONSE_TOKEN_RESERVE
+        )
+        return max(budget, self.MIN_CHUNK_TOKENS)
+
+    def get_review(
+        self,
+        prompt: str,
+        on_token: Callable[[str], None] | None = None,
+    ) -> str:
         """
         Get a review from the Language Model based on the given prompt.
 
+        The review instructions are sent first as a system message that is the same
+        for every request of a run, so the vendor can serve them from its prompt
+        cache. Cached-token usage is added to ``prompt_cache_usage``, and the latency
+        and token usage of the request to ``stats``.
+
+        Requests wait for ``rate_limiter`` to fit them in the requests-per-minute and
+        tokens-per-minute budget. Rate limited, timed out and failed requests are
+        sent again up to ``max_retries`` times after a backoff, unless part of the
+        review has already been streamed. A structured review is not streamed; its
+        findings are passed to ``on_token`` at once.
+
         :param prompt: The prompt to send to the Language Model.
+        :param on_token: Optional callback receiving each piece of the review as the model streams it.
         :return: The review generated by the Language Model.
+        :raises ReviewCancelledError: If the run was cancelled before the request was sent.
         """
-        messages = [HumanMessage(content=prompt)]
-        response = self.llm.invoke(messages)
-        if isinstance(response.content, str):
-            return response.content
-        elif isinstance(response.content, list):
-            return " ".join(str(item) for item in response.content)
+        cancelled, stats = self._current_run()
+        system_prompt = self.construct_system_prompt()
+        messages = [
+            VENDOR_BACKENDS[self.vendor_name].create_system_message(system_prompt),
+            _lazy("HumanMessage")(content=prompt),
+        ]
+        estimated_tokens = (
+            self.count_tokens(system_prompt) + self.count_tokens(prompt)
+            if self.rate_limiter.limits_tokens
+            else 0
+        )
+        # The chat model is imported and created on first use, not part of the request time
+        llm: Runnable[Any, Any] = self.structured_llm if self.structured else self.llm
+        start = time.perf_counter()
+        wait_seconds = 0.0
+        attempt = 0
+        while True:
+            # A rate limited attempt pauses all requests, so the next one waits here
+            wait_seconds += self.rate_limiter.acquire(estimated_tokens)
+            if cancelled.is_set():
+                msg = "The review was cancelled"
+                raise ReviewCancelledError(msg)
+            parts: list[str] = []
+            try:
+                if self.structured:
+                    review, usage = self._invoke_structured(llm, messages)
+                    if on_token is not None:
+                        on_token(review)
+                elif on_token is None:
+                    review, usage = self._invoke(llm, messages)
+                else:
+                    usage = self._stream(llm, messages, on_token, parts)
+                    review = "".join(parts)
+            except Exception as e:
+                # Part of a streamed review cannot be taken back, so it is not sent again
+                if parts or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                self.rate_limiter.backoff(attempt, e)
+                attempt += 1
+            else:
+                break
+
+        input_tokens, output_tokens, cached_tokens = usage
+        self.rate_limiter.record_usage(estimated_tokens, input_tokens)
+        sent = getattr(self._bound, "sent_tokens", None)
+        if sent is not None:
+            sent[0] += estimated_tokens or (
+                self.count_tokens(system_prompt) + self.count_tokens(prompt)
+            )
+        stats.add_call(
+            CallStats(
+                llm_seconds=time.perf_counter() - start,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cached_tokens=cached_tokens,
+                retries=attempt,
+                wait_seconds=wait_seconds,
+            ),
+        )
+        return review
+
+    def _invoke(
+        self,
+        llm: "Runnable[Any, Any]",
+        messages: list[Any],
+    ) -> tuple[str, tuple[int, int, int]]:
+        response = llm.invoke(messages)
+        self._record_response(response)
+        return self._content_to_text(response.content), message_token_usage(response)
+
+    def _invoke_structured(
+        self,
+        llm: "Runnable[Any, Any]",
+        messages: list[Any],
+    ) -> tuple[str, tuple[int, int, int]]:
+        answer = llm.invoke(messages)
+        response = answer.get("raw")
+        if response is not None:
+            self._record_response(response)
+        parsed = answer.get("parsed")
+        if not isinstance(parsed, dict):
+            msg = f"The model did not report structured findings: {answer.get('parsing_error')}"
+            raise ValueError(msg)  # noqa: TRY004
+        return format_findings(parsed), message_token_usage(response)
+
+    def _record_response(self, response: Any) -> None:
+        self.prompt_cache_usage.add(response.response_metadata)
+        if isinstance(response.response_metadata, dict):
+            self.rate_limiter.update_from_headers(
+                response.response_metadata.get("headers"),
+            )
+
+    def _stream(
+        self,
+        llm: "Runnable[Any, Any]",
+        messages: list[Any],
+        on_token: Callable[[str], None],
+        parts: list[str],
+    ) -> tuple[int, int, int]:
+        input_tokens = output_tokens = cached_tokens = 0
+        for chunk in llm.stream(messages):
+            self.prompt_cache_usage.add(chunk.response_metadata)
+            chunk_usage = message_token_usage(chunk)
+            input_tokens += chunk_usage[0]
+            output_tokens += chunk_usage[1]
+            cached_tokens += chunk_usage[2]
+            text = self._content_to_text(chunk.content)
+            if text:
+                on_token(text)
+                parts.append(text)
+        return input_tokens, output_tokens, cached_tokens
+
+    @staticmethod
+    def _content_to_text(content: Any) -> str:
+        if isinstance(content, str):
+            return content
+        elif isinstance(content, list):
+            # Streamed Anthropic chunks carry text blocks such as {"type": "text", "text": "..."}
+            return " ".join(
+                str(item.get("text", "")) if isinstance(item, dict) else str(item)
+                for item in content
+            )
         else:
-            return str(response.content)
+            return str(content)
 
     def read_prompt_template_from_toml(self) -> str | None:
+        return self._read_tool_config().get("prompt_template")
+
+    def read_path_filter_from_toml(self, ignore_settings_files: bool) -> PathFilter:
+        """
+        Build the path filter from the ``include`` and ``exclude`` patterns in pyproject.toml.
+
+        The settings files are matched by file name, and the patterns of ``exclude``
+        come after them, so they can re-include some of them with ``!``.
+
+        :param ignore_settings_files: Whether settings and config files are excluded too.
+        :return: The path filter.
+        """
+        config = self._read_tool_config()
+        patterns = {}
+        for option in ("include", "exclude"):
+            value = config.get(option, [])
+            if not isinstance(value, list) or not all(
+                isinstance(pattern, str) for pattern in value
+            ):
+                raise ValueError(
+                    f"tool.code_review_assistant.{option} must be a list of glob patterns",
+                )
+            patterns[option] = value
+        settings_files = SETTINGS_FILE_PATTERNS if ignore_settings_files else ()
+        return PathFilter(
+            patterns["include"],
+            patterns["exclude"],
+            exclude_names=settings_files,
+        )
+
+    def _read_tool_config(self) -> dict[str, Any]:
         pyproject_path = Path(self.repo_path) / "pyproject.toml"
         if pyproject_path.exists():
             try:
                 config = toml.load(pyproject_path)
-                return (
-                    config.get("tool", {})
-                    .get("code_review_assistant", {})
-                    .get("prompt_template")
-                )
+                return config.get("tool", {}).get("code_review_assistant", {})
             except toml.TomlDecodeError:
                 print("Error decoding pyproject.toml file")
-        return None
+        return {}
+
+    def construct_system_prompt(self, project_structure: str | None = None) -> str:
+        """
+        Construct the review instructions sent as the system message of every request.
+
+        The file path is not part of the instructions, so they are identical for all
+        files of a run and can be served from the vendor's prompt cache. A
+        ``{file_path}`` placeholder in a custom template refers to the file named in
+        the user message instead.
 
-    def construct_base_prompt(self, file_path: str, project_structure: str) -> str:
+        :param project_structure: The project structure to include, by default the one of the current run.
+        :return: The system prompt.
+        """
+        if project_structure is None:
+            project_structure = self.context.project_structure(self.code_depth)
         template = (
-            self.read_prompt_template_from_toml()
+            self.context.prompt_template()
             or """
         You are an AI Code Review Assistant with expert knowledge of {program_language}. As a senior {program_language} developer, review the following code changes:
 
         Project Structure:
         {project_structure}
 
-        File being reviewed: {file_path}
-
         Analyze the code changes considering these aspects:
         1. Code quality and readability
         2. Potential bugs or errors
@@ -216,22 +1190,45 @@ class CodeReviewAssistant:
         return template.format(
             program_language=self.program_language,
             project_structure=project_structure,
-            file_path=file_path,
+            file_path=SYSTEM_PROMPT_FILE_PATH,
             result_output_language=self.result_output_language,
         )
 
+    @staticmethod
+    def construct_file_header(file_path: str) -> str:
+        """
+        Construct the start of the user message naming the file under review.
+
+        :param file_path: The path of the file, or the paths of a batch of files.
+        :return: The header placed in front of the code.
+        """
+        return f"File being reviewed: {file_path}"
+
     def construct_prompt(
         self,
         file_path: str,
         before_code: str,
         after_code: str,
     ) -> str:
-        base_prompt = self.construct_base_prompt(
-            file_path,
-            self.get_project_structure(self.repo_path, self.code_depth),
-        )
+        file_header = self.construct_file_header(file_path)
+        if self.diff_mode == "hunks":
+            diff = build_unified_diff(
+                file_path,
+                before_code,
+                after_code,
+                self.context_lines,
+            )
+            return self._construct_diff_prompt(file_header, diff)
+        return self._construct_full_prompt(file_header, before_code, after_code)
+
+    def _construct_full_prompt(
+        self,
+        file_header: str,
+        before_code: str,
+        after_code: str,
+    ) -> str:
         return f"""
-        {base_prompt}
+        {file_header}
 
         Code before changes:
         ```{self.program_language}
@@ -246,26 +1243,133 @@ class CodeReviewAssistant:
         Your review:
         """
 
+    def _construct_diff_prompt(
+        self,
+        file_header: str,
+        diff: str,
+        part: str = "",
+    ) -> str:
+        return f"""
+        {file_header}
+
+        Code changes{part} as a unified diff with {self.context_lines} lines of context.
+        Lines starting with '-' were removed, lines starting with '+' were added,
+        and unchanged regions outside the context are omitted:
+        ```diff
+        {diff}
+        ```
+
+        Your review:
+        """
+
+    def _construct_new_file_prompt(
+        self,
+        file_header: str,
+        code: str,
+        part: str = "",
+    ) -> str:
+        return f"""
+        {file_header}
+
+        This is a new file. Its code{part}:
+        ```{self.program_language}
+        {code}
+        ```
+
+        Your review:
+        """
+
+    def construct_batch_prompt(self, files: list[tuple[FileChange, str, str]]) -> str:
+        """
+        Construct one prompt asking for separate reviews of several files.
+
+        :param files: Tuples of (change, code before changes, code after changes).
+        :return: The prompt, with every file introduced by a FILE delimiter line.
+        """
+        file_header = self.construct_file_header(
+            ", ".join(change.path for change, _, _ in files),
+        )
+        sections = "\n\n".join(
+            f"{BATCH_FILE_DELIMITER.format(path=change.path)}\n"
+            f"{self._batch_section(change, before_code, after_code)}"
+            for change, before_code, after_code in files
+        )
+        return f"""
+        {file_header}
+
+        The changes of {len(files)} files follow, each introduced by a line like
+        "{BATCH_FILE_DELIMITER.format(path="<path>")}". Review every file separately.
+        Start the review of each file with the line
+        "{BATCH_REVIEW_DELIMITER.format(path="<path>")}", using the path exactly as given,
+        and do not write anything before the first of these lines.
+
+        {sections}
+
+        Your reviews:
+        """
+
+    @staticmethod
+    def split_batch_review(response: str) -> dict[str, str]:
+        """
+        Split the answer to a batch prompt into the reviews of its files.
+
+        :param response: The review returned for a prompt from construct_batch_prompt.
+        :return: The review of each file found in the response, keyed by path.
+        """
+        reviews: dict[str, str] = {}
+        matches = list(_BATCH_REVIEW_PATTERN.finditer(response))
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(response)
+            review = response[match.end() : end].strip()
+            if review:
+                reviews[match.group(1).strip().strip("`")] = review
+        return reviews
+
+    def _batch_section(
+        self,
+        change: FileChange,
+        before_code: str,
+        after_code: str,
+    ) -> str:
+        if not before_code:
+            return f"New file:\n```{self.program_language}\n{after_code}\n```"
+        renamed = (
+            f"Renamed from {change.old_path}.\n"
+            if change.old_path and change.old_path != change.path
+            else ""
+        )
+        if self.diff_mode == "hunks":
+            diff = build_unified_diff(
+                change.path,
+                before_code,
+                after_code,
+                self.context_lines,
+                change.old_path,
+            )
+            return f"{renamed}```diff\n{diff}\n```"
+        return (
+            f"{renamed}Code before changes:\n```{self.program_language}\n{before_code}\n```\n"
+            f"Code after changes:\n```{self.program_language}\n{after_code}\n```"
+        )
+
     def get_project_structure(self, path: str, depth: int) -> str:
         """
         Get the project structure up to a certain depth.
 
+        Only files tracked by Git are listed when the path is inside a repository,
+        and the listing is capped by max_structure_entries and max_structure_tokens.
+
         :param path: The starting path.
         :param depth: The depth of the structure to return.
         :return: A string representation of the project structure.
         """
-        if depth == 0:
-            return ""
-
-        structure = []
-        for item in Path(path).iterdir():
-            if item.is_dir():
-                structure.append(f"[DIR] {item.name}")
-                structure.append(self.get_project_structure(str(item), depth - 1))
-            else:
-                structure.append(f"[FILE] {item.name}")
-
-        return "\n".join(structure)
+        return scan_project_structure(
+            path,
+            depth,
+            max_entries=self.max_structure_entries,
+            max_tokens=self.max_structure_tokens,
+            count_tokens=self.count_tokens,
+        )
 
     def __repr__(self) -> str:
         """
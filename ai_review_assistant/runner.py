@@ -0,0 +1,188 @@
+import queue
+import threading
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, as_completed
+from functools import partial
+from typing import Any
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.findings import blocking_findings, parse_findings
+from ai_review_assistant.review import CodeReviewAssistant
+
+# The path of a reviewed file, its review, and the error that failed it
+ReviewResult = tuple[str, str | None, str | None]
+
+# The error of the files whose review was cancelled after a blocking finding
+CANCELLED_ERROR = "ReviewCancelledError: a blocking finding was found in another file"
+
+# The error of the files whose review had not finished when the deadline was reached
+DEADLINE_ERROR = "ReviewCancelledError: the review deadline was reached"
+
+
+class _DaemonThreadPool:
+    """
+    A minimal thread pool whose workers do not keep the process alive.
+
+    ThreadPoolExecutor joins its workers at interpreter exit, so a review given up
+    after a deadline or a blocking finding would still hold the CLI until its
+    request returned. Reviews are abandoned instead, with the process.
+    """
+
+    def __init__(self, workers: int):
+        self._queue: queue.SimpleQueue[
+            tuple[Future[Any], Callable[..., Any], tuple[Any, ...]] | None
+        ] = queue.SimpleQueue()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"review-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future[Any]:
+        future: Future[Any] = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def _work(self) -> None:
+        while (item := self._queue.get()) is not None:
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def _review_change(
+    assistant: CodeReviewAssistant,
+    change: FileChange,
+    on_token: Callable[[str], None] | None = None,
+) -> str | None:
+    # Optional arguments are passed only when set, keeping the plain call for most files
+    kwargs: dict[str, Any] = {}
+    if on_token is not None:
+        kwargs["on_token"] = on_token
+    if change.old_path is not None:
+        kwargs["old_path"] = change.old_path
+    # Content is read in the worker, so only the files being reviewed are in memory
+    return assistant.review_changes(change.path, change.before, change.after, **kwargs)
+
+
+def _review_group(
+    assistant: CodeReviewAssistant,
+    group: list[FileChange],
+    on_token: Callable[[str, str], None] | None = None,
+) -> dict[str, str | None]:
+    if len(group) > 1:
+        return assistant.review_changes_batch(group)
+    change = group[0]
+    return {
+        change.path: _review_change(
+            assistant,
+            change,
+            partial(on_token, change.path) if on_token else None,
+        ),
+    }
+
+
+def iter_reviews(
+    assistant: CodeReviewAssistant,
+    changes: Sequence[FileChange],
+    workers: int = 1,
+    on_token: Callable[[str, str], None] | None = None,
+    batch_tokens: int = 0,
+    fail_on: str | None = None,
+    deadline: float | None = None,
+) -> Iterator[ReviewResult]:
+    """
+    Review the changed files and yield each result as soon as it is ready.
+
+    Results come in completion order. An exception raised while reviewing one file
+    is yielded as that file's error instead of aborting the remaining reviews.
+    With ``batch_tokens``, small changes are packed into shared requests and the
+    files of a batch are yielded together.
+
+    With ``fail_on``, the first review with a finding of that severity or a more
+    severe one decides the run: the reviews not started yet are cancelled, the
+    ones in progress are not waited for, and all of them are yielded at once with
+    CANCELLED_ERROR as their error. The reviews not finished ``deadline`` seconds
+    after the start are dropped the same way, with DEADLINE_ERROR as their error.
+    Reviews run on daemon threads, so the ones dropped do not delay the exit of
+    the process either.
+
+    :param assistant: The assistant used to review each file.
+    :param changes: The changed files to review.
+    :param workers: The maximum number of requests sent at the same time.
+    :param on_token: Optional callback receiving (file_path, text) for every streamed piece of a review.
+    :param batch_tokens: The maximum number of code tokens of a multi-file request, 0 to review every file on its own.
+    :param fail_on: The least severe finding that cancels the remaining reviews, one of SEVERITIES, or None.
+    :param deadline: The number of seconds after which the remaining reviews are cancelled, or None.
+    :return: An iterator of (file_path, review, error) tuples.
+    """
+    groups = (
+        assistant.pack_changes(changes, batch_tokens)
+        if batch_tokens
+        else [[change] for change in changes]
+    )
+    executor = _DaemonThreadPool(max(min(workers, len(groups)), 1))
+    futures = {
+        executor.submit(_review_group, assistant, group, on_token): group
+        for group in groups
+    }
+    pending = set(futures)
+    cancelled_error = CANCELLED_ERROR
+    try:
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                pending.discard(future)
+                reviews: dict[str, str | None] = {}
+                error: str | None = None
+                try:
+                    reviews = future.result()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                for change in futures[future]:
+                    yield change.path, reviews.get(change.path), error
+                if fail_on is not None and _is_blocking(reviews, fail_on):
+                    break
+        except TimeoutError:
+            cancelled_error = DEADLINE_ERROR
+        if pending:
+            # Requests still queued or waiting for the rate limit are not sent
+            assistant.cancel()
+        for future, group in futures.items():
+            if future in pending:
+                for change in group:
+                    yield change.path, None, cancelled_error
+    finally:
+        # Also reached when the caller stops iterating early
+        if pending:
+            assistant.cancel()
+        executor.shutdown(wait=not pending, cancel_futures=True)
+
+
+def _is_blocking(reviews: dict[str, str | None], fail_on: str) -> bool:
+    return any(
+        blocking_findings(parse_findings(file_path, review), fail_on)
+        for file_path, review in reviews.items()
+        if review
+    )
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from ai_review_assistant.cache import git_blob_sha
+
+STATE_FILE_NAME = "ai_review_state.sqlite3"
+
+
+@dataclass(frozen=True)
+class ReviewedFile:
+    """The last reviewed revision of a file and its review."""
+
+    path: str
+    blob: str
+    content: str
+    review: str
+
+
+class ReviewState:
+    """
+    Persistent SQLite record of the last reviewed revision of every file.
+
+    Unlike ReviewCache, which only helps when the same change is reviewed again,
+    the state lets a later change to a file be reviewed against the revision that
+    was already reviewed, so only the new edits are sent to the LLM.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int = 5000,
+        max_age_days: float = 30.0,
+    ):
+        """
+        Initialize the ReviewState.
+
+        The database is opened lazily on first use and expired entries are evicted at that point.
+
+        :param path: Path to the SQLite database file.
+        :param max_entries: The maximum number of files to keep; the least recently reviewed ones are evicted first.
+        :param max_age_days: Files reviewed longer ago than this number of days are evicted.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_repo(cls, repo_path: str | Path) -> "ReviewState | None":
+        """
+        Create a state stored inside the ``.git`` directory of the repository.
+
+        :param repo_path: Path to the root of the Git working tree.
+        :return: A ReviewState, or None if the repository has no ``.git`` directory.
+        """
+        git_dir = Path(repo_path) / ".git"
+        if not git_dir.is_dir():
+            return None
+        return cls(git_dir / STATE_FILE_NAME)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS reviewed_files ("
+                "path TEXT NOT NULL, fingerprint TEXT NOT NULL, blob TEXT NOT NULL, "
+                "content BLOB NOT NULL, review TEXT NOT NULL, reviewed_at REAL NOT NULL, "
+                "PRIMARY KEY (path, fingerprint))",
+            )
+            self._evict(self._connection)
+        return self._connection
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.max_age_days * 86400
+        with connection:
+            connection.execute(
+                "DELETE FROM reviewed_files WHERE reviewed_at < ?",
+                (cutoff,),
+            )
+            connection.execute(
+                "DELETE FROM reviewed_files WHERE rowid NOT IN "
+                "(SELECT rowid FROM reviewed_files ORDER BY reviewed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def get(self, path: str, fingerprint: str) -> ReviewedFile | None:
+        """
+        Return the last reviewed revision of a file and update the hit/miss counters.
+
+        :param path: The path of the file.
+        :param fingerprint: The fingerprint of the settings the review was made with.
+        :return: The reviewed revision, or None if the file was not reviewed yet.
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT blob, content, review FROM reviewed_files "
+                    "WHERE path = ? AND fingerprint = ?",
+                    (path, fingerprint),
+                )
+                .fetchone()
+            )
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return ReviewedFile(path, row[0], zlib.decompress(row[1]).decode(), row[2])
+
+    def set(self, path: str, fingerprint: str, content: str, review: str) -> None:
+        """
+        Record the review of a revision of a file, replacing the previous one.
+
+        :param path: The path of the file.
+        :param fingerprint: The fingerprint of the settings the review was made with.
+        :param content: The reviewed content of the file.
+        :param review: The review of that content.
+        """
+        blob = git_blob_sha(content)
+        compressed = zlib.compress(content.encode())
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO reviewed_files VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, fingerprint, blob, compressed, review, time.time()),
+                )
+
+    def reset_counters(self) -> None:
+        """Reset the hit/miss counters, for a state reused for several runs."""
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ReviewState(path='{self.path}', hits={self.hits}, misses={self.misses})"
+        )
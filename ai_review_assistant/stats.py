@@ -0,0 +1,164 @@
+import json
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+
+@dataclass
+class CallStats:
+    """Measurements of one request sent to the LLM."""
+
+    file_path: str = ""
+    llm_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    # Part of llm_seconds spent waiting for the rate limiter
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class FileStats:
+    """Measurements of the review of one file, or of one batch of files."""
+
+    file_path: str
+    total_seconds: float = 0.0
+    prompt_build_seconds: float = 0.0
+    tokenize_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    wait_seconds: float = 0.0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Get a percentile of the values with the nearest-rank method.
+
+    :param values: The measured values.
+    :param fraction: The percentile as a fraction, e.g. 0.95.
+    :return: The smallest value not exceeded by ``fraction`` of the values, or 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class ReviewStats:
+    """
+    Collects timings and token usage of a review run.
+
+    Work is attributed to the file whose review is running on the current thread,
+    so the numbers stay correct when files are reviewed concurrently.
+    """
+
+    calls: list[CallStats] = field(default_factory=list)
+    files: list[FileStats] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _local: threading.local = field(default_factory=threading.local, repr=False)
+
+    @contextmanager
+    def track_file(self, file_path: str) -> Iterator[None]:
+        """
+        Attribute the measurements made inside the block to a file.
+
+        Nested blocks, such as the single-file fallback of a batch, count towards
+        the outermost file.
+
+        :param file_path: The file, or the comma-separated files of a batch.
+        """
+        if getattr(self._local, "current", None) is not None:
+            yield
+            return
+
+        current = FileStats(file_path)
+        self._local.current = current
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.current = None
+            current.total_seconds = time.perf_counter() - start
+            # Everything that is neither tokenizing nor waiting for the LLM builds the prompt
+            current.prompt_build_seconds = max(
+                current.total_seconds - current.tokenize_seconds - current.llm_seconds,
+                0.0,
+            )
+            with self._lock:
+                self.files.append(current)
+
+    @contextmanager
+    def time_tokenize(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current = getattr(self._local, "current", None)
+            if current is not None:
+                current.tokenize_seconds += time.perf_counter() - start
+
+    def add_call(self, call: CallStats) -> None:
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            call.file_path = current.file_path
+            current.llm_seconds += call.llm_seconds
+            current.calls += 1
+            current.input_tokens += call.input_tokens
+            current.output_tokens += call.output_tokens
+            current.cached_tokens += call.cached_tokens
+            current.retries += call.retries
+            current.wait_seconds += call.wait_seconds
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Aggregate the run.
+
+        :return: Totals over all files and the p50/p95 latency of files and LLM calls.
+        """
+        file_seconds = [stats.total_seconds for stats in self.files]
+        call_seconds = [call.llm_seconds for call in self.calls]
+        return {
+            "files": len(self.files),
+            "calls": len(self.calls),
+            "retries": sum(call.retries for call in self.calls),
+            "input_tokens": sum(call.input_tokens for call in self.calls),
+            "output_tokens": sum(call.output_tokens for call in self.calls),
+            "cached_tokens": sum(call.cached_tokens for call in self.calls),
+            "prompt_build_seconds": sum(s.prompt_build_seconds for s in self.files),
+            "tokenize_seconds": sum(s.tokenize_seconds for s in self.files),
+            "llm_seconds": sum(call_seconds),
+            "wait_seconds": sum(call.wait_seconds for call in self.calls),
+            "file_p50_seconds": percentile(file_seconds, 0.5),
+            "file_p95_seconds": percentile(file_seconds, 0.95),
+            "call_p50_seconds": percentile(call_seconds, 0.5),
+            "call_p95_seconds": percentile(call_seconds, 0.95),
+        }
+
+    def write_jsonl(self, path: str | Path) -> None:
+        """
+        Write every call, every file and the run summary as JSON lines.
+
+        Each line has a ``type`` of "call", "file" or "run", so CI can append the
+        files of many runs together and still tell the records apart.
+
+        :param path: The file to write.
+        """
+        with Path(path).open("w", encoding="utf-8") as output:
+            for call in self.calls:
+                output.write(json.dumps({"type": "call", **asdict(call)}) + "\n")
+            for file_stats in self.files:
+                output.write(json.dumps({"type": "file", **asdict(file_stats)}) + "\n")
+            output.write(json.dumps({"type": "run", **self.summary()}) + "\n")
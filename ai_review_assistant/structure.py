@@ -0,0 +1,181 @@
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from git import GitCommandError, InvalidGitRepositoryError, NoSuchPathError, Repo
+
+# Directories that never help a reviewer, skipped when the tree is not a Git repository
+EXCLUDED_DIRECTORIES = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "env",
+        "node_modules",
+        "__pycache__",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        ".tox",
+        ".nox",
+        ".idea",
+        ".vscode",
+        "build",
+        "dist",
+        ".eggs",
+    },
+)
+
+# A directory maps names to sub-directories, or to None for files
+Tree = dict[str, "Tree | None"]
+
+
+def _tracked_paths(path: str) -> list[str] | None:
+    """
+    List the files tracked in the Git index below the path.
+
+    Ignored and untracked files never reach the index, so .gitignore is honoured
+    without parsing it.
+
+    :param path: The directory to list.
+    :return: Paths relative to ``path``, or None if it is not inside a Git repository.
+    """
+    try:
+        repo = Repo(path, search_parent_directories=True)
+        if repo.working_tree_dir is None:
+            return None
+        prefix = Path(path).resolve().relative_to(Path(repo.working_tree_dir).resolve())
+        output = repo.git.ls_files("-z", "--", prefix.as_posix())
+    except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError, ValueError):
+        return None
+
+    strip = len(prefix.as_posix()) + 1 if prefix.parts else 0
+    return [tracked[strip:] for tracked in output.split("\0") if tracked]
+
+
+def _tree_from_paths(paths: list[str], depth: int) -> Tree:
+    tree: Tree = {}
+    for tracked in paths:
+        parts = tracked.split("/")
+        node = tree
+        for level, part in enumerate(parts[:depth]):
+            if level == len(parts) - 1:
+                node.setdefault(part, None)
+                continue
+            child = node.setdefault(part, {})
+            if child is None:
+                break
+            node = child
+    return tree
+
+
+def _scan_directory(path: str, depth: int) -> Tree:
+    tree: Tree = {}
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in EXCLUDED_DIRECTORIES:
+                        tree[entry.name] = (
+                            _scan_directory(entry.path, depth - 1) if depth > 1 else {}
+                        )
+                else:
+                    tree[entry.name] = None
+    except OSError:
+        pass
+    return tree
+
+
+def _scan_tree(path: str, depth: int, workers: int) -> Tree:
+    """Scan the directory with os.scandir, walking top-level sub-directories in parallel."""
+    tree = _scan_directory(path, 1)
+    subdirectories = [name for name, child in tree.items() if child is not None]
+    if depth > 1 and subdirectories:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            subtrees = executor.map(
+                lambda name: _scan_directory(str(Path(path) / name), depth - 1),
+                subdirectories,
+            )
+            tree.update(zip(subdirectories, subtrees, strict=True))
+    return tree
+
+
+def _count_entries(tree: Tree) -> int:
+    return sum(1 + (_count_entries(child) if child else 0) for child in tree.values())
+
+
+def _render(
+    tree: Tree,
+    lines: list[str],
+    indent: str,
+    max_entries: int,
+    token_budget: list[int],
+    count_tokens: Callable[[str], int],
+) -> bool:
+    """Append the tree to ``lines``, returning False once a limit is reached."""
+    directories = sorted(name for name, child in tree.items() if child is not None)
+    files = sorted(name for name, child in tree.items() if child is None)
+    for name in directories + files:
+        child = tree[name]
+        line = (
+            f"{indent}[DIR] {name}" if child is not None else f"{indent}[FILE] {name}"
+        )
+        tokens = count_tokens(line) + 1
+        if len(lines) >= max_entries or tokens > token_budget[0]:
+            return False
+        lines.append(line)
+        token_budget[0] -= tokens
+        if child and not _render(
+            child,
+            lines,
+            indent + "  ",
+            max_entries,
+            token_budget,
+            count_tokens,
+        ):
+            return False
+    return True
+
+
+def scan_project_structure(
+    path: str,
+    depth: int,
+    max_entries: int = 2000,
+    max_tokens: int = 8000,
+    count_tokens: Callable[[str], int] = lambda text: len(text) // 4 + 1,
+    workers: int = 8,
+) -> str:
+    """
+    Build a sorted, indented listing of the project up to a certain depth.
+
+    Inside a Git repository only tracked files are listed, so ignored files,
+    virtualenvs and build output never reach the prompt. Elsewhere the tree is
+    walked with os.scandir, skipping well-known tool and dependency directories.
+    The listing stops at ``max_entries`` lines or ``max_tokens`` tokens.
+
+    :param path: The starting path.
+    :param depth: The depth of the structure to return.
+    :param max_entries: The maximum number of files and directories to list.
+    :param max_tokens: The maximum number of tokens of the listing.
+    :param count_tokens: Function returning the number of tokens in a text.
+    :param workers: The number of threads used to walk directories outside Git.
+    :return: A string representation of the project structure.
+    """
+    if depth <= 0:
+        return ""
+
+    tracked = _tracked_paths(path)
+    tree = (
+        _tree_from_paths(tracked, depth)
+        if tracked is not None
+        else _scan_tree(path, depth, workers)
+    )
+
+    lines: list[str] = []
+    if not _render(tree, lines, "", max_entries, [max_tokens], count_tokens):
+        omitted = _count_entries(tree) - len(lines)
+        lines.append(f"... ({omitted} more entries omitted)")
+    return "\n".join(lines)
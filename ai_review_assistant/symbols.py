@@ -0,0 +1,565 @@
+import ast
+import difflib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from git import GitCommandError, Repo
+
+SYMBOL_INDEX_FILE_NAME = "ai_review_symbols.sqlite3"
+
+# Stored with every parsed blob, so changing what the parser records reparses the files
+PARSER_VERSION = 1
+
+# Files larger than this are generated code or data rather than something to look up
+MAX_INDEXED_BYTES = 512 * 1024
+
+# A name defined more often than this cannot be resolved without types, so it is left out
+MAX_DEFINITIONS_PER_NAME = 3
+
+# The number of places calling one changed definition that are shown
+MAX_CALLERS_PER_NAME = 5
+
+# Longer definitions are cut, and long callers are shown around the call only
+SNIPPET_MAX_LINES = 40
+CALLER_CONTEXT_LINES = 8
+
+
+@dataclass(frozen=True)
+class Definition:
+    """A function, method or class defined in a Python file."""
+
+    name: str
+    qualname: str
+    path: str
+    line_start: int
+    line_end: int
+
+
+@dataclass(frozen=True)
+class Reference:
+    """A call of a name, with the definition it is made from if there is one."""
+
+    name: str
+    path: str
+    line: int
+    caller: str | None = None
+    caller_start: int = 0
+    caller_end: int = 0
+
+
+@dataclass(frozen=True)
+class _Snippet:
+    path: str
+    line_start: int
+    line_end: int
+    description: str
+    blob: str | None
+
+
+class _SymbolVisitor(ast.NodeVisitor):
+    def __init__(self, path: str):
+        self.path = path
+        self.definitions: list[Definition] = []
+        self.references: list[Reference] = []
+        self._scopes: list[Definition] = []
+
+    def _visit_definition(
+        self,
+        node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef,
+    ) -> None:
+        qualname = ".".join([*(scope.name for scope in self._scopes), node.name])
+        # Decorators belong to the definition, so a snippet starts at the first one
+        start = min([node.lineno, *(d.lineno for d in node.decorator_list)])
+        definition = Definition(
+            node.name,
+            qualname,
+            self.path,
+            start,
+            node.end_lineno or node.lineno,
+        )
+        self.definitions.append(definition)
+        self._scopes.append(definition)
+        self.generic_visit(node)
+        self._scopes.pop()
+
+    visit_FunctionDef = _visit_definition  # noqa: N815
+    visit_AsyncFunctionDef = _visit_definition  # noqa: N815
+    visit_ClassDef = _visit_definition  # noqa: N815
+
+    def visit_Call(self, node: ast.Call) -> None:  # noqa: N802
+        func = node.func
+        name = (
+            func.id
+            if isinstance(func, ast.Name)
+            else func.attr if isinstance(func, ast.Attribute) else None
+        )
+        if name is not None:
+            caller = self._scopes[-1] if self._scopes else None
+            self.references.append(
+                Reference(
+                    name,
+                    self.path,
+                    node.lineno,
+                    caller.qualname if caller else None,
+                    caller.line_start if caller else 0,
+                    caller.line_end if caller else 0,
+                ),
+            )
+        self.generic_visit(node)
+
+
+def parse_python_symbols(
+    path: str,
+    source: str,
+) -> tuple[list[Definition], list[Reference]]:
+    """
+    Find the definitions and calls of a Python file.
+
+    Calls are recorded by the called name only, the last part of an attribute
+    such as ``self.client.send(...)``, since the types needed to resolve them
+    are not known.
+
+    :param path: The path of the file.
+    :param source: The content of the file.
+    :return: A tuple of (definitions, references); both empty if the file does not parse.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return [], []
+    visitor = _SymbolVisitor(path)
+    visitor.visit(tree)
+    return visitor.definitions, visitor.references
+
+
+def changed_lines(before: str, after: str) -> set[int]:
+    """
+    Find the lines of the code after changes that were added or edited.
+
+    A deletion marks the line following it, so removing code still has a place.
+
+    :param before: The code before changes.
+    :param after: The code after changes.
+    :return: The 1-based numbers of the changed lines.
+    """
+    after_lines = after.splitlines()
+    matcher = difflib.SequenceMatcher(
+        None,
+        before.splitlines(),
+        after_lines,
+        autojunk=False,
+    )
+    lines: set[int] = set()
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag == "delete":
+            lines.add(min(j1 + 1, max(len(after_lines), 1)))
+        elif tag != "equal":
+            lines.update(range(j1 + 1, j2 + 1))
+    return lines
+
+
+class SymbolIndex:
+    """
+    Index of the Python definitions and calls of a repository.
+
+    The index covers the files committed at HEAD. Every blob is parsed once and
+    its symbols are stored in SQLite by blob hash, so only files whose content
+    is new are read and parsed again when HEAD moves, including after a rename.
+    In memory, the index is updated for the paths whose blob changed since the
+    last refresh, which keeps it cheap in a long-lived daemon.
+    """
+
+    def __init__(
+        self,
+        repo_path: str | Path,
+        path: str | Path | None = None,
+        max_entries: int = 50000,
+        max_age_days: float = 30.0,
+    ):
+        """
+        Initialize the SymbolIndex.
+
+        The index is built lazily, on the first lookup after creation or invalidate().
+        Stored blobs that were not used for a while are evicted when the database is opened.
+
+        :param repo_path: Path to the Git repository.
+        :param path: Path to the SQLite database of parsed blobs, or None to parse every blob of a run.
+        :param max_entries: The maximum number of parsed blobs to keep; the least recently used ones are evicted first.
+        :param max_age_days: Parsed blobs not used for this number of days are evicted.
+        """
+        self.repo_path = str(repo_path)
+        self.path = Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.parsed_blobs = 0
+        self._repo: Repo | None = None
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._stale = True
+        self._blobs: dict[str, str] = {}
+        self._symbols: dict[str, tuple[list[Definition], list[Reference]]] = {}
+        self._definitions: dict[str, list[Definition]] = {}
+        self._references: dict[str, list[Reference]] = {}
+
+    @classmethod
+    def for_repo(cls, repo_path: str | Path) -> "SymbolIndex":
+        """
+        Create an index stored inside the ``.git`` directory of the repository.
+
+        :param repo_path: Path to the root of the Git working tree.
+        :return: A SymbolIndex, kept in memory only if the repository has no ``.git`` directory.
+        """
+        git_dir = Path(repo_path) / ".git"
+        return cls(
+            repo_path,
+            git_dir / SYMBOL_INDEX_FILE_NAME if git_dir.is_dir() else None,
+        )
+
+    def invalidate(self) -> None:
+        """Check HEAD for changed files on the next lookup, for an index reused for several runs."""
+        self._stale = True
+
+    def refresh(self) -> None:
+        """Update the index to the files committed at HEAD, parsing only blobs not seen before."""
+        with self._lock:
+            if not self._stale:
+                return
+            if self._repo is None:
+                self._repo = Repo(self.repo_path)
+            blobs = dict(self._list_python_blobs(self._repo))
+            changed = {
+                path: blob
+                for path, blob in blobs.items()
+                if self._blobs.get(path) != blob
+            }
+            parsed = self._load(set(changed.values()))
+            symbols = {
+                path: value
+                for path, value in self._symbols.items()
+                if blobs.get(path) == self._blobs.get(path)
+            }
+            for path, blob in changed.items():
+                definitions, references = parsed[blob]
+                symbols[path] = (
+                    [replace(definition, path=path) for definition in definitions],
+                    [replace(reference, path=path) for reference in references],
+                )
+            definitions_by_name: dict[str, list[Definition]] = {}
+            references_by_name: dict[str, list[Reference]] = {}
+            for path_definitions, path_references in symbols.values():
+                for definition in path_definitions:
+                    definitions_by_name.setdefault(definition.name, []).append(
+                        definition,
+                    )
+                for reference in path_references:
+                    references_by_name.setdefault(reference.name, []).append(reference)
+            self._blobs = blobs
+            self._symbols = symbols
+            self._definitions = definitions_by_name
+            self._references = references_by_name
+            self._stale = False
+
+    def definitions(self, name: str) -> list[Definition]:
+        """
+        Look up the definitions of a name.
+
+        :param name: The name of a function, method or class.
+        :return: Its definitions in all indexed files.
+        """
+        self.refresh()
+        return self._definitions.get(name, [])
+
+    def references(self, name: str) -> list[Reference]:
+        """
+        Look up the calls of a name.
+
+        :param name: The name of a function, method or class.
+        :return: Its calls in all indexed files.
+        """
+        self.refresh()
+        return self._references.get(name, [])
+
+    def related_code(
+        self,
+        path: str,
+        before: str,
+        after: str,
+        max_tokens: int,
+        count_tokens: Callable[[str], int],
+    ) -> str:
+        """
+        Collect the code of other files related to the changed lines of a file.
+
+        The definitions called from the changed lines come first, since they are
+        needed to judge the changes, followed by the places calling the changed
+        definitions, which the changes may break. Snippets are added in that
+        order as long as they fit into ``max_tokens``.
+
+        :param path: The path of the changed file.
+        :param before: The code before changes.
+        :param after: The code after changes.
+        :param max_tokens: The maximum number of tokens of the returned text.
+        :param count_tokens: Function counting the tokens of a text.
+        :return: The related code as Markdown, or an empty string if nothing related was found.
+        """
+        if not path.endswith(".py") or max_tokens <= 0:
+            return ""
+        definitions, references = parse_python_symbols(path, after)
+        lines = changed_lines(before, after)
+        if not lines or not (definitions or references):
+            return ""
+        self.refresh()
+
+        sections = []
+        tokens = 0
+        seen: set[tuple[str, int, int]] = set()
+        for snippet in self._snippets(path, lines, definitions, references):
+            key = (snippet.path, snippet.line_start, snippet.line_end)
+            if key in seen:
+                continue
+            seen.add(key)
+            section = self._render(snippet)
+            section_tokens = count_tokens(section)
+            if tokens + section_tokens > max_tokens:
+                continue
+            sections.append(section)
+            tokens += section_tokens
+        if not sections:
+            return ""
+        return (
+            "Related code elsewhere in the repository, for context only "
+            "(it is not part of the changes):\n\n" + "\n\n".join(sections)
+        )
+
+    def _snippets(
+        self,
+        path: str,
+        lines: set[int],
+        definitions: list[Definition],
+        references: list[Reference],
+    ) -> Iterator[_Snippet]:
+        called = dict.fromkeys(
+            reference.name for reference in references if reference.line in lines
+        )
+        for name in called:
+            found = [
+                definition
+                for definition in self._definitions.get(name, [])
+                if definition.path != path
+            ]
+            if len(found) > MAX_DEFINITIONS_PER_NAME:
+                continue
+            for definition in found:
+                yield _Snippet(
+                    definition.path,
+                    definition.line_start,
+                    min(
+                        definition.line_end,
+                        definition.line_start + SNIPPET_MAX_LINES - 1,
+                    ),
+                    f"definition of {definition.qualname}, called by the changes",
+                    self._blobs.get(definition.path),
+                )
+
+        changed = dict.fromkeys(
+            definition.name
+            for definition in definitions
+            if any(
+                definition.line_start <= line <= definition.line_end for line in lines
+            )
+        )
+        for name in changed:
+            if len(self._definitions.get(name, [])) > MAX_DEFINITIONS_PER_NAME:
+                continue
+            callers = [
+                reference
+                for reference in self._references.get(name, [])
+                if reference.path != path
+            ]
+            for reference in callers[:MAX_CALLERS_PER_NAME]:
+                start = reference.line - CALLER_CONTEXT_LINES
+                end = reference.line + CALLER_CONTEXT_LINES
+                if reference.caller is not None:
+                    start = max(start, reference.caller_start)
+                    end = min(end, reference.caller_end)
+                where = f"in {reference.caller}" if reference.caller else ""
+                yield _Snippet(
+                    reference.path,
+                    max(start, 1),
+                    end,
+                    f"calls the changed {name} {where}".rstrip(),
+                    self._blobs.get(reference.path),
+                )
+
+    def _render(self, snippet: _Snippet) -> str:
+        source = self._read(snippet.blob) if snippet.blob else ""
+        lines = source.splitlines()[snippet.line_start - 1 : snippet.line_end]
+        end = snippet.line_start + len(lines) - 1
+        code = "\n".join(lines)
+        return (
+            f"{snippet.path} lines {snippet.line_start}-{end}, {snippet.description}:\n"
+            f"```python\n{code}\n```"
+        )
+
+    def _read(self, blob: str) -> str:
+        # The index reads through its own Repo, whose `git cat-file` process no other thread uses
+        with self._lock:
+            if self._repo is None:
+                self._repo = Repo(self.repo_path)
+            data = self._repo.odb.stream(bytes.fromhex(blob)).read()
+        return data.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _list_python_blobs(repo: Repo) -> Iterator[tuple[str, str]]:
+        try:
+            output = repo.git.ls_tree("-r", "-z", "-l", "HEAD")
+        except GitCommandError:
+            # No commit yet, nothing to index
+            return
+        for record in output.split("\0"):
+            if not record:
+                continue
+            meta, path = record.split("\t", 1)
+            _, object_type, blob, size = meta.split()
+            if (
+                object_type == "blob"
+                and path.endswith(".py")
+                and size.isdigit()
+                and int(size) <= MAX_INDEXED_BYTES
+            ):
+                yield path, blob
+
+    def _load(
+        self,
+        blobs: set[str],
+    ) -> dict[str, tuple[list[Definition], list[Reference]]]:
+        # Symbols are stored without a path, so a moved file keeps its parsed blob
+        symbols = self._stored(blobs)
+        missing = blobs - symbols.keys()
+        if not missing:
+            return symbols
+        repo = self._repo or Repo(self.repo_path)
+        parsed = {}
+        for blob in missing:
+            source = repo.odb.stream(bytes.fromhex(blob)).read()
+            symbols[blob] = parse_python_symbols(
+                "",
+                source.decode("utf-8", errors="replace"),
+            )
+            parsed[blob] = symbols[blob]
+        self.parsed_blobs += len(parsed)
+        self._store(parsed)
+        return symbols
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS parsed_blobs ("
+                "key TEXT PRIMARY KEY, symbols TEXT NOT NULL, parsed_at REAL NOT NULL)",
+            )
+            self._evict(self._connection)
+        return self._connection
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.max_age_days * 86400
+        with connection:
+            connection.execute(
+                "DELETE FROM parsed_blobs WHERE parsed_at < ?",
+                (cutoff,),
+            )
+            connection.execute(
+                "DELETE FROM parsed_blobs WHERE key NOT IN "
+                "(SELECT key FROM parsed_blobs ORDER BY parsed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def _stored(
+        self,
+        blobs: set[str],
+    ) -> dict[str, tuple[list[Definition], list[Reference]]]:
+        connection = self._connect()
+        if connection is None or not blobs:
+            return {}
+        keys = json.dumps([_key(blob) for blob in blobs])
+        with connection:
+            rows = connection.execute(
+                "SELECT key, symbols FROM parsed_blobs WHERE key IN "
+                "(SELECT value FROM json_each(?))",
+                (keys,),
+            ).fetchall()
+            # Blobs still in use move forward, so only those of old revisions are evicted
+            connection.execute(
+                "UPDATE parsed_blobs SET parsed_at = ? WHERE key IN "
+                "(SELECT value FROM json_each(?))",
+                (time.time(), keys),
+            )
+        return {key.split(":", 1)[1]: _decode(symbols) for key, symbols in rows}
+
+    def _store(
+        self,
+        parsed: dict[str, tuple[list[Definition], list[Reference]]],
+    ) -> None:
+        connection = self._connect()
+        if connection is None:
+            return
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO parsed_blobs VALUES (?, ?, ?)",
+                [
+                    (_key(blob), _encode(*symbols), now)
+                    for blob, symbols in parsed.items()
+                ],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if self._repo is not None:
+                self._repo.close()
+                self._repo = None
+
+    def __repr__(self) -> str:
+        return f"SymbolIndex(repo_path={self.repo_path!r}, path={self.path!r})"
+
+
+def _key(blob: str) -> str:
+    return f"{PARSER_VERSION}:{blob}"
+
+
+def _encode(definitions: list[Definition], references: list[Reference]) -> str:
+    return json.dumps(
+        {
+            "definitions": [
+                [d.name, d.qualname, d.line_start, d.line_end] for d in definitions
+            ],
+            "references": [
+                [r.name, r.line, r.caller, r.caller_start, r.caller_end]
+                for r in references
+            ],
+        },
+    )
+
+
+def _decode(text: str) -> tuple[list[Definition], list[Reference]]:
+    data = json.loads(text)
+    return (
+        [
+            Definition(name, qualname, "", start, end)
+            for name, qualname, start, end in data["definitions"]
+        ],
+        [
+            Reference(name, "", line, caller, caller_start, caller_end)
+            for name, line, caller, caller_start, caller_end in data["references"]
+        ],
+    )
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+
+# Texts longer than this are cached under a digest instead of holding them in memory
+HASH_MIN_CHARS = 256
+
+
+def token_upper_bound(text: str) -> int:
+    """
+    Get an upper bound of the number of tokens in a text without encoding it.
+
+    Byte-level BPE tokenizers never produce a token shorter than one byte, so the
+    UTF-8 length of a text is at least its number of tokens.
+
+    :param text: The text to bound.
+    :return: The UTF-8 length of the text.
+    """
+    # ASCII strings know their UTF-8 length without encoding them
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+
+
+class TokenCounter:
+    """
+    Count tokens with a bounded LRU cache of earlier counts.
+
+    The same texts are counted again and again during a run: the system prompt
+    for every request, a file's code for its budget check, its cache entry and
+    its retries, and repeated lines when code is split into chunks. Short texts
+    are cached as they are and longer ones under a digest of their content.
+    """
+
+    def __init__(
+        self,
+        get_encoding: Callable[[], "Encoding"],
+        max_entries: int = 65536,
+    ):
+        """
+        Initialize the TokenCounter.
+
+        :param get_encoding: Function returning the tokenizer, called on first use.
+        :param max_entries: The maximum number of cached counts.
+        """
+        self._get_encoding = get_encoding
+        self.max_entries = max_entries
+        self._cache: OrderedDict[str | bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str) -> str | bytes:
+        if len(text) <= HASH_MIN_CHARS:
+            return text
+        return hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"),
+            digest_size=16,
+        ).digest()
+
+    def _lookup(self, key: str | bytes) -> int | None:
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            return tokens
+
+    def _store(self, key: str | bytes, tokens: int) -> None:
+        with self._lock:
+            self._cache[key] = tokens
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a text.
+
+        Special tokens such as ``<|endoftext|>`` are counted as the plain text the
+        vendor API sees them as.
+
+        :param text: The text to count tokens for.
+        :return: The number of tokens in the text.
+        """
+        key = self._key(text)
+        tokens = self._lookup(key)
+        if tokens is None:
+            tokens = len(self._get_encoding().encode_ordinary(text))
+            self._store(key, tokens)
+        return tokens
+
+    def count_batch(self, texts: Sequence[str]) -> list[int]:
+        """
+        Count the tokens in several texts, encoding each distinct uncached text once.
+
+        :param texts: The texts to count tokens for.
+        :return: The number of tokens in each text, in order.
+        """
+        keys = [self._key(text) for text in texts]
+        counts = [self._lookup(key) for key in keys]
+        missing = {
+            key: text
+            for key, text, tokens in zip(keys, texts, counts, strict=True)
+            if tokens is None
+        }
+        computed: dict[str | bytes, int] = {}
+        if missing:
+            # encode_ordinary_batch hands every text to a thread pool, which costs
+            # more than encoding the texts one after another for lines and files
+            encoding = self._get_encoding()
+            for key, text in missing.items():
+                computed[key] = len(encoding.encode_ordinary(text))
+                self._store(key, computed[key])
+        return [
+            tokens if tokens is not None else computed[key]
+            for key, tokens in zip(keys, counts, strict=True)
+        ]
+
+    def fits(self, budget: int, *texts: str) -> bool:
+        """
+        Check whether texts fit a token budget together, encoding them only if needed.
+
+        :param budget: The maximum number of tokens.
+        :param texts: The texts to check.
+        :return: True if the texts have at most ``budget`` tokens together.
+        """
+        if sum(token_upper_bound(text) for text in texts) <= budget:
+            return True
+        return sum(self.count_batch(texts)) <= budget
@@ -0,0 +1,92 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def prompt_cache_usage(response_metadata: Any) -> tuple[int, int, int]:
+    """
+    Read prompt token usage from the response metadata of a chat model.
+
+    OpenAI reports cached tokens as part of the prompt tokens, while Anthropic
+    reports tokens read from and written to the cache next to the uncached ones.
+
+    :param response_metadata: The ``response_metadata`` of a LangChain message.
+    :return: A tuple of (prompt tokens, tokens read from the cache, tokens written to the cache).
+    """
+    if not isinstance(response_metadata, dict):
+        return 0, 0, 0
+
+    token_usage = response_metadata.get("token_usage")
+    if isinstance(token_usage, dict):
+        details = token_usage.get("prompt_tokens_details") or {}
+        return (
+            int(token_usage.get("prompt_tokens") or 0),
+            int(details.get("cached_tokens") or 0),
+            0,
+        )
+
+    usage = response_metadata.get("usage")
+    if isinstance(usage, dict):
+        cache_read = int(usage.get("cache_read_input_tokens") or 0)
+        cache_write = int(usage.get("cache_creation_input_tokens") or 0)
+        return (
+            int(usage.get("input_tokens") or 0) + cache_read + cache_write,
+            cache_read,
+            cache_write,
+        )
+    return 0, 0, 0
+
+
+@dataclass
+class PromptCacheUsage:
+    """Running total of prompt tokens and how many were served from the vendor's prompt cache."""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, response_metadata: Any) -> None:
+        prompt_tokens, cached_tokens, cache_write_tokens = prompt_cache_usage(
+            response_metadata,
+        )
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.cache_write_tokens += cache_write_tokens
+
+    def summary(self) -> str:
+        percent = (
+            100 * self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        )
+        summary = (
+            f"Prompt cache served {self.cached_tokens} of {self.prompt_tokens} "
+            f"prompt tokens ({percent:.0f}%)"
+        )
+        if self.cache_write_tokens:
+            summary += f", {self.cache_write_tokens} tokens written to the cache"
+        return summary
+
+
+def message_token_usage(message: Any) -> tuple[int, int, int]:
+    """
+    Read the token usage of one LLM response.
+
+    Input and output tokens come from the message's ``usage_metadata``. Input
+    tokens read from or written to the Anthropic prompt cache are not part of it,
+    so the larger of it and the prompt tokens of ``response_metadata`` is used.
+
+    :param message: A LangChain message or message chunk.
+    :return: A tuple of (input tokens, output tokens, input tokens read from the cache).
+    """
+    prompt_tokens, cached_tokens, _ = prompt_cache_usage(
+        getattr(message, "response_metadata", None),
+    )
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if not isinstance(usage_metadata, dict):
+        return prompt_tokens, 0, cached_tokens
+    return (
+        max(int(usage_metadata.get("input_tokens") or 0), prompt_tokens),
+        int(usage_metadata.get("output_tokens") or 0),
+        cached_tokens,
+    )
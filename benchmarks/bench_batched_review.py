@@ -0,0 +1,80 @@
+"""
+Measure the requests and prompt tokens saved by packing small changes together.
+
+A commit touching ``--files`` small files is reviewed against a fake LLM that
+answers batch prompts in the expected delimiter format. Every prompt is counted
+with the assistant's tokenizer, once reviewing each file on its own and once
+with ``--batch-tokens``.
+
+Usage:
+    python -m benchmarks.bench_batched_review --files 40 --batch-tokens 4000
+"""
+
+import argparse
+from typing import Any
+
+from langchain_core.pydantic_v1 import Field
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.fake import FakeReviewChatModel
+from ai_review_assistant.main import review_files
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+class RecordingFakeChatModel(FakeReviewChatModel):
+    """Fake chat model that records the prompts it answers, system message included."""
+
+    prompts: list[str] = Field(default_factory=list)
+
+    def _call(self, messages: Any, *args: Any, **kwargs: Any) -> str:
+        self.prompts.append("\n".join(str(message.content) for message in messages))
+        return super()._call(messages, *args, **kwargs)
+
+
+def run(files: int, batch_tokens: int) -> None:
+    changes = [
+        FileChange.from_text(
+            f"pkg/module_{i}.py",
+            f"def f{i}():\n    return {i}\n",
+            f"def f{i}():\n    return {i + 1}\n",
+        )
+        for i in range(files)
+    ]
+
+    print(f"{'mode':>10} {'requests':>9} {'prompt tokens':>14}")
+    results = {}
+    for mode, tokens in [("per file", 0), ("batched", batch_tokens)]:
+        assistant = CodeReviewAssistant(
+            repo_path=".",
+            vendor_name="openai",
+            model_name="gpt-3.5-turbo",
+            api_key="benchmark",
+            code_depth=1,
+            program_language=["Python"],
+        )
+        llm = RecordingFakeChatModel()
+        assistant.llm = llm
+        reviews, errors = review_files(assistant, changes, batch_tokens=tokens)
+        if errors or len(reviews) != files:
+            raise SystemExit(f"{mode}: {len(reviews)} reviews, errors: {errors}")
+        prompt_tokens = sum(assistant.count_tokens(prompt) for prompt in llm.prompts)
+        results[mode] = (len(llm.prompts), prompt_tokens)
+        print(f"{mode:>10} {len(llm.prompts):>9} {prompt_tokens:>14}")
+
+    (requests, prompt_tokens), (batched_requests, batched_tokens) = results.values()
+    print(
+        f"Requests: {requests / batched_requests:.1f}x fewer, "
+        f"prompt tokens: {prompt_tokens / batched_tokens:.1f}x fewer",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--batch-tokens", type=int, default=4000)
+    args = parser.parse_args()
+    run(args.files, args.batch_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measure how the ``review`` pipeline scales with the number of workers.
+
+The LLM is replaced by the fake vendor's chat model with a fixed latency, so
+the numbers reflect the scheduling overhead and the wall-clock benefit of
+reviewing files concurrently without calling a real vendor API.
+
+Usage:
+    python -m benchmarks.bench_concurrent_review --files 40 --latency 0.2
+"""
+
+import argparse
+import time
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.fake import FakeReviewChatModel
+from ai_review_assistant.main import review_files
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def run(files: int, latency: float, workers: list[int]) -> None:
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="benchmark",
+        program_language=["Python"],
+    )
+    assistant.llm = FakeReviewChatModel(latency=latency)
+
+    changes = [
+        FileChange.from_text(
+            f"pkg/module_{i}.py",
+            f"def f{i}():\n    return {i}\n",
+            f"def f{i}():\n    return {i + 1}\n",
+        )
+        for i in range(files)
+    ]
+
+    baseline: float | None = None
+    print(f"{'workers':>8} {'wall (s)':>10} {'speedup':>8}")
+    for count in workers:
+        start = time.perf_counter()
+        reviews, errors = review_files(assistant, changes, count)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        assert len(reviews) == files
+        assert not errors
+        print(f"{count:>8} {elapsed:>10.2f} {baseline / elapsed:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    run(args.files, args.latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
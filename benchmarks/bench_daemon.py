@@ -0,0 +1,99 @@
+"""
+Measure the per-commit overhead of the review command with and without the daemon.
+
+A synthetic repository gets ``--commits`` commits that each modify one file,
+and after every commit ``ai_review_assistant review`` runs in a new process,
+the way the pre-commit hook runs it. The ``fake`` vendor answers after
+``--latency`` seconds, so what remains is the cost of starting the command:
+imports, creating the chat model, loading the tokenizer and reading the
+changes. With ``--daemon`` the first run also starts the daemon, which is
+reported separately.
+
+Usage:
+    python -m benchmarks.bench_daemon --commits 10 --latency 0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from git import Repo
+
+from ai_review_assistant.daemon import DaemonClient
+from benchmarks.bench_review_command import build_repo
+
+
+def run_hook(repo_path: Path, socket_path: Path | None, env: dict[str, str]) -> float:
+    daemon_arguments = (
+        ["--daemon", "--daemon-socket", str(socket_path)] if socket_path else []
+    )
+    start = time.perf_counter()
+    subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "ai_review_assistant.main",
+            "--vendor",
+            "fake",
+            "--api-key",
+            "benchmark",
+            "--no-cache",
+            *daemon_arguments,
+            "review",
+        ],
+        cwd=repo_path,
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def run(commits: int, latency: float) -> None:
+    env = {
+        **os.environ,
+        "AI_REVIEW_FAKE_LATENCY": str(latency),
+        # The commands run inside the synthetic repository, not in this checkout
+        "PYTHONPATH": str(Path(__file__).resolve().parents[1]),
+    }
+    print(f"{'mode':>10} {'first (s)':>10} {'p50 (s)':>8} {'max (s)':>8}")
+    for mode in ("process", "daemon"):
+        with tempfile.TemporaryDirectory() as directory:
+            repo_path = Path(directory) / "repo"
+            repo_path.mkdir()
+            build_repo(repo_path, 20, 1, 200)
+            repo = Repo(repo_path)
+            socket_path = Path(directory) / "daemon.sock" if mode == "daemon" else None
+            seconds = []
+            try:
+                for commit in range(commits):
+                    path = repo_path / "package_0" / "module_0.py"
+                    path.write_text(path.read_text() + f"\nVALUE_{commit} = {commit}\n")
+                    repo.index.add([str(path)])
+                    repo.index.commit(f"commit {commit}")
+                    seconds.append(run_hook(repo_path, socket_path, env))
+            finally:
+                if socket_path is not None:
+                    DaemonClient(socket_path).stop()
+        later = seconds[1:] or seconds
+        print(
+            f"{mode:>10} {seconds[0]:>10.3f} {statistics.median(later):>8.3f} "
+            f"{max(later):>8.3f}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commits", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.commits, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure the peak memory of reading the changes of a commit with large blobs.
+
+A synthetic repository is created whose last commit modifies ``--files`` text
+files of ``--file-mb`` megabytes each and a binary asset. Each mode then reads
+the changes in a fresh interpreter and reports its peak RSS:
+
+- ``eager`` decodes every file before any review starts, as the CLI used to do
+- ``lazy`` lists change records and decodes one file at a time
+- ``lazy-limited`` does the same with the default size limit, skipping large files
+
+Usage:
+    python -m benchmarks.bench_file_changes --files 20 --file-mb 20
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from git import Repo
+
+from ai_review_assistant.changes import DEFAULT_MAX_FILE_BYTES
+from ai_review_assistant.main import get_file_changes
+
+MODES = ("eager", "lazy", "lazy-limited")
+
+
+def build_repo(root: Path, files: int, file_mb: int) -> None:
+    repo = Repo.init(root)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+    line = "value = '" + "x" * 69 + "'\n"
+    lines_per_file = file_mb * 1024 * 1024 // len(line)
+    paths = [f"generated_{index}.py" for index in range(files)] + ["asset.bin"]
+    for version in range(2):
+        for path in paths[:-1]:
+            (root / path).write_text(f"# version {version}\n" + line * lines_per_file)
+        (root / "asset.bin").write_bytes(bytes([version]) + b"\0" * 1024 * 1024)
+        repo.index.add(paths)
+        repo.index.commit(f"version {version}")
+
+
+def measure(repo_path: str, mode: str) -> int:
+    """
+    Read the changes of the last commit and return the peak RSS in kilobytes.
+
+    :param repo_path: The synthetic repository.
+    :param mode: One of MODES.
+    :return: The peak resident set size of this process.
+    """
+    repo = Repo(repo_path)
+    current = repo.head.commit
+    limit = DEFAULT_MAX_FILE_BYTES if mode == "lazy-limited" else sys.maxsize
+    changes = list(get_file_changes(current, current.parents[0], limit))
+    if mode == "eager":
+        contents = {
+            change.path: {"before": change.before, "after": change.after}
+            for change in changes
+            if change.skip_reason is None
+        }
+        sum(len(content["after"]) for content in contents.values())
+    else:
+        for change in changes:
+            if change.skip_reason is None:
+                len(change.before) + len(change.after)
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-mb", type=int, default=20)
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--repo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(measure(args.repo, args.measure))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        build_repo(Path(directory), args.files, args.file_mb)
+        print(f"{'mode':>14} {'peak RSS (MB)':>14}")
+        for mode in MODES:
+            result = subprocess.run(  # noqa: S603
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_file_changes",
+                    "--measure",
+                    mode,
+                    "--repo",
+                    directory,
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            print(f"{mode:>14} {int(result.stdout) / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Measure how include and exclude rules cut the cost of listing a large commit.
+
+A synthetic repository is created whose last commit touches ``--paths`` files,
+most of them vendored dependencies, documentation and generated code as in a
+dependency bump or a code generator run. The changes of that commit are then
+listed and the content of every selected file is read, as the review does:
+
+- ``filter-after-read`` lists every change with GitPython, sniffs and reads all
+  blobs, and drops excluded files afterwards, as the CLI used to do
+- ``gitpython-filter`` drops excluded files by path before their blobs are
+  touched, but still builds a GitPython ``Diff`` for every path
+- ``raw-diff-filter`` parses git's raw diff and drops excluded files by path
+  before anything else is done for them, as the CLI does now
+
+The cost of the path matching alone is reported for the compiled matcher and
+for testing every pattern with ``fnmatch`` one after the other.
+
+Usage:
+    python -m benchmarks.bench_ignore_rules --paths 5000 --repeat 3
+"""
+
+import argparse
+import fnmatch
+import posixpath
+import tempfile
+import time
+from pathlib import Path
+
+from git import Repo
+
+from ai_review_assistant.changes import diff_commits, iter_file_changes
+from ai_review_assistant.ignore import SETTINGS_FILE_PATTERNS, PathFilter
+
+EXCLUDE = [
+    "node_modules/",
+    "vendor/",
+    "dist/",
+    "**/*.min.js",
+    "**/*_pb2.py",
+    "**/__snapshots__/",
+]
+
+MODES = ("filter-after-read", "gitpython-filter", "raw-diff-filter")
+
+# The share of each kind of path in the commit; only the last kind is reviewed
+PATH_KINDS = [
+    ("node_modules/pkg_{group}/lib/file_{index}.js", 0.4),
+    ("docs/section_{group}/page_{index}.md", 0.15),
+    ("vendor/lib_{group}/module_{index}.py", 0.1),
+    ("src/proto/group_{group}/message_{index}_pb2.py", 0.1),
+    ("src/package_{group}/module_{index}.py", 0.25),
+]
+
+
+def build_repo(root: Path, paths: int) -> list[str]:
+    repo = Repo.init(root)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+    names: list[str] = []
+    for template, share in PATH_KINDS:
+        names.extend(
+            template.format(group=index % 20, index=index)
+            for index in range(int(paths * share))
+        )
+    for name in names:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+    for version in range(2):
+        for index, name in enumerate(names):
+            (root / name).write_text(
+                "".join(
+                    f"value_{line} = {line * (version + 1) + index}\n"
+                    for line in range(40)
+                ),
+            )
+        repo.index.add(names)
+        repo.index.commit(f"version {version}")
+    return names
+
+
+def list_changes(repo: Repo, path_filter: PathFilter, mode: str) -> int:
+    """
+    List the changes of the last commit and read the content of the selected files.
+
+    :param repo: The synthetic repository.
+    :param path_filter: The filter selecting the files to review.
+    :param mode: One of MODES.
+    :return: The number of selected files.
+    """
+    current = repo.head.commit
+    diffs = (
+        diff_commits(current.parents[0], current)
+        if mode == "raw-diff-filter"
+        else current.parents[0].diff(current)
+    )
+    in_diff = mode != "filter-after-read"
+    changes = iter_file_changes(
+        diffs,
+        path_filter=path_filter if in_diff else None,
+    )
+    selected = 0
+    for change in changes:
+        if change.skip_reason is not None:
+            continue
+        content = len(change.before) + len(change.after)
+        if in_diff or path_filter.includes(change.path):
+            selected += content > 0
+    return selected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--paths", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path_filter = PathFilter(exclude=EXCLUDE, exclude_names=SETTINGS_FILE_PATTERNS)
+    with tempfile.TemporaryDirectory() as directory:
+        names = build_repo(Path(directory), args.paths)
+        repo = Repo(directory)
+
+        print(f"{len(names)} changed paths")
+        print(f"{'mode':>18} {'selected':>9} {'best (s)':>9}")
+        for mode in MODES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                selected = list_changes(repo, path_filter, mode)
+                timings.append(time.perf_counter() - start)
+            print(f"{mode:>18} {selected:>9} {min(timings):>9.3f}")
+
+        start = time.perf_counter()
+        compiled = sum(path_filter.includes(name) for name in names)
+        compiled_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        naive = sum(
+            not any(
+                fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(name, f"*/{pattern}")
+                for pattern in EXCLUDE
+            )
+            and not any(
+                fnmatch.fnmatch(posixpath.basename(name), pattern)
+                for pattern in SETTINGS_FILE_PATTERNS
+            )
+            for name in names
+        )
+        naive_seconds = time.perf_counter() - start
+        print(
+            f"matching {len(names)} paths: compiled {compiled_seconds * 1000:.1f} ms "
+            f"({compiled} selected), fnmatch per pattern {naive_seconds * 1000:.1f} ms "
+            f"({naive} selected, without gitignore directory rules)",
+        )
+
+
+if __name__ == "__main__":
+    main()
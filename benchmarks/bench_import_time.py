@@ -0,0 +1,89 @@
+"""
+Measure the cold-start import time of the CLI with ``python -X importtime``.
+
+The pre-commit hook starts a new interpreter for every commit, so the time spent
+importing ``ai_review_assistant.main`` is paid even when there is nothing to
+review. The script prints the slowest top-level imports, fails if any vendor SDK
+is imported eagerly, and fails if the total exceeds ``--budget-ms``.
+
+Usage:
+    python -m benchmarks.bench_import_time --budget-ms 600
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Packages that must only be imported when a review actually calls the LLM
+VENDOR_PACKAGES = (
+    "langchain",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_anthropic",
+    "openai",
+    "anthropic",
+    "tiktoken",
+)
+
+
+def measure(module: str) -> tuple[dict[str, int], set[str]]:
+    """
+    Import the module in a fresh interpreter and collect its import times.
+
+    :param module: The module to import.
+    :return: A tuple of (cumulative microseconds per top-level import, all imported module names).
+    """
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    top_level: dict[str, int] = {}
+    imported: set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:") :].split("|")
+        name = raw_name.strip()
+        imported.add(name)
+        # Nested imports are indented below their parent and already counted in its cumulative time
+        if not raw_name[1:].startswith(" "):
+            top_level[name] = int(cumulative)
+    return top_level, imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="ai_review_assistant.main")
+    parser.add_argument("--budget-ms", type=float, default=600.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    package = args.module.split(".")[0]
+    runs = [measure(args.module) for _ in range(args.runs)]
+
+    def own_time(top_level: dict[str, int]) -> int:
+        return sum(
+            us for name, us in top_level.items() if name.split(".")[0] == package
+        )
+
+    top_level, imported = min(runs, key=lambda run: own_time(run[0]))
+    total_ms = own_time(top_level) / 1000
+
+    print(f"{'top-level import':>32} {'cumulative (ms)':>16}")
+    for name, microseconds in sorted(top_level.items(), key=lambda item: -item[1])[:15]:
+        print(f"{name:>32} {microseconds / 1000:>16.1f}")
+    print(f"Importing {args.module} took {total_ms:.1f}ms (best of {args.runs})")
+
+    eager = sorted({name.split(".")[0] for name in imported} & set(VENDOR_PACKAGES))
+    if eager:
+        sys.exit(f"Vendor packages imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        sys.exit(
+            f"Import time {total_ms:.0f}ms exceeds the budget of {args.budget_ms:.0f}ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure how long writing the reviews of a large run takes in every output format.
+
+``--files`` synthetic reviews, each with prose and ``--code-blocks`` fenced code
+blocks, are written to an in-memory stream. The rich format renders Markdown and
+highlights the code blocks with Pygments, on a console forced to behave like a
+terminal; the other formats write the reviews as they are.
+
+Usage:
+    python -m benchmarks.bench_output --files 500 --code-blocks 2
+"""
+
+import argparse
+import io
+import time
+
+from rich.console import Console
+
+from ai_review_assistant.output import OUTPUT_FORMATS, create_writer
+
+
+def make_review(index: int, code_blocks: int) -> str:
+    parts = [
+        f"## Review of module_{index}.py\n\n"
+        "- **Naming**: `value` shadows the argument of the outer function.\n"
+        "- **Performance**: the loop recomputes the same total on every call.\n",
+    ]
+    parts.extend(
+        "```python\n"
+        + "".join(
+            f"def function_{index}_{block}_{line}(value: int) -> int:\n"
+            f"    return value * {line}\n"
+            for line in range(10)
+        )
+        + "```\n"
+        for block in range(code_blocks)
+    )
+    return "\n".join(parts)
+
+
+def run(files: int, code_blocks: int) -> None:
+    reviews = [(f"module_{i}.py", make_review(i, code_blocks)) for i in range(files)]
+    print(f"{'format':>10} {'seconds':>8} {'ms/file':>8} {'KiB':>8}")
+    for output_format in OUTPUT_FORMATS:
+        stream = io.StringIO()
+        console = Console(file=stream, force_terminal=True, width=120)
+        writer = create_writer(output_format, console, stream)
+        start = time.perf_counter()
+        for file_path, review in reviews:
+            writer.write_review(file_path, review)
+        writer.close()
+        seconds = time.perf_counter() - start
+        print(
+            f"{output_format:>10} {seconds:>8.3f} {seconds / files * 1000:>8.2f} "
+            f"{len(stream.getvalue()) / 1024:>8.0f}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--code-blocks", type=int, default=2)
+    args = parser.parse_args()
+    run(args.files, args.code_blocks)
+
+
+if __name__ == "__main__":
+    main()
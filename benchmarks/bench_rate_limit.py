@@ -0,0 +1,134 @@
+"""
+Measure throughput and rate limit errors against a requests-per-minute quota.
+
+A fake vendor enforces ``--quota`` requests per minute like a real API: it
+answers ``429`` without a ``retry-after`` header once the quota of the current
+second is used up. ``--files`` small files are reviewed with ``--workers``
+workers in three modes:
+
+- ``no budget`` sends requests as soon as a worker is free and relies on backoff
+- ``headers`` learns the quota from the rate limit headers of the responses
+- ``budget`` is configured with ``--requests-per-minute`` equal to the quota
+
+Usage:
+    python -m benchmarks.bench_rate_limit --files 200 --workers 8 --quota 1200
+"""
+
+import argparse
+import threading
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.fake import FakeReviewChatModel
+from ai_review_assistant.main import review_files
+from ai_review_assistant.ratelimit import TokenBucket
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+class QuotaExceededError(Exception):
+    status_code = 429
+
+
+class QuotaFakeChatModel(FakeReviewChatModel):
+    """Fake chat model that enforces a requests-per-minute quota per second."""
+
+    quota: int = 1200
+    send_headers: bool = False
+    _bucket: TokenBucket = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _rejected: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._bucket = TokenBucket(self.quota, 0.0, time.monotonic())
+        self._bucket.level = self._bucket.capacity
+
+    @property
+    def rejected(self) -> int:
+        return self._rejected
+
+    def _generate(self, messages: Any, *args: Any, **kwargs: Any) -> ChatResult:
+        with self._lock:
+            self._bucket.refill(time.monotonic())
+            if self._bucket.level < 1:
+                self._rejected += 1
+                raise QuotaExceededError("Rate limit reached for requests")
+            self._bucket.level -= 1
+            remaining = int(self._bucket.level * 60)
+        headers = (
+            {
+                "x-ratelimit-limit-requests": str(self.quota),
+                "x-ratelimit-remaining-requests": str(remaining),
+            }
+            if self.send_headers
+            else {}
+        )
+        text = self._call(messages, *args, **kwargs)
+        return ChatResult(
+            generations=[
+                ChatGeneration(
+                    message=AIMessage(
+                        content=text,
+                        response_metadata={"headers": headers},
+                    ),
+                ),
+            ],
+        )
+
+
+def run(files: int, workers: int, quota: int, latency: float) -> None:
+    changes = [
+        FileChange.from_text(
+            f"pkg/module_{i}.py",
+            f"def f{i}():\n    return {i}\n",
+            f"def f{i}():\n    return {i + 1}\n",
+        )
+        for i in range(files)
+    ]
+
+    print(
+        f"{'mode':>10} {'wall (s)':>9} {'req/min':>8} {'of quota':>9} "
+        f"{'429s':>5} {'failed':>7}",
+    )
+    for mode in ("no budget", "headers", "budget"):
+        assistant = CodeReviewAssistant(
+            repo_path=".",
+            vendor_name="fake",
+            model_name="fake",
+            api_key="benchmark",
+            program_language=["Python"],
+            requests_per_minute=quota if mode == "budget" else None,
+        )
+        llm = QuotaFakeChatModel(
+            latency=latency,
+            quota=quota,
+            send_headers=mode == "headers",
+        )
+        assistant.llm = llm
+        start = time.perf_counter()
+        reviews, errors = review_files(assistant, changes, workers)
+        seconds = time.perf_counter() - start
+        per_minute = len(reviews) / seconds * 60
+        print(
+            f"{mode:>10} {seconds:>9.2f} {per_minute:>8.0f} "
+            f"{per_minute / quota:>9.0%} {llm.rejected:>5} {len(errors):>7}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--quota", type=int, default=1200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.files, args.workers, args.quota, args.latency)
+
+
+if __name__ == "__main__":
+    main()
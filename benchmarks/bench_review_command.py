@@ -0,0 +1,167 @@
+"""
+Measure latency, throughput and memory of the whole review command offline.
+
+For each size a synthetic Git repository is created whose last commit modifies
+some of its files. The ``review`` command then runs in a fresh interpreter
+with the ``fake`` vendor, so everything except the LLM itself is measured:
+reading the changes, the project structure, token counting, prompt building
+and printing the reviews. The simulated LLM latency, jitter and error rate are
+passed to the fake vendor through its environment variables.
+
+Sizes are given as ``FILES:CHANGED:LINES``, the number of files in the
+repository, how many of them the last commit modifies and their length.
+
+Usage:
+    python -m benchmarks.bench_review_command --sizes 100:20:200 1000:100:500 --latency 0.05
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from git import Repo
+
+from ai_review_assistant.main import cli
+
+DEFAULT_SIZES = ["100:20:200", "1000:100:500", "5000:400:500"]
+
+
+def build_repo(root: Path, files: int, changed: int, lines: int) -> None:
+    repo = Repo.init(root)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+    paths = [f"package_{index % 50}/module_{index}.py" for index in range(files)]
+    for path in paths:
+        (root / path).parent.mkdir(exist_ok=True)
+    for version in range(2):
+        written = paths if version == 0 else paths[:changed]
+        for index, path in enumerate(written):
+            (root / path).write_text(
+                "".join(
+                    f"def function_{line}(value):\n"
+                    f"    return value + {line * (version + 1) + index}\n"
+                    for line in range(lines // 2)
+                ),
+            )
+        repo.index.add(written)
+        repo.index.commit(f"version {version}")
+
+
+def measure(repo_path: str, arguments: list[str]) -> dict[str, float]:
+    """
+    Run the review command in this process and measure it.
+
+    :param repo_path: The synthetic repository.
+    :param arguments: The arguments of the command after ``review``.
+    :return: The wall time in seconds and the peak RSS in kilobytes.
+    """
+    os.chdir(repo_path)
+    start = time.perf_counter()
+    # The command always exits, with 1 if a review failed as expected with --error-rate
+    with contextlib.suppress(SystemExit):
+        cli.main(
+            [
+                "--vendor",
+                "fake",
+                "--api-key",
+                "benchmark",
+                "--no-cache",
+                "review",
+                *arguments,
+            ],
+        )
+    return {
+        "seconds": time.perf_counter() - start,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run(
+    sizes: list[str],
+    workers: int,
+    latency: float,
+    jitter: float,
+    error_rate: float,
+) -> None:
+    env = {
+        **os.environ,
+        "AI_REVIEW_FAKE_LATENCY": str(latency),
+        "AI_REVIEW_FAKE_JITTER": str(jitter),
+        "AI_REVIEW_FAKE_ERROR_RATE": str(error_rate),
+    }
+    print(
+        f"{'size':>16} {'wall (s)':>9} {'files/s':>8} {'p50 (s)':>8} "
+        f"{'p95 (s)':>8} {'failed':>7} {'peak RSS (MB)':>14}",
+    )
+    for size in sizes:
+        files, changed, lines = (int(value) for value in size.split(":"))
+        with tempfile.TemporaryDirectory() as directory:
+            build_repo(Path(directory), files, changed, lines)
+            stats_file = Path(directory) / ".git" / "stats.jsonl"
+            arguments = [
+                "--no-stream",
+                "--workers",
+                str(workers),
+                "--stats-file",
+                str(stats_file),
+            ]
+            result = subprocess.run(  # noqa: S603
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_review_command",
+                    "--measure",
+                    json.dumps(arguments),
+                    "--repo",
+                    directory,
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+                env=env,
+            )
+            measured = json.loads(result.stdout.splitlines()[-1])
+            records = [json.loads(line) for line in stats_file.read_text().splitlines()]
+        run_stats = records[-1]
+        failed = changed - sum(
+            1 for record in records if record["type"] == "file" and record["calls"] > 0
+        )
+        print(
+            f"{size:>16} {measured['seconds']:>9.2f} "
+            f"{changed / measured['seconds']:>8.1f} "
+            f"{run_stats['file_p50_seconds']:>8.3f} "
+            f"{run_stats['file_p95_seconds']:>8.3f} {failed:>7} "
+            f"{measured['peak_rss_kb'] / 1024:>14.1f}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--repo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measured = measure(args.repo, json.loads(args.measure))
+        print(json.dumps(measured))
+        return
+
+    run(args.sizes, args.workers, args.latency, args.jitter, args.error_rate)
+
+
+if __name__ == "__main__":
+    main()
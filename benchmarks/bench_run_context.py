@@ -0,0 +1,90 @@
+"""
+Measure the prompt-building overhead of a multi-file review on a large tree.
+
+A synthetic repository with ``--files`` files is created in a temporary
+directory and several files are reviewed with ``--code-depth`` against a fake
+LLM that answers instantly. The run is repeated with the per-run context
+invalidated before every file, which reproduces the old behaviour of walking
+the tree and parsing pyproject.toml again for each file.
+
+Usage:
+    python -m benchmarks.bench_run_context --files 50000 --reviews 20
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from ai_review_assistant.fake import FakeReviewChatModel
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def build_tree(root: Path, files: int, fan_out: int = 20) -> None:
+    (root / "pyproject.toml").write_text(
+        '[tool.code_review_assistant]\nprompt_template = "Review {file_path} in '
+        '{program_language}.\\n{project_structure}\\nAnswer in {result_output_language}."\n',
+    )
+    per_leaf = max(files // (fan_out * fan_out), 1)
+    created = 0
+    for top in range(fan_out):
+        for sub in range(fan_out):
+            leaf = root / f"package_{top}" / f"module_{sub}"
+            leaf.mkdir(parents=True)
+            for index in range(per_leaf):
+                (leaf / f"file_{index}.py").touch()
+                created += 1
+                if created >= files:
+                    return
+
+
+def review(assistant: CodeReviewAssistant, reviews: int, *, shared: bool) -> float:
+    start = time.perf_counter()
+    for index in range(reviews):
+        if not shared:
+            assistant.context.invalidate()
+        assistant.review_changes(f"src/file_{index}.py", "x = 1\n", "x = 2\n")
+    return time.perf_counter() - start
+
+
+def run(files: int, reviews: int, code_depth: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory)
+        start = time.perf_counter()
+        build_tree(root, files)
+        print(f"Built {files} files in {time.perf_counter() - start:.1f}s")
+
+        assistant = CodeReviewAssistant(
+            repo_path=directory,
+            vendor_name="openai",
+            model_name="gpt-3.5-turbo",
+            api_key="benchmark",
+            code_depth=code_depth,
+            program_language=["Python"],
+        )
+        assistant.llm = FakeReviewChatModel()
+
+        per_file = review(assistant, reviews, shared=False)
+        assistant.context.invalidate()
+        shared = review(assistant, reviews, shared=True)
+
+        print(f"{'mode':>22} {'total (s)':>10} {'per file (ms)':>14}")
+        for mode, elapsed in [
+            ("rescan for every file", per_file),
+            ("shared run context", shared),
+        ]:
+            print(f"{mode:>22} {elapsed:>10.2f} {1000 * elapsed / reviews:>14.1f}")
+        print(f"Speedup: {per_file / shared:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--reviews", type=int, default=20)
+    parser.add_argument("--code-depth", type=int, default=3)
+    args = parser.parse_args()
+    run(args.files, args.reviews, args.code_depth)
+
+
+if __name__ == "__main__":
+    main()
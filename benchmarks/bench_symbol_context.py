@@ -0,0 +1,155 @@
+"""
+Measure the cost of the symbol index and the context it adds to a review.
+
+A synthetic repository of ``--modules`` Python modules is created, each calling
+functions of a few others, and the last commit edits one function in
+``--changed`` of them. For those files the prompt context is compared:
+
+- ``code-depth`` is the project structure listing added by ``--code-depth``,
+  the same for every file whatever it changes
+- ``symbol-context`` is the related code added by ``--symbol-context``, the
+  definitions called by the changed lines and the code calling the changed
+  definitions, with the share of it that comes from a module actually
+  connected to the changed function
+
+The index is timed when built from scratch, when built again from the parsed
+blobs stored in ``.git``, and when updated in memory after a new commit.
+
+Usage:
+    python -m benchmarks.bench_symbol_context --modules 2000 --changed 20
+"""
+
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from git import Repo
+
+from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.symbols import SymbolIndex
+
+# The modules called by each module, counted forward from its own number
+CALLEES = (1, 7, 31)
+
+
+def module_source(index: int, modules: int, version: int) -> str:
+    calls = "\n".join(
+        f"    total += helper_{(index + step) % modules}(value)" for step in CALLEES
+    )
+    return (
+        f"from package import {', '.join(f'helper_{(index + s) % modules}' for s in CALLEES)}\n\n\n"
+        f"def helper_{index}(value):\n"
+        f"    return value * {index + version}\n\n\n"
+        f"def process_{index}(value):\n"
+        f"    total = 0\n{calls}\n"
+        f"    return total\n"
+    )
+
+
+def build_repo(root: Path, modules: int, changed: int) -> Repo:
+    repo = Repo.init(root)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+    (root / "package").mkdir()
+    names = [f"package/module_{index}.py" for index in range(modules)]
+    for index, name in enumerate(names):
+        (root / name).write_text(module_source(index, modules, 0))
+    repo.index.add(names)
+    repo.index.commit("Initial commit")
+    for index in range(changed):
+        (root / names[index]).write_text(module_source(index, modules, 1))
+    repo.index.add(names[:changed])
+    repo.index.commit("Change the helpers")
+    return repo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=2000)
+    parser.add_argument("--changed", type=int, default=20)
+    parser.add_argument("--code-depth", type=int, default=2)
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory)
+        repo = build_repo(root, args.modules, args.changed)
+        assistant = CodeReviewAssistant(
+            repo_path=directory,
+            vendor_name="fake",
+            model_name="fake",
+            api_key="",
+            code_depth=args.code_depth,
+        )
+
+        index = SymbolIndex.for_repo(root)
+        start = time.perf_counter()
+        index.refresh()
+        cold = time.perf_counter() - start
+        index.close()
+        index = SymbolIndex.for_repo(root)
+        start = time.perf_counter()
+        index.refresh()
+        warm = time.perf_counter() - start
+        print(
+            f"{args.modules} modules: index built in {cold:.3f} s, "
+            f"again from stored blobs in {warm:.3f} s",
+        )
+
+        structure_tokens = assistant.count_tokens(
+            assistant.context.project_structure(args.code_depth),
+        )
+        context_tokens = []
+        relevant_tokens = []
+        lookup_seconds = 0.0
+        for module in range(args.changed):
+            path = f"package/module_{module}.py"
+            before = module_source(module, args.modules, 0)
+            after = module_source(module, args.modules, 1)
+            start = time.perf_counter()
+            related = index.related_code(
+                path,
+                before,
+                after,
+                args.max_tokens,
+                assistant.count_tokens,
+            )
+            lookup_seconds += time.perf_counter() - start
+            context_tokens.append(assistant.count_tokens(related))
+            # Connected modules call helper_{module}, the function that changed
+            connected = {(module - step) % args.modules for step in CALLEES}
+            relevant_tokens.append(
+                sum(
+                    assistant.count_tokens(section)
+                    for section in related.split("\n\n")
+                    if (found := re.match(r"package/module_(\d+)\.py", section))
+                    and int(found.group(1)) in connected
+                ),
+            )
+
+        print(f"{'context':>15} {'tokens/file':>12} {'relevant':>9}")
+        print(f"{'code-depth':>15} {structure_tokens:>12} {'-':>9}")
+        average = sum(context_tokens) / args.changed
+        relevant = sum(relevant_tokens) / max(sum(context_tokens), 1)
+        print(f"{'symbol-context':>15} {average:>12.0f} {relevant:>9.0%}")
+        print(f"lookup {lookup_seconds / args.changed * 1000:.1f} ms per file")
+
+        (root / "package/module_extra.py").write_text("def extra():\n    pass\n")
+        repo.index.add(["package/module_extra.py"])
+        repo.index.commit("Add a module")
+        index.invalidate()
+        parsed = index.parsed_blobs
+        start = time.perf_counter()
+        index.refresh()
+        print(
+            f"update after a commit: {time.perf_counter() - start:.3f} s, "
+            f"{index.parsed_blobs - parsed} blob parsed",
+        )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measure token counting on large sources with and without the TokenCounter.
+
+``--files`` synthetic Python sources of ``--file-kb`` kilobytes each are
+counted the way a run counts them: every file ``--repeats`` times (budget
+check, cache entry, retries), the lines of a file ``--repeats`` times for
+chunking, and many small files against the default budget.
+
+Usage:
+    python -m benchmarks.bench_token_count --files 8 --file-kb 1024 --repeats 3
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+
+import tiktoken
+
+from ai_review_assistant.tokens import TokenCounter
+
+SMALL_FILES = 2000
+SMALL_FILE_BUDGET = 100000
+
+
+def make_source(index: int, size: int) -> str:
+    lines = []
+    length = 0
+    line_number = 0
+    while length < size:
+        line = (
+            f"def function_{index}_{line_number}(value: int) -> int:\n"
+            f"    return value * {line_number} + {index}  # café {line_number}\n"
+        )
+        lines.append(line)
+        length += len(line)
+        line_number += 1
+    return "".join(lines)
+
+
+def timed(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(files: int, file_kb: int, repeats: int) -> None:
+    encoding = tiktoken.get_encoding("cl100k_base")
+    sources = [make_source(index, file_kb * 1024) for index in range(files)]
+    small_sources = [make_source(index, 2048) for index in range(SMALL_FILES)]
+    # Warm up the encoder, so the first measurement does not pay for loading it
+    encoding.encode(sources[0][:1000])
+
+    def encode_every_time() -> None:
+        for _ in range(repeats):
+            for source in sources:
+                len(encoding.encode(source))
+
+    def count_cached() -> None:
+        counter = TokenCounter(lambda: encoding)
+        for _ in range(repeats):
+            for source in sources:
+                counter.count(source)
+
+    lines = sources[0].splitlines(keepends=True)
+
+    def count_lines_every_time() -> None:
+        for _ in range(repeats):
+            for line in lines:
+                len(encoding.encode(line))
+
+    def count_lines_cached() -> None:
+        counter = TokenCounter(lambda: encoding)
+        for _ in range(repeats):
+            counter.count_batch(lines)
+
+    def check_small_files_by_encoding() -> list[bool]:
+        return [
+            len(encoding.encode(source)) <= SMALL_FILE_BUDGET
+            for source in small_sources
+        ]
+
+    def check_small_files_by_bound() -> list[bool]:
+        counter = TokenCounter(lambda: encoding)
+        return [counter.fits(SMALL_FILE_BUDGET, source) for source in small_sources]
+
+    scenarios = [
+        (
+            f"count {files} files x{repeats}",
+            encode_every_time,
+            count_cached,
+        ),
+        (
+            f"count {len(lines)} lines x{repeats}",
+            count_lines_every_time,
+            count_lines_cached,
+        ),
+        (
+            f"budget check of {SMALL_FILES} small files",
+            check_small_files_by_encoding,
+            check_small_files_by_bound,
+        ),
+    ]
+    print(f"{'scenario':>36} {'before (s)':>11} {'after (s)':>10} {'speedup':>8}")
+    for name, before, after in scenarios:
+        before_seconds = timed(before)
+        after_seconds = timed(after)
+        print(
+            f"{name:>36} {before_seconds:>11.3f} {after_seconds:>10.3f} "
+            f"{before_seconds / after_seconds:>7.1f}x",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--file-kb", type=int, default=1024)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.files, args.file_kb, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,7 @@ setup(
         "langchain>=0.2.11",
         "langchain-core>=0.2.23",
         "langchain-openai>=0.1.17",
-        "langchain-anthropic>=0.1.20",
+        "langchain-anthropic>=0.1.23",
         "openai>=1.37.0",
         "rich>=13.0.0",
         "toml>=0.10.2",
@@ -48,6 +48,7 @@ setup(
         "console_scripts": [
             "ai_review_assistant=ai_review_assistant.main:cli",
             "install-ai-review-hook=ai_review_assistant.hooks.pre_commit:install_pre_commit_hook",
+            "ai_review_daemon=ai_review_assistant.daemon:serve",
         ],
     },
     include_package_data=True,
@@ -0,0 +1,123 @@
+import subprocess
+import time
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.cache import ReviewCache, git_blob_sha
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def test_git_blob_sha_matches_git(tmp_path):
+    content = "print('hello')\n"
+    file_path = tmp_path / "hello.py"
+    file_path.write_text(content)
+    expected = subprocess.run(
+        ["git", "hash-object", str(file_path)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    assert git_blob_sha(content) == expected
+
+
+def test_review_cache_hits_and_misses(tmp_path):
+    cache = ReviewCache(tmp_path / "cache.sqlite3")
+    key = cache.make_key(before_blob="a", after_blob="b", model="gpt-4")
+
+    assert cache.get(key) is None
+    cache.set(key, "Looks good", tokens=120, seconds=1.5)
+    assert cache.get(key) == "Looks good"
+
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert cache.saved_tokens == 120
+    assert cache.saved_seconds == 1.5
+    assert cache.make_key(model="gpt-4", before_blob="a", after_blob="b") == key
+    assert cache.make_key(before_blob="a", after_blob="b", model="gpt-4o") != key
+
+
+def test_review_cache_evicts_old_and_excess_entries(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = ReviewCache(path)
+    cache.set("old", "old review")
+    cache.set("first", "first review")
+    cache.set("second", "second review")
+    cache._connection.execute(
+        "UPDATE reviews SET created_at = ? WHERE key = 'old'",
+        (time.time() - 10 * 86400,),
+    )
+    cache._connection.commit()
+    cache.close()
+
+    reopened = ReviewCache(path, max_entries=1, max_age_days=5)
+    assert reopened.get("old") is None
+    assert reopened.get("first") is None
+    assert reopened.get("second") == "second review"
+
+
+def test_review_cache_for_repo_requires_git_dir(tmp_path):
+    assert ReviewCache.for_repo(tmp_path) is None
+    (tmp_path / ".git").mkdir()
+    assert (
+        ReviewCache.for_repo(tmp_path).path
+        == tmp_path / ".git" / "ai_review_cache.sqlite3"
+    )
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_uses_cache(MockChatOpenAI, tmp_path):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    cache = ReviewCache(tmp_path / "cache.sqlite3")
+
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        cache=cache,
+    )
+
+    assert (
+        assistant.review_changes("main.py", "old code", "new code")
+        == "Mocked AI review"
+    )
+    assert (
+        assistant.review_changes("main.py", "old code", "new code")
+        == "Mocked AI review"
+    )
+    mock_llm.invoke.assert_called_once()
+
+    assistant.review_changes("main.py", "old code", "newer code")
+    assert mock_llm.invoke.call_count == 2
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_cache_records_the_tokens_sent_in_hunks_mode(MockChatOpenAI, tmp_path):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    cache = ReviewCache(tmp_path / "cache.sqlite3")
+    before = "".join(f"value_{i} = {i}\n" for i in range(500))
+    after = before.replace("value_250 = 250\n", "value_250 = 251\n")
+
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        diff_mode="hunks",
+        cache=cache,
+    )
+    assistant.review_changes("values.py", before, after)
+    assistant.review_changes("values.py", before, after)
+
+    messages = mock_llm.invoke.call_args[0][0]
+    assert cache.saved_tokens == sum(
+        assistant.count_tokens(message.content) for message in messages
+    )
+    assert cache.saved_tokens < assistant.count_tokens(before + after)
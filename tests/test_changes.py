@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from git import Repo
+
+from ai_review_assistant.changes import (
+    FileChange,
+    diff_commits,
+    diff_staged,
+    iter_file_changes,
+)
+
+
+def test_iter_file_changes_skips_binary_and_large_files(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    files = {
+        "main.py": (b"x = 1\n", "x = 'café'\n".encode()),
+        "logo.png": (b"\x89PNG\r\n\x1a\n\0\0", b"\x89PNG\r\n\x1a\n\0\1"),
+        "bundle.js": (b"a;" * 100, b"b;" * 100),
+        "latin1.txt": (b"old\n", b"caf\xe9\n"),
+    }
+    for name, (before, _) in files.items():
+        (tmp_path / name).write_bytes(before)
+    repo.index.add(list(files))
+    previous = repo.index.commit("before")
+    for name, (_, after) in files.items():
+        (tmp_path / name).write_bytes(after)
+    repo.index.add(list(files))
+    current = repo.index.commit("after")
+
+    changes = {
+        change.path: change
+        for change in iter_file_changes(previous.diff(current), max_file_bytes=100)
+    }
+
+    assert changes["logo.png"].skip_reason == "binary file"
+    assert changes["bundle.js"].skip_reason == "file too large (200 bytes, limit 100)"
+    assert changes["main.py"].skip_reason is None
+    assert changes["main.py"].after == "x = 'café'\n"
+    assert changes["latin1.txt"].skip_reason is None
+    assert changes["latin1.txt"].after == "caf�\n"
+
+
+def test_file_change_from_text():
+    change = FileChange.from_text("main.py", "old", "new")
+
+    assert (change.path, change.before, change.after) == ("main.py", "old", "new")
+    assert change == FileChange.from_text("main.py", "other", "content")
+    assert change.skip_reason is None
+
+
+def test_iter_file_changes_handles_added_deleted_and_renamed_files(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    body = "".join(f"line_{index} = {index}\n" for index in range(20))
+    (tmp_path / "old_name.py").write_text(body)
+    (tmp_path / "moved.py").write_text("x = 1\n")
+    (tmp_path / "obsolete.py").write_text("y = 1\n")
+    repo.index.add(["old_name.py", "moved.py", "obsolete.py"])
+    previous = repo.index.commit("before")
+
+    repo.index.move(["old_name.py", "new_name.py"])
+    (tmp_path / "new_name.py").write_text(body + "line_20 = 20\n")
+    repo.index.move(["moved.py", "pkg_moved.py"])
+    repo.index.remove(["obsolete.py"], working_tree=True)
+    (tmp_path / "added.py").write_text("z = 1\n")
+    repo.index.add(["new_name.py", "added.py"])
+    current = repo.index.commit("after")
+
+    changes = {
+        change.path: change for change in iter_file_changes(previous.diff(current))
+    }
+
+    assert set(changes) == {"new_name.py", "pkg_moved.py", "obsolete.py", "added.py"}
+    added = changes["added.py"]
+    assert (added.change_type, added.before, added.after) == ("A", "", "z = 1\n")
+    deleted = changes["obsolete.py"]
+    assert (deleted.change_type, deleted.skip_reason) == ("D", "file deleted")
+    renamed = changes["new_name.py"]
+    assert (renamed.change_type, renamed.old_path) == ("R", "old_name.py")
+    assert renamed.before == body
+    assert renamed.after == body + "line_20 = 20\n"
+    moved = changes["pkg_moved.py"]
+    assert moved.old_path == "moved.py"
+    assert moved.before == moved.after
+
+
+def test_raw_diff_lists_the_same_changes_as_gitpython(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "kept.py").write_text("x = 1\n")
+    (tmp_path / "deleted.py").write_text("y = 1\n")
+    (tmp_path / "old name.py").write_text("def f():\n    return 1\n" * 20)
+    repo.index.add(["kept.py", "deleted.py", "old name.py"])
+    previous = repo.index.commit("before")
+    (tmp_path / "kept.py").write_text("x = 2\n")
+    (tmp_path / "added.py").write_text("z = 1\n")
+    repo.index.remove(["deleted.py"], working_tree=True)
+    repo.index.move(["old name.py", "new name.py"])
+    repo.index.add(["kept.py", "added.py"])
+
+    def summary(diffs):
+        return sorted(
+            (
+                diff.change_type,
+                diff.a_path,
+                diff.b_path,
+                diff.a_blob and diff.a_blob.hexsha,
+                diff.b_blob and diff.b_blob.hexsha,
+            )
+            for diff in diffs
+        )
+
+    staged = diff_staged(repo)
+    assert summary(staged) == summary(repo.index.diff("HEAD", R=True))
+    assert [diff.change_type for diff in staged] == ["A", "D", "M", "R"]
+
+    current = repo.index.commit("after")
+    assert summary(diff_commits(previous, current)) == summary(previous.diff(current))
+    changes = list(iter_file_changes(diff_commits(previous, current)))
+    renamed = next(change for change in changes if change.change_type == "R")
+    assert (renamed.old_path, renamed.path) == ("old name.py", "new name.py")
+    assert renamed.after == "def f():\n    return 1\n" * 20
+
+
+def test_file_changes_can_be_read_from_several_threads(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    names = [f"module_{i}.py" for i in range(40)]
+    for version in range(2):
+        for i, name in enumerate(names):
+            (tmp_path / name).write_text(f"value = {i * version}\n" * 2000)
+        repo.index.add(names)
+        repo.index.commit(f"version {version}")
+    current = repo.head.commit
+
+    changes = list(iter_file_changes(current.parents[0].diff(current)))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(lambda change: change.after, changes))
+
+    assert contents == [(tmp_path / change.path).read_text() for change in changes]
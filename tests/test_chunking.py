@@ -0,0 +1,98 @@
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.chunking import chunk_changes, pack_hunks
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_module(functions):
+    return "".join(
+        f"def function_{i}(value):\n    result = value + {i}\n    return result\n\n"
+        for i in range(functions)
+    )
+
+
+def test_chunk_changes_keeps_matching_regions_together():
+    before = make_module(30)
+    after = before.replace("value + 12", "value - 12").replace(
+        "def function_20(value):\n",
+        "@cached\ndef function_20(value):\n",
+    )
+
+    chunks = chunk_changes(before, after, count_words, 60)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.before for chunk in chunks) == before
+    assert "".join(chunk.after for chunk in chunks) == after
+    for chunk in chunks:
+        assert count_words(chunk.before) + count_words(chunk.after) <= 60
+        assert chunk.before.startswith("def function_")
+        assert chunk.after.startswith(("def function_", "@cached"))
+        # Unchanged functions appear on both sides of the same chunk
+        assert chunk.before.count("def ") == chunk.after.count("def ")
+
+
+def test_chunk_changes_splits_oversized_changed_region_by_lines():
+    before = "x = 1\n"
+    after = "".join(f"value_{i} = {i}\n" for i in range(100))
+
+    chunks = chunk_changes(before, after, count_words, 30)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.after for chunk in chunks) == after
+    assert all(
+        count_words(chunk.before) + count_words(chunk.after) <= 30 for chunk in chunks
+    )
+
+
+def test_pack_hunks_splits_oversized_hunks():
+    small = "@@ -1,1 +1,1 @@\n-a\n+b"
+    large = "@@ -10,40 +10,40 @@\n" + "\n".join(f"+line {i}" for i in range(40))
+
+    batches = pack_hunks([small, large], count_words, 30)
+
+    assert batches[0][0] == small
+    pieces = [piece for batch in batches for piece in batch][1:]
+    assert len(pieces) > 1
+    assert all(piece.startswith("@@ -10,40 +10,40 @@") for piece in pieces)
+    assert all(sum(count_words(p) for p in batch) <= 30 for batch in batches)
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_chunks_by_token_budget(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        batch_size=6000,
+    )
+    before = make_module(400)
+    after = before.replace("value + 200", "value - 200")
+    system_prompt = assistant.construct_system_prompt()
+    file_header = assistant.construct_file_header("module.py")
+    budget = assistant._chunk_token_budget(file_header)
+
+    assistant.review_changes("module.py", before, after)
+
+    assert mock_llm.invoke.call_count > 1
+    for call in mock_llm.invoke.call_args_list:
+        system_message, prompt = call[0][0]
+        assert system_message.content == system_prompt
+        assert assistant.count_tokens(system_prompt) + assistant.count_tokens(
+            prompt.content,
+        ) <= (assistant.batch_size - assistant.RESPONSE_TOKEN_RESERVE)
+    assert budget == (
+        6000
+        - assistant.count_tokens(system_prompt)
+        - assistant.count_tokens(file_header)
+        - assistant.RESPONSE_TOKEN_RESERVE
+    )
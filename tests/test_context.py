@@ -0,0 +1,89 @@
+import os
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.context import ReviewContext
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def test_review_context_memoizes_until_mtime_changes(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text("")
+    scan_structure = Mock(return_value="[FILE] pyproject.toml")
+    read_template = Mock(return_value="template")
+    context = ReviewContext(str(tmp_path), scan_structure, read_template)
+
+    for _ in range(3):
+        assert context.project_structure(2) == "[FILE] pyproject.toml"
+        assert context.prompt_template() == "template"
+    assert context.project_structure(0) == ""
+    scan_structure.assert_called_once_with(str(tmp_path), 2)
+    read_template.assert_called_once_with()
+
+    os.utime(pyproject, (0, 0))
+    os.utime(tmp_path, (0, 0))
+    context.project_structure(2)
+    context.prompt_template()
+    assert scan_structure.call_count == 2
+    assert read_template.call_count == 2
+
+    context.invalidate()
+    context.prompt_template()
+    assert read_template.call_count == 3
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_scans_project_once_per_run(MockChatOpenAI, tmp_path):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("")
+
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        code_depth=2,
+        program_language=["Python"],
+    )
+
+    with (
+        patch.object(
+            assistant.context,
+            "_scan_structure",
+            wraps=assistant.get_project_structure,
+        ) as scan_structure,
+        patch.object(
+            assistant.context,
+            "_read_template",
+            wraps=assistant.read_prompt_template_from_toml,
+        ) as read_template,
+    ):
+        for file_path in ["a.py", "b.py", "c.py"]:
+            assistant.review_changes(file_path, "old code", "new code")
+
+    scan_structure.assert_called_once_with(str(tmp_path), 2)
+    read_template.assert_called_once_with()
+    assert "[FILE] main.py" in mock_llm.invoke.call_args[0][0][0].content
+
+
+def test_start_run_sees_files_added_in_subdirectories(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("")
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="fake",
+        model_name="fake",
+        api_key="",
+        code_depth=2,
+    )
+    assert "utils.py" not in assistant.context.project_structure(2)
+
+    # Adding a file to a subdirectory leaves the mtime of the repository root alone
+    mtime = tmp_path.stat().st_mtime
+    (tmp_path / "src" / "utils.py").write_text("")
+    os.utime(tmp_path, (mtime, mtime))
+    assistant.start_run()
+
+    assert "utils.py" in assistant.context.project_structure(2)
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+from git import Repo
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.daemon import (
+    DaemonClient,
+    DaemonError,
+    ReviewDaemon,
+    connect_or_start,
+)
+from ai_review_assistant.main import cli
+from ai_review_assistant.review import CodeReviewAssistant
+
+SETTINGS = {
+    "vendor_name": "fake",
+    "model_name": "fake",
+    "api_key": "unused",
+    "program_language": ["Python"],
+    "cache": False,
+    "incremental": False,
+}
+
+
+@pytest.fixture()
+def review_daemon(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0")
+    review_daemon = ReviewDaemon(tmp_path / "daemon.sock")
+    thread = threading.Thread(target=review_daemon.serve)
+    thread.start()
+    assert review_daemon.ready.wait(5)
+    yield review_daemon
+    review_daemon.stop()
+    thread.join(5)
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_daemon_reuses_its_assistant_across_runs(review_daemon, tmp_path):
+    client = DaemonClient(review_daemon.socket_path)
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="fake",
+        model_name="fake",
+        api_key="unused",
+    )
+    changes = [
+        FileChange.from_text(f"module_{i}.py", f"x = {i}\n", f"x = {i + 1}\n")
+        for i in range(3)
+    ]
+    tokens = []
+
+    for _ in range(2):
+        results = list(
+            client.iter_reviews(
+                SETTINGS,
+                assistant,
+                changes,
+                workers=2,
+                on_token=lambda path, text: tokens.append(path),
+            ),
+        )
+        assert sorted(path for path, _, _ in results) == [
+            change.path for change in changes
+        ]
+        assert all(review and error is None for _, review, error in results)
+        assert len(assistant.stats.files) == 3
+
+    assert set(tokens) == {change.path for change in changes}
+    assert len(review_daemon.assistants) == 1
+    assert client.ping()["pid"] > 0
+
+
+def test_daemon_packs_batches_by_the_size_of_the_files(review_daemon, tmp_path):
+    client = DaemonClient(review_daemon.socket_path)
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="fake",
+        model_name="fake",
+        api_key="unused",
+    )
+    changes = [
+        FileChange.from_text(
+            f"module_{i}.py",
+            "".join(f"value_{j} = {j}\n" for j in range(300)),
+            "".join(f"value_{j} = {j + i}\n" for j in range(300)),
+        )
+        for i in range(1, 4)
+    ]
+
+    results = list(
+        client.iter_reviews(SETTINGS, assistant, changes, batch_tokens=1000),
+    )
+
+    assert len(results) == 3
+    # Each file is larger than the budget, so none of them share a request
+    assert sorted(stats.file_path for stats in assistant.stats.files) == [
+        change.path for change in changes
+    ]
+
+
+def test_daemon_replaces_a_stale_socket_and_refuses_a_second_daemon(tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    socket_path.touch()
+    assert DaemonClient(socket_path).ping() is None
+
+    review_daemon = ReviewDaemon(socket_path, idle_timeout=0.5)
+    thread = threading.Thread(target=review_daemon.serve)
+    thread.start()
+    assert review_daemon.ready.wait(5)
+
+    with pytest.raises(DaemonError, match="already listening"):
+        ReviewDaemon(socket_path).serve()
+
+    # Without requests the daemon stops on its own
+    thread.join(5)
+    assert not thread.is_alive()
+    assert DaemonClient(socket_path).ping() is None
+
+
+def test_client_refuses_a_socket_other_users_can_access(review_daemon):
+    socket_path = review_daemon.socket_path
+    assert DaemonClient(socket_path).ping() is not None
+
+    socket_path.chmod(0o666)
+    try:
+        assert DaemonClient(socket_path).ping() is None
+        with pytest.raises(DaemonError, match="mode 0600"):
+            connect_or_start(socket_path)
+    finally:
+        socket_path.chmod(0o600)
+
+
+def test_cli_review_runs_in_the_daemon(review_daemon, tmp_path, monkeypatch):
+    repo = Repo.init(tmp_path / "repo")
+    (tmp_path / "repo" / "main.py").write_text("x = 1\n")
+    repo.index.add(["main.py"])
+    repo.index.commit("Initial commit")
+    (tmp_path / "repo" / "main.py").write_text("x = 2\n")
+    repo.index.add(["main.py"])
+    repo.index.commit("Change x")
+    monkeypatch.chdir(tmp_path / "repo")
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--vendor",
+            "fake",
+            "--api-key",
+            "unused",
+            "--no-cache",
+            "--daemon",
+            "--daemon-socket",
+            str(review_daemon.socket_path),
+            "review",
+            "--stats",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "main.py" in result.output
+    assert "Review stats" in result.output
+    assert len(review_daemon.assistants) == 1
+
+
+def test_connect_or_start_starts_a_daemon_in_the_background(tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+
+    client = connect_or_start(socket_path, idle_timeout=30)
+    try:
+        assert client.ping() is not None
+        assert connect_or_start(socket_path).ping() == client.ping()
+    finally:
+        client.stop()
+    deadline = time.monotonic() + 5
+    while socket_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not socket_path.exists()
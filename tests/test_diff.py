@@ -0,0 +1,105 @@
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.diff import TokenSavings, build_unified_diff, split_hunks
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def test_build_unified_diff_folds_unchanged_regions():
+    before = "".join(f"line {i}\n" for i in range(100))
+    after = before.replace("line 50\n", "line fifty\n")
+
+    diff = build_unified_diff("module.py", before, after, context_lines=2)
+
+    assert diff.splitlines()[:3] == [
+        "--- a/module.py",
+        "+++ b/module.py",
+        "@@ -49,5 +49,5 @@",
+    ]
+    assert "-line 50" in diff
+    assert "+line fifty" in diff
+    assert "line 10" not in diff
+    assert build_unified_diff("module.py", before, before) == ""
+
+
+def test_split_hunks():
+    before = "".join(f"line {i}\n" for i in range(100))
+    after = before.replace("line 10\n", "ten\n").replace("line 80\n", "eighty\n")
+
+    header, hunks = split_hunks(build_unified_diff("module.py", before, after))
+
+    assert header == "--- a/module.py\n+++ b/module.py"
+    assert len(hunks) == 2
+    assert "+ten" in hunks[0]
+    assert "+eighty" in hunks[1]
+
+
+def test_token_savings_summary():
+    savings = TokenSavings()
+    savings.add(1000, 100)
+    savings.add(1000, 100)
+    assert savings.summary() == (
+        "Diff mode sent 200 code tokens instead of 2000 for full files (90% fewer)"
+    )
+
+
+def test_token_savings_summary_when_the_diff_is_larger():
+    savings = TokenSavings()
+    savings.add(100, 169)
+    assert savings.summary() == (
+        "Diff mode sent 169 code tokens instead of 100 for full files (69% more)"
+    )
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_hunks_mode_sends_only_the_diff(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    before = "".join(f"value_{i} = {i}\n" for i in range(500))
+    after = before.replace("value_250 = 250\n", "value_250 = 251\n")
+
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        diff_mode="hunks",
+        context_lines=1,
+    )
+
+    assert assistant.review_changes("values.py", before, after) == "Mocked AI review"
+    prompt = mock_llm.invoke.call_args[0][0][-1].content
+    assert "-value_250 = 250" in prompt
+    assert "+value_250 = 251" in prompt
+    assert "value_100 = 100" not in prompt
+    assert (
+        assistant.token_savings.sent_tokens < assistant.token_savings.full_file_tokens
+    )
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_hunks_mode_batches_large_diffs(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    before = "".join(f"value_{i} = {i}\n" for i in range(500))
+    after = "".join(
+        f"value_{i} = {i + 1}\n" if i % 50 == 0 else f"value_{i} = {i}\n"
+        for i in range(500)
+    )
+
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        batch_size=100,
+        diff_mode="hunks",
+    )
+
+    result = assistant.review_changes("values.py", before, after)
+    assert "Mocked AI review" in result
+    assert mock_llm.invoke.call_count > 1
+    assert "(part 1 of" in mock_llm.invoke.call_args_list[0][0][0][-1].content
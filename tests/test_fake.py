@@ -0,0 +1,62 @@
+import pytest
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.fake import FakeLLMError, FakeReviewChatModel
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+def make_assistant():
+    return CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="fake",
+        model_name="fake",
+        api_key="unused",
+        program_language=["Python"],
+    )
+
+
+def test_fake_vendor_reviews_single_files_and_batches():
+    assistant = make_assistant()
+
+    assert isinstance(assistant.llm, FakeReviewChatModel)
+    assert assistant.review_changes("a.py", "a = 1\n", "a = 2\n") == (
+        "The changes look good."
+    )
+    assert assistant.review_changes_batch(
+        [
+            FileChange.from_text("b.py", "b = 1\n", "b = 2\n"),
+            FileChange.from_text("c.py", "c = 1\n", "c = 2\n"),
+        ],
+    ) == {"b.py": "The changes look good.", "c.py": "The changes look good."}
+    assert len(assistant.stats.calls) == 2
+
+
+def test_fake_vendor_reads_settings_from_environment(monkeypatch):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0.01")
+    monkeypatch.setenv("AI_REVIEW_FAKE_JITTER", "0.005")
+    monkeypatch.setenv("AI_REVIEW_FAKE_ERROR_RATE", "1")
+    monkeypatch.setenv("AI_REVIEW_FAKE_SEED", "7")
+    assistant = make_assistant()
+    assistant.max_retries = 0
+
+    assert (assistant.llm.latency, assistant.llm.jitter) == (0.01, 0.005)
+    assert (assistant.llm.error_rate, assistant.llm.seed) == (1.0, 7)
+    with pytest.raises(FakeLLMError):
+        assistant.review_changes("a.py", "a = 1\n", "a = 2\n")
+
+
+def test_fake_failures_depend_only_on_seed_prompt_and_attempt():
+    def outcomes():
+        llm = FakeReviewChatModel(error_rate=0.5, seed=3)
+        results = []
+        for i in range(20):
+            try:
+                results.append(llm.invoke(f"prompt {i}").content)
+            except FakeLLMError:
+                results.append(None)
+        return results
+
+    first = outcomes()
+    assert first == outcomes()
+    assert None in first
+    assert "The changes look good." in first
@@ -0,0 +1,200 @@
+import threading
+from unittest.mock import Mock, patch
+
+from click.testing import CliRunner
+from git import Repo
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.findings import (
+    Finding,
+    blocking_findings,
+    format_findings,
+    parse_findings,
+)
+from ai_review_assistant.main import cli
+from ai_review_assistant.review import CodeReviewAssistant, ReviewCancelledError
+from ai_review_assistant.runner import CANCELLED_ERROR, iter_reviews
+
+
+def test_findings_survive_formatting_as_review_text():
+    review = format_findings(
+        {
+            "summary": "The token leaks.",
+            "findings": [
+                {
+                    "severity": "critical",
+                    "line_start": 3,
+                    "line_end": 5,
+                    "message": "The API token\nis logged",
+                },
+                {"severity": "MINOR", "line_start": 8, "message": "Rename x"},
+                {"severity": "unknown", "message": "Consider a constant"},
+            ],
+        },
+    )
+
+    assert review.startswith("The token leaks.\n\n- [critical] lines 3-5: ")
+    assert parse_findings("main.py", review) == [
+        Finding("main.py", "critical", "The API token is logged", 3, 5),
+        Finding("main.py", "minor", "Rename x", 8, 8),
+        Finding("main.py", "info", "Consider a constant"),
+    ]
+    assert parse_findings("main.py", "The changes look good.") == []
+
+    incremental = "- [minor] Rename y\n\nEarlier review of this file (r):\n" + review
+    assert [finding.severity for finding in parse_findings("a.py", incremental)] == [
+        "minor",
+    ]
+
+
+def test_blocking_findings_are_at_least_as_severe_as_the_threshold():
+    findings = [
+        Finding("a.py", "info", "a"),
+        Finding("a.py", "major", "b"),
+        Finding("a.py", "critical", "c"),
+    ]
+
+    assert blocking_findings(findings, "critical") == findings[2:]
+    assert blocking_findings(findings, "major") == findings[1:]
+    assert blocking_findings(findings[:1], "minor") == []
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_structured_review_uses_the_structured_output_of_the_model(MockChatOpenAI):
+    structured_llm = Mock()
+    structured_llm.invoke.return_value = {
+        "raw": Mock(response_metadata={}, usage_metadata=None),
+        "parsed": {
+            "summary": "One issue.",
+            "findings": [{"severity": "major", "message": "Unchecked input"}],
+        },
+        "parsing_error": None,
+    }
+    MockChatOpenAI.return_value.with_structured_output.return_value = structured_llm
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        structured=True,
+    )
+    tokens = []
+
+    review = assistant.review_changes("a.py", "a = 1\n", "a = 2\n", tokens.append)
+
+    assert review == "One issue.\n\n- [major] Unchecked input"
+    assert tokens == [review]
+    assert MockChatOpenAI.return_value.with_structured_output.call_count == 1
+    assert assistant._cache_key("a", "b", "c") != CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+    )._cache_key("a", "b", "c")
+
+
+def test_iter_reviews_cancels_queued_reviews_after_a_blocking_finding():
+    changes = [
+        FileChange.from_text(f"module_{i}.py", "x = 1\n", "x = 2\n") for i in range(4)
+    ]
+    started = []
+    release = threading.Event()
+
+    def fake_review(file_path, before, after):
+        started.append(file_path)
+        if file_path == "module_0.py":
+            return "Broken.\n\n- [critical] line 1: Divides by zero"
+        release.wait(5)
+        return "The changes look good."
+
+    assistant = Mock()
+    assistant.review_changes.side_effect = fake_review
+
+    results = list(iter_reviews(assistant, changes, workers=2, fail_on="critical"))
+    release.set()
+
+    assert results[0] == (
+        "module_0.py",
+        "Broken.\n\n- [critical] line 1: Divides by zero",
+        None,
+    )
+    assert results[1:] == [
+        (f"module_{i}.py", None, CANCELLED_ERROR) for i in range(1, 4)
+    ]
+    assistant.cancel.assert_called()
+    assert "module_3.py" not in started
+
+    results = list(iter_reviews(assistant, changes[1:], workers=2, fail_on="critical"))
+    assert all(error is None for _, _, error in results)
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_reviews_left_over_from_a_cancelled_run_stay_cancelled(MockChatOpenAI):
+    sent = threading.Event()
+    release = threading.Event()
+
+    def invoke(messages):
+        sent.set()
+        release.wait(5)
+        return Mock(content="Mocked AI review")
+
+    MockChatOpenAI.return_value.invoke.side_effect = invoke
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        batch_size=50,
+    )
+    errors = []
+
+    def review():
+        # A large file is reviewed in several requests
+        try:
+            assistant.review_changes(
+                "large_file.py",
+                "print('hello')\n" * 1000,
+                "print('hello')\n" * 1000 + "print('world')\n",
+            )
+        except ReviewCancelledError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=review)
+    thread.start()
+    assert sent.wait(5)
+    assistant.cancel()
+    assistant.start_run()
+    release.set()
+    thread.join(5)
+
+    assert len(errors) == 1
+    assert MockChatOpenAI.return_value.invoke.call_count == 1
+    # The request of the cancelled run is not counted in the next one
+    assert assistant.stats.calls == []
+
+
+def test_cli_fail_on_stops_at_a_critical_finding(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0")
+    repo = Repo.init(tmp_path)
+    for name in ("a.py", "b.py"):
+        (tmp_path / name).write_text("x = 1\n")
+    repo.index.add(["a.py", "b.py"])
+    repo.index.commit("Initial commit")
+    (tmp_path / "a.py").write_text("x = 2  # critical: the old value is lost\n")
+    (tmp_path / "b.py").write_text("x = 2\n")
+    repo.index.add(["a.py", "b.py"])
+    repo.index.commit("Change x")
+    monkeypatch.chdir(tmp_path)
+    arguments = ["--vendor", "fake", "--api-key", "unused", "--no-cache"]
+
+    result = CliRunner().invoke(cli, [*arguments, "review", "--fail-on", "critical"])
+    assert result.exit_code == 2
+    assert "--structured" in result.output
+
+    result = CliRunner().invoke(
+        cli,
+        [*arguments, "--structured", "review", "--fail-on", "critical"],
+    )
+    assert result.exit_code == 1
+    assert "- [critical] the old value is lost" in result.output
+    assert "Critical finding in a.py: the old value is lost" in result.output
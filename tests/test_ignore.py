@@ -0,0 +1,122 @@
+from unittest.mock import patch
+
+import pytest
+from git import Repo
+
+from ai_review_assistant import changes as changes_module
+from ai_review_assistant.changes import iter_file_changes
+from ai_review_assistant.ignore import SETTINGS_FILE_PATTERNS, PathFilter
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+@pytest.mark.parametrize(
+    ("path", "included"),
+    [
+        ("src/app.py", True),
+        ("README.md", False),
+        ("docs/guide/index.md", False),
+        ("docs/changelog.md", True),
+        ("vendor/lib/x.py", False),
+        ("src/vendor/x.py", False),
+        ("build/out.py", False),
+        ("src/build/util.py", True),
+        ("src/proto/api_pb2.py", False),
+        ("src/proto/nested/api_pb2.py", False),
+        ("tests/test_[x].py", True),
+        ("tests/data/case_1.py", False),
+        ("tests/data/case_a.py", True),
+        (".github/workflows/ci.yml", True),
+        ("src/.config/loader.py", True),
+        ("src/.env", False),
+        ("config/settings.toml", False),
+    ],
+)
+def test_path_filter_follows_gitignore_rules(path, included):
+    path_filter = PathFilter(
+        exclude_names=SETTINGS_FILE_PATTERNS,
+        exclude=[
+            "# generated code",
+            "vendor/",
+            "/build",
+            "src/**/*_pb2.py",
+            "!docs/changelog.md",
+            "tests/data/case_[0-9].py",
+        ],
+    )
+
+    assert path_filter.includes(path) == included
+
+
+def test_path_filter_include_patterns_select_files_before_excludes():
+    path_filter = PathFilter(include=["src/", "*.sql"], exclude=["src/legacy/"])
+
+    assert path_filter.includes("src/app.py")
+    assert path_filter.includes("db/migrations/0001.sql")
+    assert not path_filter.includes("scripts/deploy.py")
+    assert not path_filter.includes("src/legacy/old.py")
+    assert PathFilter().includes("anything/at/all.bin")
+
+
+def test_excluded_files_are_left_out_before_their_blobs_are_read(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    names = ["main.py", "node_modules/lib/index.js", "logo.png"]
+    for name in names:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"before\n")
+    repo.index.add(names)
+    previous = repo.index.commit("before")
+    for name in names:
+        (tmp_path / name).write_bytes(b"after\n")
+    repo.index.add(names)
+    current = repo.index.commit("after")
+    sniffed = []
+    is_binary = changes_module._is_binary
+
+    def record_sniff(blob):
+        sniffed.append(blob.path)
+        return is_binary(blob)
+
+    with patch.object(changes_module, "_is_binary", record_sniff):
+        changes = list(
+            iter_file_changes(
+                previous.diff(current),
+                path_filter=PathFilter(exclude=["node_modules/", "*.png"]),
+            ),
+        )
+
+    assert [change.path for change in changes] == ["main.py"]
+    assert set(sniffed) == {"main.py"}
+
+
+def test_assistant_reads_patterns_from_pyproject(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        "[tool.code_review_assistant]\n"
+        'include = ["src/"]\n'
+        'exclude = ["src/generated/", "!src/notes.md"]\n',
+    )
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+    )
+
+    assert not assistant.should_ignore_file("src/app.py")
+    assert not assistant.should_ignore_file("src/notes.md")
+    assert assistant.should_ignore_file("src/README.md")
+    assert assistant.should_ignore_file("src/generated/models.py")
+    assert assistant.should_ignore_file("scripts/deploy.py")
+    assert assistant.path_filter() is assistant.path_filter()
+
+    assistant.ignore_settings_files = False
+    assert not assistant.should_ignore_file("src/README.md")
+
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.code_review_assistant]\nexclude = "src/"\n',
+    )
+    assistant.context.invalidate()
+    with pytest.raises(ValueError, match="must be a list of glob patterns"):
+        assistant.should_ignore_file("src/app.py")
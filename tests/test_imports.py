@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+VENDOR_PACKAGES = ("langchain", "openai", "anthropic", "tiktoken")
+
+
+def test_cli_import_does_not_load_vendor_packages():
+    code = (
+        "import sys, ai_review_assistant.main; "
+        "print('\\n'.join(name for name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = {name.split(".")[0] for name in result.stdout.split()}
+    assert not [name for name in loaded if name.startswith(VENDOR_PACKAGES)]
+
+
+def test_vendor_backend_is_loaded_on_first_use():
+    code = (
+        "import sys; from ai_review_assistant.review import CodeReviewAssistant; "
+        "assistant = CodeReviewAssistant('.', 'openai', 'gpt-3.5-turbo', 'key'); "
+        "print('langchain_openai' in sys.modules); "
+        "assistant.llm; "
+        "print('langchain_openai' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False", "True"]
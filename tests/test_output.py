@@ -0,0 +1,151 @@
+import io
+import json
+
+import pytest
+from rich.console import Console
+
+from ai_review_assistant.output import (
+    JsonLinesReviewWriter,
+    JsonReviewWriter,
+    MarkdownReviewWriter,
+    ReviewWriter,
+    RichReviewWriter,
+    SarifReviewWriter,
+    create_writer,
+)
+
+
+def write_run(writer):
+    writer.write_skipped("image.png", "binary file")
+    writer.write_review("main.py", "Use a constant\n```python\nX = 1\n```")
+    writer.write_error("utils.py", "RuntimeError: LLM unavailable")
+    writer.close()
+
+
+def test_json_lines_writer_writes_one_flushed_record_per_file():
+    stream = io.StringIO()
+    writer = JsonLinesReviewWriter(stream)
+
+    writer.write_review("main.py", "Looks good")
+    assert json.loads(stream.getvalue()) == {
+        "path": "main.py",
+        "status": "reviewed",
+        "review": "Looks good",
+        "findings": [],
+    }
+
+    writer.write_error("utils.py", "timeout")
+    writer.write_skipped("image.png", "binary file")
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record["status"] for record in records] == [
+        "reviewed",
+        "failed",
+        "skipped",
+    ]
+
+
+def test_json_writer_writes_a_valid_array_even_without_records():
+    stream = io.StringIO()
+    JsonReviewWriter(stream).close()
+    assert json.loads(stream.getvalue()) == []
+
+    stream = io.StringIO()
+    write_run(JsonReviewWriter(stream))
+    records = json.loads(stream.getvalue())
+    assert [(record["path"], record["status"]) for record in records] == [
+        ("image.png", "skipped"),
+        ("main.py", "reviewed"),
+        ("utils.py", "failed"),
+    ]
+
+
+def test_sarif_writer_reports_reviews_as_results_and_failures_as_notifications():
+    stream = io.StringIO()
+    write_run(SarifReviewWriter(stream))
+
+    log = json.loads(stream.getvalue())
+    assert log["version"] == "2.1.0"
+    run = log["runs"][0]
+    assert run["tool"]["driver"]["name"] == "ai_review_assistant"
+    assert [result["message"]["text"] for result in run["results"]] == [
+        "Use a constant\n```python\nX = 1\n```",
+    ]
+    location = run["results"][0]["locations"][0]["physicalLocation"]
+    assert location["artifactLocation"]["uri"] == "main.py"
+    invocation = run["invocations"][0]
+    assert invocation["executionSuccessful"] is False
+    assert [
+        notification["level"]
+        for notification in invocation["toolExecutionNotifications"]
+    ] == ["note", "error"]
+
+
+@pytest.mark.parametrize("writer_class", [JsonLinesReviewWriter, SarifReviewWriter])
+def test_record_writers_write_a_streamed_review_as_one_record(writer_class):
+    streamed = io.StringIO()
+    writer = writer_class(streamed)
+    writer.start_tokens("main.py")
+    for text in ("Looks ", "good"):
+        writer.write_token(text)
+    writer.end_tokens()
+    writer.close()
+    whole = io.StringIO()
+    writer = writer_class(whole)
+    writer.write_review("main.py", "Looks good")
+    writer.close()
+
+    assert streamed.getvalue() == whole.getvalue()
+    with pytest.raises(TypeError):
+        ReviewWriter(io.StringIO())
+
+
+def test_markdown_writer_writes_reviews_unrendered():
+    stream = io.StringIO()
+    writer = MarkdownReviewWriter(stream)
+    write_run(writer)
+
+    output = stream.getvalue()
+    assert "## main.py\n\nUse a constant\n```python\nX = 1\n```\n\n" in output
+    assert "**Review failed:** RuntimeError: LLM unavailable" in output
+    assert "_Skipped image.png: binary file_" in output
+
+
+def test_create_writer_renders_rich_only_for_the_rich_format():
+    stream = io.StringIO()
+    console = Console(file=io.StringIO(), width=80)
+
+    writer = create_writer("rich", console, stream)
+    assert isinstance(writer, RichReviewWriter)
+    write_run(writer)
+    assert stream.getvalue() == ""
+    assert "Review failed:" in console.file.getvalue()
+
+    assert isinstance(create_writer("jsonl", console, stream), JsonLinesReviewWriter)
+
+
+def test_writers_report_the_findings_of_structured_reviews():
+    review = (
+        "Leaks the token.\n\n"
+        "- [critical] lines 3-4: The API token is logged\n"
+        "- [minor] Rename x"
+    )
+
+    stream = io.StringIO()
+    JsonLinesReviewWriter(stream).write_review("main.py", review)
+    findings = json.loads(stream.getvalue())["findings"]
+    assert [(f["severity"], f["line_start"], f["line_end"]) for f in findings] == [
+        ("critical", 3, 4),
+        ("minor", None, None),
+    ]
+
+    stream = io.StringIO()
+    writer = SarifReviewWriter(stream)
+    writer.write_review("main.py", review)
+    writer.close()
+    results = json.loads(stream.getvalue())["runs"][0]["results"]
+    assert [result["level"] for result in results] == ["error", "note"]
+    assert results[0]["locations"][0]["physicalLocation"]["region"] == {
+        "startLine": 3,
+        "endLine": 4,
+    }
+    assert "region" not in results[1]["locations"][0]["physicalLocation"]
@@ -0,0 +1,215 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+from click.testing import CliRunner
+from git import Repo
+
+from ai_review_assistant.cache import ReviewCache
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.main import cli
+from ai_review_assistant.priority import (
+    churn_stats,
+    flagged_reviews,
+    parse_numstat,
+    prioritize,
+    risk_score,
+)
+from ai_review_assistant.runner import DEADLINE_ERROR, iter_reviews
+
+
+def test_parse_numstat_reads_renamed_and_skips_binary_files():
+    output = "3\t1\tsrc/app.py\x002\t0\t\x00old.py\x00new.py\x00-\t-\tlogo.png\x00"
+
+    assert parse_numstat(output) == {"src/app.py": (3, 1), "new.py": (2, 0)}
+    assert parse_numstat("") == {}
+
+
+def test_churn_stats_counts_the_lines_of_commits_and_staged_changes(tmp_path):
+    repo = Repo.init(tmp_path)
+    (tmp_path / "a.py").write_text("a = 1\nb = 2\n")
+    repo.index.add(["a.py"])
+    first = repo.index.commit("Initial commit")
+    (tmp_path / "a.py").write_text("a = 1\nb = 3\nc = 4\n")
+    repo.index.add(["a.py"])
+
+    assert churn_stats(repo, first) == {"a.py": (2, 1)}
+
+    second = repo.index.commit("Change b")
+    assert churn_stats(repo, first, second) == {"a.py": (2, 1)}
+    assert churn_stats(repo, None, second) == {}
+
+
+def test_risk_score_ranks_code_above_docs_and_flagged_files_higher():
+    code = FileChange.from_text("src/auth/session.py", "", "")
+    docs = FileChange.from_text("docs/guide.md", "", "")
+    vendored = FileChange.from_text("vendor/lib.py", "", "")
+
+    assert risk_score(code, 10, 2) > risk_score(docs, 10, 2)
+    assert risk_score(code, 10, 2) > risk_score(vendored, 10, 2)
+    assert risk_score(docs, 10, 2, flags=3) > risk_score(docs, 10, 2)
+    assert risk_score(docs, 500, 0) > risk_score(docs, 5, 0)
+
+
+def test_prioritize_orders_by_risk_and_fits_the_token_budget():
+    changes = [
+        FileChange.from_text("README.md", "a\n" * 100, "b\n" * 100),
+        FileChange.from_text("big.py", "x = 1\n" * 400, "x = 2\n" * 400),
+        FileChange.from_text("small.py", "y = 1\n", "y = 2\n"),
+    ]
+    churn = {"README.md": (10, 10), "big.py": (400, 400), "small.py": (1, 1)}
+
+    selected, over_budget = prioritize(changes, churn, {}, "full", 3)
+    assert [p.change.path for p in selected] == ["big.py", "small.py", "README.md"]
+    assert over_budget == []
+
+    selected, over_budget = prioritize(
+        changes,
+        churn,
+        {},
+        "full",
+        3,
+        request_tokens=50,
+        max_tokens=300,
+    )
+    # big.py is the riskiest but does not fit, the smaller files after it still do
+    assert [p.change.path for p in selected] == ["small.py", "README.md"]
+    assert [p.change.path for p in over_budget] == ["big.py"]
+    assert sum(p.estimated_tokens for p in selected) <= 300
+
+
+def test_flag_history_is_counted_once_per_review(tmp_path):
+    cache = ReviewCache(tmp_path / "cache.sqlite")
+    reviews = {
+        "a.py": "Broken.\n\n- [major] line 2: Off by one",
+        "b.py": "Fine.\n\n- [minor] Rename x",
+        "c.py": "The changes look good.",
+    }
+
+    flagged = flagged_reviews(reviews)
+    assert list(flagged) == ["a.py"]
+
+    cache.record_flagged(flagged)
+    cache.record_flagged(flagged)
+    cache.record_flagged({"a.py": "Broken again.\n\n- [critical] Data loss"})
+    assert cache.flag_counts(["a.py", "b.py"]) == {"a.py": 2}
+
+
+def test_iter_reviews_skips_the_reviews_unfinished_at_the_deadline():
+    changes = [
+        FileChange.from_text(f"module_{i}.py", "x = 1\n", "x = 2\n") for i in range(3)
+    ]
+    release = threading.Event()
+
+    def fake_review(file_path, before, after):
+        if file_path != "module_0.py":
+            release.wait(5)
+        return "The changes look good."
+
+    assistant = Mock()
+    assistant.review_changes.side_effect = fake_review
+
+    results = list(iter_reviews(assistant, changes, workers=2, deadline=0.2))
+    release.set()
+
+    assert results == [
+        ("module_0.py", "The changes look good.", None),
+        ("module_1.py", None, DEADLINE_ERROR),
+        ("module_2.py", None, DEADLINE_ERROR),
+    ]
+    assistant.cancel.assert_called()
+
+
+def test_cli_deadline_bounds_the_wall_time_of_the_process(tmp_path):
+    repo = Repo.init(tmp_path)
+    names = [f"module_{i}.py" for i in range(4)]
+    for name in names:
+        (tmp_path / name).write_text("x = 1\n")
+    repo.index.add(names)
+    repo.index.commit("Initial commit")
+    for name in names:
+        (tmp_path / name).write_text("x = 2\n")
+    repo.index.add(names)
+    repo.index.commit("Change x")
+    env = {
+        **os.environ,
+        "AI_REVIEW_FAKE_LATENCY": "8",
+        "PYTHONPATH": str(Path(__file__).parents[1]),
+    }
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "ai_review_assistant.main",
+            "--vendor",
+            "fake",
+            "--api-key",
+            "unused",
+            "--no-cache",
+            "review",
+            "--workers",
+            "4",
+            "--deadline",
+            "1",
+        ],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    # The requests still running at the deadline do not hold the process until they return
+    assert time.perf_counter() - start < 6
+    assert result.returncode == 0, result.stderr
+    assert "Deadline of 1s reached, skipped the reviews of 4 files" in result.stdout
+
+
+def test_cli_max_tokens_reviews_the_riskiest_files_and_skips_the_rest(
+    tmp_path,
+    monkeypatch,
+):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0")
+    repo = Repo.init(tmp_path)
+    for name in ("payment.py", "helpers.py"):
+        (tmp_path / name).write_text("x = 1\n")
+    repo.index.add(["payment.py", "helpers.py"])
+    repo.index.commit("Initial commit")
+    (tmp_path / "payment.py").write_text("x = 2\n" * 50)
+    (tmp_path / "helpers.py").write_text("x = 2\n" * 50)
+    repo.index.add(["payment.py", "helpers.py"])
+    repo.index.commit("Change x")
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner(mix_stderr=False).invoke(
+        cli,
+        [
+            "--vendor",
+            "fake",
+            "--api-key",
+            "unused",
+            "--no-cache",
+            "review",
+            "--format",
+            "jsonl",
+            "--workers",
+            "2",
+            "--max-tokens",
+            "500",
+        ],
+    )
+
+    assert result.exit_code == 0, result.stderr
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(record["path"], record["status"]) for record in records] == [
+        ("helpers.py", "skipped"),
+        ("payment.py", "reviewed"),
+    ]
+    assert "over the --max-tokens budget" in records[0]["reason"]
@@ -0,0 +1,160 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from ai_review_assistant.ratelimit import (
+    RateLimiter,
+    is_retryable,
+    parse_duration,
+    retry_after,
+)
+from ai_review_assistant.review import CodeReviewAssistant
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, headers=None):
+        super().__init__("Rate limit reached")
+        self.response = Mock(headers=headers or {})
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_rate_limiter_paces_requests_and_tokens_over_the_minute():
+    clock = FakeClock()
+    limiter = make_limiter(clock, requests_per_minute=60, tokens_per_minute=6000)
+
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(1.0)
+    assert limiter.acquire() == pytest.approx(1.0)
+    assert clock.now == pytest.approx(2.0)
+
+    # A request larger than a second of budget overdraws it, and the next one waits
+    clock.now += 60
+    assert limiter.acquire(5000) == 0
+    assert limiter.acquire(3000) == pytest.approx(50.0)
+
+    # The vendor counted more tokens than estimated, which the next request waits for
+    limiter.record_usage(3000, 4000)
+    assert limiter.acquire(1000) == pytest.approx(40.0)
+
+
+def test_rate_limiter_follows_rate_limit_headers():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    assert not limiter.limits_tokens
+
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-limit-requests": "120",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-limit-tokens": "40000",
+            "x-ratelimit-remaining-tokens": "39000",
+        },
+    )
+
+    assert limiter.limits_tokens
+    assert limiter.acquire(100) == pytest.approx(0.5)
+
+
+def test_rate_limiter_pauses_all_requests_after_a_rate_limit():
+    clock = FakeClock()
+    limiter = make_limiter(clock, base_backoff=2.0)
+
+    assert limiter.backoff(0, RateLimitError({"retry-after": "7"})) == 7.0
+    assert limiter.acquire() == pytest.approx(7.0)
+
+    delay = limiter.backoff(3, RateLimitError())
+    assert 0 <= delay <= 16.0
+    assert limiter.acquire() == pytest.approx(delay)
+
+
+def test_retry_helpers():
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("2000-01-01T00:00:00Z") == 0.0
+    assert parse_duration("soon") is None
+    assert retry_after({"Retry-After-Ms": "250", "retry-after": "1"}) == 0.25
+    assert retry_after({}) is None
+
+    assert is_retryable(RateLimitError())
+    assert is_retryable(Mock(status_code=503))
+    assert not is_retryable(Mock(status_code=401))
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_get_review_retries_rate_limited_requests(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.side_effect = [
+        RateLimitError({"retry-after": "0"}),
+        RateLimitError({"retry-after": "0"}),
+        Mock(
+            content="Looks good",
+            response_metadata={"headers": {"x-ratelimit-limit-requests": "500"}},
+        ),
+    ]
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        requests_per_minute=1000,
+    )
+
+    assert assistant.get_review("prompt") == "Looks good"
+    assert assistant.stats.calls[0].retries == 2
+    assert MockChatOpenAI.call_args.kwargs["max_retries"] == 0
+    assert MockChatOpenAI.call_args.kwargs["include_response_headers"]
+
+    mock_llm.invoke.side_effect = [ValueError("bad prompt")]
+    with pytest.raises(ValueError, match="bad prompt"):
+        assistant.get_review("prompt")
+
+    assistant.max_retries = 1
+    assistant.rate_limiter.base_backoff = 0.0
+    mock_llm.invoke.side_effect = [RateLimitError(), RateLimitError()]
+    with pytest.raises(RateLimitError):
+        assistant.get_review("prompt")
+    assert mock_llm.invoke.call_count == 6
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_get_review_does_not_retry_a_partly_streamed_review(MockChatOpenAI):
+    def failing_stream(_):
+        yield Mock(content="Looks ")
+        raise RateLimitError()
+
+    mock_llm = Mock()
+    mock_llm.stream.side_effect = failing_stream
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+    )
+    tokens = []
+
+    with pytest.raises(RateLimitError):
+        assistant.get_review("prompt", tokens.append)
+    assert tokens == ["Looks "]
+    assert mock_llm.stream.call_count == 1
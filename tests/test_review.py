@@ -1,3 +1,6 @@
+import json
+import time
+
 import pytest
 from click.testing import CliRunner
 from git import Repo
@@ -5,10 +8,15 @@ from unittest.mock import Mock, patch
 
 from ai_review_assistant.main import (
     cli,
+    count_per_commit_changes,
     get_current_and_previous_commit,
     get_file_changes,
+    get_staged_changes,
     parse_languages,
+    review_files,
 )
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.hooks.pre_commit import install_pre_commit_hook
 from ai_review_assistant.review import CodeReviewAssistant
 
 
@@ -33,20 +41,28 @@ def test_get_current_and_previous_commit(mock_repo):
     assert previous.hexsha == "previous_commit_hash"
 
 
-def test_get_file_changes():
+@patch("ai_review_assistant.main.diff_commits")
+def test_get_file_changes(MockDiffCommits):
     mock_current_commit = Mock()
     mock_previous_commit = Mock()
     mock_diff = Mock()
+    mock_diff.change_type = "M"
     mock_diff.a_path = "test_file.py"
+    mock_diff.b_path = "test_file.py"
+    mock_diff.a_blob.size = 11
     mock_diff.a_blob.data_stream.read.return_value = b"old content"
+    mock_diff.b_blob.size = 11
     mock_diff.b_blob.data_stream.read.return_value = b"new content"
-    mock_previous_commit.diff.return_value.iter_change_type.return_value = [mock_diff]
+    MockDiffCommits.return_value = [mock_diff]
+
+    changes = list(get_file_changes(mock_current_commit, mock_previous_commit))
 
-    changes = get_file_changes(mock_current_commit, mock_previous_commit)
+    MockDiffCommits.assert_called_once_with(mock_previous_commit, mock_current_commit)
 
-    assert "test_file.py" in changes
-    assert changes["test_file.py"]["before"] == "old content"
-    assert changes["test_file.py"]["after"] == "new content"
+    assert [change.path for change in changes] == ["test_file.py"]
+    assert changes[0].skip_reason is None
+    assert changes[0].before == "old content"
+    assert changes[0].after == "new content"
 
 
 @patch("ai_review_assistant.main.Repo")
@@ -64,9 +80,9 @@ def test_cli_review_command(
     MockFindGitRoot.return_value = "/mock/git/root"
     MockRepo.return_value = mock_repo
     MockCodeReviewAssistant.return_value = mock_assistant
-    MockGetFileChanges.return_value = {
-        "test_file.py": {"before": "old", "after": "new"}
-    }
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("test_file.py", "old", "new")
+    ]
 
     runner = CliRunner()
     result = runner.invoke(
@@ -98,7 +114,7 @@ def test_cli_review_command_no_changes(
 ):
     MockRepo.return_value = mock_repo
     MockCodeReviewAssistant.return_value = mock_assistant
-    MockGetFileChanges.return_value = {}
+    MockGetFileChanges.return_value = []
 
     runner = CliRunner()
     result = runner.invoke(
@@ -158,6 +174,123 @@ def test_code_review_assistant_review_changes(MockChatOpenAI):
     mock_llm.invoke.assert_called_once()
 
 
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_code_review_assistant_review_added_and_renamed_files(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked AI review"
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path="/mock/repo/path",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        diff_mode="hunks",
+    )
+
+    assert assistant.review_changes("new.py", "", "x = 1\n") == "Mocked AI review"
+    prompt = mock_llm.invoke.call_args[0][0][-1].content
+    assert "This is a new file" in prompt
+    assert prompt.count("x = 1") == 1
+    assert "+x = 1" not in prompt
+
+    assistant.review_changes("new.py", "x = 1\n", "x = 2\n", old_path="old.py")
+    prompt = mock_llm.invoke.call_args[0][0][-1].content
+    assert "new.py (renamed from old.py)" in prompt
+    assert "--- a/old.py" in prompt
+    assert "+++ b/new.py" in prompt
+
+    mock_llm.invoke.reset_mock()
+    assert (
+        assistant.review_changes("new.py", "x = 1\n", "x = 1\n", old_path="old.py")
+        is None
+    )
+    mock_llm.invoke.assert_not_called()
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_code_review_assistant_batches_small_changes(MockChatOpenAI):
+    mock_llm = Mock()
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path="/mock/repo/path",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        diff_mode="hunks",
+    )
+    changes = [
+        FileChange.from_text("a.py", "a = 1\n", "a = 2\n"),
+        FileChange.from_text("settings.toml", "x = 1\n", "x = 2\n"),
+        FileChange.from_text(
+            "big.py", "", "".join(f"b{i} = {i}\n" for i in range(200))
+        ),
+        FileChange.from_text("b.py", "b = 1\n", "b = 2\n"),
+        FileChange.from_text("c.py", "", "c = 1\n"),
+    ]
+
+    batches = assistant.pack_changes(changes, max_tokens=200)
+
+    assert [[change.path for change in batch] for batch in batches] == [
+        ["settings.toml"],
+        ["big.py"],
+        ["a.py", "b.py", "c.py"],
+    ]
+
+    mock_llm.invoke.side_effect = [
+        Mock(
+            content="## === REVIEW: a.py ===\nLooks good.\n=== REVIEW: `b.py` ===\nFine."
+        ),
+        Mock(content="Single review of c.py"),
+    ]
+    reviews = assistant.review_changes_batch(batches[-1])
+
+    assert reviews == {
+        "a.py": "Looks good.",
+        "b.py": "Fine.",
+        "c.py": "Single review of c.py",
+    }
+    assert mock_llm.invoke.call_count == 2
+    batch_prompt = mock_llm.invoke.call_args_list[0][0][0][-1].content
+    for delimiter in ["=== FILE: a.py ===", "=== FILE: b.py ===", "=== FILE: c.py ==="]:
+        assert delimiter in batch_prompt
+    assert "New file:" in batch_prompt
+    assert "c.py" in mock_llm.invoke.call_args_list[1][0][0][-1].content
+    assert assistant.review_changes_batch(batches[0]) == {"settings.toml": None}
+
+
+def test_pack_changes_does_not_read_the_files():
+    assistant = CodeReviewAssistant(
+        repo_path="/mock/repo/path",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        diff_mode="full",
+    )
+
+    def unread():
+        raise AssertionError("pack_changes read a file")
+
+    changes = [
+        FileChange("a.py", unread, unread, size=200),
+        FileChange("b.py", unread, unread, size=200),
+        FileChange("c.py", unread, unread, change_type="A", size=800),
+        FileChange("big.py", unread, unread, size=800),
+    ]
+
+    batches = assistant.pack_changes(changes, max_tokens=300)
+
+    # Full mode sends both versions of a changed file but one of an added file
+    assert [[change.path for change in batch] for batch in batches] == [
+        ["a.py", "b.py"],
+        ["big.py"],
+        ["c.py"],
+    ]
+    assert assistant.split_batch_review("Looks good overall.") == {}
+
+
 def test_code_review_assistant_construct_prompt():
     assistant = CodeReviewAssistant(
         repo_path=".",
@@ -240,9 +373,9 @@ def test_code_review_assistant_unsupported_language():
 def test_cli_options(
     MockGetFileChanges, MockRepo, MockCodeReviewAssistant, vendor, model, temperature
 ):
-    MockGetFileChanges.return_value = {
-        "test_file.py": {"before": "old code", "after": "new code"}
-    }
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("test_file.py", "old code", "new code")
+    ]
     mock_assistant = Mock()
     mock_assistant.review_changes.return_value = "Mocked review"
     MockCodeReviewAssistant.return_value = mock_assistant
@@ -292,29 +425,23 @@ def test_code_review_assistant_count_tokens():
     assert token_count > 0
 
 
-@patch("ai_review_assistant.review.Path")
-def test_code_review_assistant_get_project_structure(MockPath):
-    mock_dir = Mock()
-    mock_dir.is_dir.return_value = True
-    mock_dir.name = "src"
-
-    mock_file = Mock()
-    mock_file.is_dir.return_value = False
-    mock_file.name = "README.md"
-
-    MockPath.return_value.iterdir.return_value = [mock_dir, mock_file]
+def test_code_review_assistant_get_project_structure(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("")
+    (tmp_path / "README.md").write_text("")
 
     assistant = CodeReviewAssistant(
-        repo_path=".",
+        repo_path=str(tmp_path),
         vendor_name="openai",
         model_name="gpt-3.5-turbo",
         api_key="test_key",
         program_language=["Python"],
         result_output_language="English",
     )
-    structure = assistant.get_project_structure(".", 1)
+    structure = assistant.get_project_structure(str(tmp_path), 1)
     assert "[DIR] src" in structure
     assert "[FILE] README.md" in structure
+    assert "main.py" not in structure
 
 
 @patch("ai_review_assistant.review.ChatOpenAI")
@@ -351,7 +478,7 @@ def test_code_review_assistant_anthropic(MockGetEncoding, MockChatAnthropic):
     MockChatAnthropic.return_value = mock_llm
 
     mock_tokenizer = Mock()
-    mock_tokenizer.encode.return_value = [
+    mock_tokenizer.encode_ordinary.return_value = [
         1,
         2,
         3,
@@ -374,7 +501,7 @@ def test_code_review_assistant_anthropic(MockGetEncoding, MockChatAnthropic):
 
     token_count = assistant.count_tokens("test text")
     assert token_count == 5
-    mock_tokenizer.encode.assert_called_once_with("test text")
+    mock_tokenizer.encode_ordinary.assert_called_once_with("test text")
 
     result = assistant.review_changes("test_file.py", "old code", "new code")
     assert result == "Mocked Anthropic AI review"
@@ -413,9 +540,9 @@ def test_cli_review_command_multiple_languages(
     MockFindGitRoot, MockGetFileChanges, MockCodeReviewAssistant, MockRepo
 ):
     MockFindGitRoot.return_value = "/mock/git/root"
-    MockGetFileChanges.return_value = {
-        "test_file.py": {"before": "old", "after": "new"}
-    }
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("test_file.py", "old", "new")
+    ]
 
     runner = CliRunner()
     result = runner.invoke(
@@ -442,6 +569,15 @@ def test_cli_review_command_multiple_languages(
         program_language=["Python", "JavaScript"],
         result_output_language="English",
         ignore_settings_files=True,
+        cache=None,
+        diff_mode="hunks",
+        context_lines=3,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=5,
+        review_state=None,
+        structured=False,
+        symbol_context_tokens=0,
     )
 
 
@@ -522,10 +658,10 @@ def test_cli_review_command_ignore_settings_files(
     MockRepo,
 ):
     MockFindGitRoot.return_value = "/mock/git/root"
-    MockGetFileChanges.return_value = {
-        "config.toml": {"before": "old config", "after": "new config"},
-        "main.py": {"before": "old code", "after": "new code"},
-    }
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("config.toml", "old config", "new config"),
+        FileChange.from_text("main.py", "old code", "new code"),
+    ]
 
     mock_assistant = Mock()
     mock_assistant.review_changes.side_effect = [None, "Mocked review for main.py"]
@@ -561,6 +697,15 @@ def test_cli_review_command_ignore_settings_files(
         program_language=["Python"],
         result_output_language="English",
         ignore_settings_files=True,
+        cache=None,
+        diff_mode="hunks",
+        context_lines=3,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=5,
+        review_state=None,
+        structured=False,
+        symbol_context_tokens=0,
     )
 
 
@@ -575,10 +720,10 @@ def test_cli_review_command_review_all_files(
     MockRepo,
 ):
     MockFindGitRoot.return_value = "/mock/git/root"
-    MockGetFileChanges.return_value = {
-        "config.toml": {"before": "old config", "after": "new config"},
-        "main.py": {"before": "old code", "after": "new code"},
-    }
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("config.toml", "old config", "new config"),
+        FileChange.from_text("main.py", "old code", "new code"),
+    ]
 
     mock_assistant = Mock()
     mock_assistant.review_changes.side_effect = [
@@ -618,4 +763,496 @@ def test_cli_review_command_review_all_files(
         program_language=["Python"],
         result_output_language="English",
         ignore_settings_files=False,
+        cache=None,
+        diff_mode="hunks",
+        context_lines=3,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=5,
+        review_state=None,
+        structured=False,
+        symbol_context_tokens=0,
+    )
+
+
+def test_review_files_keeps_order_and_isolates_errors():
+    def fake_review(file_path, before, after):
+        if file_path == "broken.py":
+            raise RuntimeError("LLM unavailable")
+        if file_path == "ignored.toml":
+            return None
+        time.sleep(0.05 if file_path == "a.py" else 0)
+        return f"review of {file_path}"
+
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = fake_review
+    changes = [
+        FileChange.from_text(path, "old", "new")
+        for path in ["a.py", "broken.py", "ignored.toml", "b.py"]
+    ]
+
+    reviews, errors = review_files(mock_assistant, changes, workers=4)
+
+    assert list(reviews) == ["a.py", "b.py"]
+    assert reviews["a.py"] == "review of a.py"
+    assert errors == {"broken.py": "RuntimeError: LLM unavailable"}
+    assert mock_assistant.review_changes.call_count == 4
+
+
+def test_review_files_sends_packed_batches():
+    changes = [
+        FileChange.from_text(path, "old", "new")
+        for path in ["a.py", "b.py", "c.py", "d.py"]
+    ]
+    mock_assistant = Mock()
+    mock_assistant.pack_changes.return_value = [changes[:2], [changes[2]], [changes[3]]]
+    mock_assistant.review_changes_batch.side_effect = lambda group: {
+        change.path: f"batched review of {change.path}" for change in group
+    }
+    mock_assistant.review_changes.side_effect = lambda path, *_: (
+        1 / 0 if path == "d.py" else f"review of {path}"
+    )
+
+    reviews, errors = review_files(mock_assistant, changes, workers=2, batch_tokens=500)
+
+    mock_assistant.pack_changes.assert_called_once_with(changes, 500)
+    assert reviews == {
+        "a.py": "batched review of a.py",
+        "b.py": "batched review of b.py",
+        "c.py": "review of c.py",
+    }
+    assert list(errors) == ["d.py"]
+
+    mock_assistant.review_changes_batch.side_effect = RuntimeError("LLM unavailable")
+    reviews, errors = review_files(mock_assistant, changes, batch_tokens=500)
+    assert errors["a.py"] == errors["b.py"] == "RuntimeError: LLM unavailable"
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_workers_reports_failures(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("main.py", "old code", "new code"),
+        FileChange.from_text("utils.py", "old code", "new code"),
+    ]
+
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = lambda path, *_: (
+        "Mocked review for main.py" if path == "main.py" else 1 / 0
+    )
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--workers", "2"])
+
+    assert result.exit_code == 1
+    assert "Mocked review for main.py" in result.output
+    assert "Review failed:" in result.output
+    assert "utils.py" in result.output
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_streams_in_completion_order(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("slow.py", "old code", "new code"),
+        FileChange.from_text("fast.py", "old code", "new code"),
+    ]
+
+    def fake_review(file_path, before, after):
+        time.sleep(0.2 if file_path == "slow.py" else 0)
+        return f"Review of {file_path}"
+
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = fake_review
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--workers", "2"])
+
+    assert result.exit_code == 0
+    assert result.output.index("Review of fast.py") < result.output.index(
+        "Review of slow.py",
+    )
+    assert "First feedback after" in result.output
+
+    result = runner.invoke(
+        cli,
+        ["--api-key", "test_key", "review", "--workers", "2", "--no-stream"],
+    )
+    assert result.exit_code == 0
+    assert result.output.index("Review of slow.py") < result.output.index(
+        "Review of fast.py",
+    )
+    assert "First feedback after" not in result.output
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_stream_tokens(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("main.py", "old code", "new code"),
+    ]
+
+    def fake_review(file_path, before, after, on_token):
+        for piece in ["Looks ", "good"]:
+            on_token(piece)
+        return "Looks good"
+
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = fake_review
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--stream-tokens"])
+
+    assert result.exit_code == 0
+    assert "Looks good" in result.output
+
+    result = runner.invoke(
+        cli,
+        ["--api-key", "test_key", "review", "--stream-tokens", "--workers", "2"],
+    )
+    assert result.exit_code == 2
+    assert "--stream-tokens" in result.output
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_format_jsonl(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("main.py", "old code", "new code"),
+        FileChange.from_text("utils.py", "old code", "new code"),
+        FileChange(
+            "image.png",
+            read_before=bytes,
+            read_after=bytes,
+            skip_reason="binary file",
+        ),
+    ]
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = lambda path, *_: (
+        "Mocked review for main.py" if path == "main.py" else 1 / 0
+    )
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    runner = CliRunner(mix_stderr=False)
+    for stream in ("--stream", "--no-stream"):
+        result = runner.invoke(
+            cli,
+            ["--api-key", "test_key", "review", "--format", "jsonl", stream],
+        )
+
+        assert result.exit_code == 1
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        assert {(record["path"], record["status"]) for record in records} == {
+            ("image.png", "skipped"),
+            ("main.py", "reviewed"),
+            ("utils.py", "failed"),
+        }
+        assert "Reviewing changes" in result.stderr
+
+    result = runner.invoke(
+        cli,
+        ["--api-key", "test_key", "review", "--format", "sarif", "--stream-tokens"],
+    )
+    assert result.exit_code == 2
+    assert result.stdout == ""
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_machine_formats_keep_the_order_of_the_changes(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    paths = ["a.py", "b.py", "c.py"]
+    MockGetFileChanges.return_value = [
+        FileChange.from_text(path, "old code", "new code") for path in paths
+    ]
+    finished = []
+
+    def review_changes(path, *_):
+        # The first file finishes last
+        if path == "a.py":
+            deadline = time.monotonic() + 5
+            while len(finished) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finished.append(path)
+        return f"Review of {path}"
+
+    mock_assistant = Mock()
+    mock_assistant.review_changes.side_effect = review_changes
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    result = CliRunner(mix_stderr=False).invoke(
+        cli,
+        ["--api-key", "test_key", "review", "--format", "jsonl", "--workers", "3"],
+    )
+
+    assert result.exit_code == 0, result.stderr
+    assert finished[-1] == "a.py"
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record["path"] for record in records] == paths
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_code_review_assistant_get_review_streams_tokens(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.stream.return_value = [
+        Mock(content="Looks "),
+        Mock(content=[{"type": "text", "text": "good"}]),
+        Mock(content=""),
+    ]
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path="/mock/repo/path",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        code_depth=2,
+        program_language=["Python"],
+    )
+    tokens = []
+
+    assert assistant.get_review("prompt", tokens.append) == "Looks good"
+    assert tokens == ["Looks ", "good"]
+    mock_llm.invoke.assert_not_called()
+
+
+def test_get_staged_changes(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "main.py").write_text("old content\n")
+    (tmp_path / "utils.py").write_text("utils\n")
+    repo.index.add(["main.py", "utils.py"])
+    repo.index.commit("initial")
+
+    (tmp_path / "main.py").write_text("staged content\n")
+    repo.index.add(["main.py"])
+    (tmp_path / "main.py").write_text("unstaged content\n")
+    (tmp_path / "utils.py").write_text("unstaged utils\n")
+
+    changes = list(get_staged_changes(repo))
+
+    assert [(c.path, c.before, c.after) for c in changes] == [
+        ("main.py", "old content\n", "staged content\n"),
+    ]
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.get_staged_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_staged(
+    MockFindGitRoot,
+    MockGetStagedChanges,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+    mock_assistant,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockCodeReviewAssistant.return_value = mock_assistant
+    MockGetStagedChanges.return_value = [
+        FileChange.from_text("main.py", "old", "new"),
+    ]
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--staged"])
+
+    assert result.exit_code == 0
+    assert "Mocked review result" in result.output
+    MockGetStagedChanges.assert_called_once_with(
+        MockRepo.return_value,
+        1024 * 1024,
+        mock_assistant.path_filter.return_value,
     )
+    MockGetFileChanges.assert_not_called()
+
+    MockGetStagedChanges.return_value = []
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--staged"])
+    assert result.exit_code == 0
+    assert "No staged changes to review." in result.output
+
+
+def test_cli_review_staged_before_the_first_commit(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0")
+    repo = Repo.init(tmp_path)
+    (tmp_path / "a.py").write_text("x = 1\n")
+    repo.index.add(["a.py"])
+    monkeypatch.chdir(tmp_path)
+
+    assert [(c.path, c.before, c.after) for c in get_staged_changes(repo)] == [
+        ("a.py", "", "x = 1\n"),
+    ]
+    result = CliRunner().invoke(
+        cli,
+        ["--vendor", "fake", "--api-key", "unused", "--no-cache", "review", "--staged"],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "## a.py" in result.output
+
+
+def make_branch(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "a.py").write_text("a = 0\n")
+    (tmp_path / "b.py").write_text("b = 0\n")
+    repo.index.add(["a.py", "b.py"])
+    base = repo.index.commit("base")
+    for index in range(1, 4):
+        (tmp_path / "a.py").write_text(f"a = {index}\n")
+        paths = ["a.py"]
+        if index == 2:
+            (tmp_path / "b.py").write_text("b = 1\n")
+            paths.append("b.py")
+        repo.index.add(paths)
+        repo.index.commit(f"change {index}")
+    return repo, base
+
+
+def test_get_commit_range_changes(tmp_path):
+    repo, base = make_branch(tmp_path)
+
+    current, previous = get_current_and_previous_commit(repo, base.hexsha)
+    assert current == repo.head.commit
+    assert previous == base
+    changes = get_file_changes(current, previous)
+    assert [(c.path, c.before, c.after) for c in changes] == [
+        ("a.py", "a = 0\n", "a = 3\n"),
+        ("b.py", "b = 0\n", "b = 1\n"),
+    ]
+    assert count_per_commit_changes(repo, current, previous) == (3, 4)
+
+    current, previous = get_current_and_previous_commit(repo, head="HEAD~1")
+    assert current == repo.head.commit.parents[0]
+    assert previous == current.parents[0]
+
+
+def test_cli_range_savings_count_only_reviewable_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_REVIEW_FAKE_LATENCY", "0")
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    names = ["a.py", "b.py", "c.py", "d.py", "old.py"]
+    for name in names:
+        (tmp_path / name).write_text("x = 0\n")
+    repo.index.add(names)
+    base = repo.index.commit("base")
+    for name in names[:4]:
+        (tmp_path / name).write_text("x = 1\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\x00\x00")
+    repo.index.add([*names[:4], "logo.png"])
+    repo.index.remove(["old.py"], working_tree=True)
+    repo.index.commit("change 1")
+    for name in names[:3]:
+        (tmp_path / name).write_text("x = 2\n")
+    (tmp_path / "NOTES.md").write_text("notes\n")
+    repo.index.add([*names[:3], "NOTES.md"])
+    repo.index.commit("change 2")
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--vendor",
+            "fake",
+            "--api-key",
+            "unused",
+            "--no-cache",
+            "review",
+            "--base",
+            base.hexsha,
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert (
+        "Reviewed 4 files changed across 2 commits once each instead of 7 "
+        "per-commit file reviews, saving 3 LLM calls"
+    ) in " ".join(result.output.split())
+
+
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+def test_cli_review_command_base_reviews_each_file_once(
+    MockCodeReviewAssistant,
+    mock_assistant,
+    tmp_path,
+    monkeypatch,
+):
+    repo, base = make_branch(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    MockCodeReviewAssistant.return_value = mock_assistant
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        ["--api-key", "test_key", "--no-cache", "review", "--base", base.hexsha],
+    )
+
+    assert result.exit_code == 0
+    assert mock_assistant.review_changes.call_count == 2
+    assert "saving 2 LLM calls" in result.output
+
+    result = runner.invoke(cli, ["--api-key", "test_key", "review", "--base", "nope"])
+    assert result.exit_code == 2
+    result = runner.invoke(
+        cli,
+        ["--api-key", "test_key", "review", "--staged", "--head", "HEAD"],
+    )
+    assert result.exit_code == 2
+
+
+def test_install_pre_commit_hook_reviews_staged_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(SystemExit):
+        install_pre_commit_hook()
+
+    hook_script = (tmp_path / ".git" / "hooks" / "pre-commit").read_text()
+    assert "ai_review_assistant review --staged" in hook_script
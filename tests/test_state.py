@@ -0,0 +1,182 @@
+import time
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.cache import ReviewCache, git_blob_sha
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.state import ReviewState
+
+
+def make_assistant(state, **kwargs):
+    return CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+        review_state=state,
+        **kwargs,
+    )
+
+
+def make_source(*changed_lines):
+    lines = [f"def f{i}():\n    return {i}\n" for i in range(200)]
+    for i in changed_lines:
+        lines[i] = f"def f{i}():\n    return -1\n"
+    return "".join(lines)
+
+
+def test_review_state_records_the_last_reviewed_revision(tmp_path):
+    state = ReviewState(tmp_path / "state.sqlite3")
+
+    assert state.get("main.py", "settings") is None
+    state.set("main.py", "settings", "old code", "First review")
+    state.set("main.py", "settings", "new code", "Second review")
+
+    reviewed = state.get("main.py", "settings")
+    assert reviewed.blob == git_blob_sha("new code")
+    assert reviewed.content == "new code"
+    assert reviewed.review == "Second review"
+    assert state.get("main.py", "other settings") is None
+    assert (state.hits, state.misses) == (1, 2)
+
+
+def test_review_state_evicts_old_and_excess_entries(tmp_path):
+    path = tmp_path / "state.sqlite3"
+    state = ReviewState(path)
+    state.set("old.py", "settings", "code", "old review")
+    state.set("first.py", "settings", "code", "first review")
+    state.set("second.py", "settings", "code", "second review")
+    state._connection.execute(
+        "UPDATE reviewed_files SET reviewed_at = ? WHERE path = 'old.py'",
+        (time.time() - 10 * 86400,),
+    )
+    state._connection.commit()
+    state.close()
+
+    reopened = ReviewState(path, max_entries=1, max_age_days=5)
+    assert reopened.get("old.py", "settings") is None
+    assert reopened.get("first.py", "settings") is None
+    assert reopened.get("second.py", "settings").review == "second review"
+
+
+def test_review_state_for_repo_requires_git_dir(tmp_path):
+    assert ReviewState.for_repo(tmp_path) is None
+    (tmp_path / ".git").mkdir()
+    assert (
+        ReviewState.for_repo(tmp_path).path
+        == tmp_path / ".git" / "ai_review_state.sqlite3"
+    )
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_sends_only_edits_since_the_reviewed_revision(
+    MockChatOpenAI,
+    tmp_path,
+):
+    mock_llm = Mock()
+    mock_llm.invoke.side_effect = [
+        Mock(content="f5 returns a constant"),
+        Mock(content="The fix-up resolves nothing"),
+    ]
+    MockChatOpenAI.return_value = mock_llm
+    assistant = make_assistant(
+        ReviewState(tmp_path / "state.sqlite3"),
+        diff_mode="full",
+    )
+    reviewed = make_source(5)
+    fixed_up = make_source(5, 150)
+
+    assert assistant.review_changes("main.py", make_source(), reviewed) == (
+        "f5 returns a constant"
+    )
+    review = assistant.review_changes("main.py", make_source(), fixed_up)
+
+    assert review.startswith("The fix-up resolves nothing\n\n")
+    assert "revision" in review
+    assert review.endswith("f5 returns a constant")
+    prompt = mock_llm.invoke.call_args_list[1][0][0][-1].content
+    assert "f5 returns a constant" in prompt
+    assert "-    return 150" in prompt
+    assert "-    return 5" not in prompt
+    assert "def f100()" not in prompt
+
+    # The revision reviewed last is not sent again
+    assert assistant.review_changes("main.py", reviewed, fixed_up) == review
+    assert mock_llm.invoke.call_count == 2
+
+
+def test_state_fingerprint_does_not_depend_on_the_project_structure(tmp_path):
+    (tmp_path / "src").mkdir()
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="fake",
+        model_name="fake",
+        api_key="",
+        code_depth=2,
+    )
+    fingerprint = assistant._state_fingerprint()
+
+    (tmp_path / "src" / "new_module.py").write_text("")
+    assistant.start_run()
+
+    assert "new_module.py" in assistant.construct_system_prompt()
+    assert assistant._state_fingerprint() == fingerprint
+    assistant.code_depth = 1
+    assert assistant._state_fingerprint() != fingerprint
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_batch_reviews_files_reviewed_before_on_their_own(
+    MockChatOpenAI,
+    tmp_path,
+):
+    mock_llm = Mock()
+    mock_llm.invoke.side_effect = [
+        Mock(content="=== REVIEW: a.py ===\nA\n=== REVIEW: b.py ===\nB"),
+        Mock(content="A2"),
+        Mock(content="Only c.py changed"),
+    ]
+    MockChatOpenAI.return_value = mock_llm
+    assistant = make_assistant(ReviewState(tmp_path / "state.sqlite3"))
+
+    assert assistant.review_changes_batch(
+        [
+            FileChange.from_text("a.py", "a = 1\n", "a = 2\n"),
+            FileChange.from_text("b.py", "b = 1\n", "b = 2\n"),
+        ],
+    ) == {"a.py": "A", "b.py": "B"}
+    reviews = assistant.review_changes_batch(
+        [
+            FileChange.from_text("a.py", "a = 1\n", "a = 3\n"),
+            FileChange.from_text("c.py", "c = 1\n", "c = 2\n"),
+        ],
+    )
+
+    assert reviews["c.py"] == "Only c.py changed"
+    assert reviews["a.py"].startswith("A2")
+    assert reviews["a.py"].endswith("\nA")
+    incremental_prompt = mock_llm.invoke.call_args_list[1][0][0][-1].content
+    assert "-a = 2" in incremental_prompt
+    assert "+a = 3" in incremental_prompt
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_review_changes_batch_remembers_cached_reviews(MockChatOpenAI, tmp_path):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Cached review"
+    MockChatOpenAI.return_value = mock_llm
+    cache = ReviewCache(tmp_path / "cache.sqlite3")
+    make_assistant(None, cache=cache).review_changes("main.py", "a = 1\n", "a = 2\n")
+
+    state = ReviewState(tmp_path / "state.sqlite3")
+    assistant = make_assistant(state, cache=cache)
+    reviews = assistant.review_changes_batch(
+        [FileChange.from_text("main.py", "a = 1\n", "a = 2\n")],
+    )
+
+    assert reviews == {"main.py": "Cached review"}
+    mock_llm.invoke.assert_called_once()
+    reviewed = state.get("main.py", assistant._state_fingerprint())
+    assert reviewed.content == "a = 2\n"
+    assert reviewed.review == "Cached review"
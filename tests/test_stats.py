@@ -0,0 +1,186 @@
+import json
+import time
+from unittest.mock import Mock, patch
+
+from click.testing import CliRunner
+
+from ai_review_assistant.changes import FileChange
+from ai_review_assistant.main import cli
+from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.stats import CallStats, ReviewStats, percentile
+from ai_review_assistant.usage import message_token_usage
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(1, 21)]
+
+    assert percentile(values, 0.5) == 10.0
+    assert percentile(values, 0.95) == 19.0
+    assert percentile([3.0], 0.95) == 3.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_message_token_usage_reads_usage_metadata():
+    openai_message = Mock(
+        usage_metadata={"input_tokens": 1200, "output_tokens": 80},
+        response_metadata={
+            "token_usage": {
+                "prompt_tokens": 1200,
+                "prompt_tokens_details": {"cached_tokens": 1024},
+            },
+        },
+    )
+    anthropic_message = Mock(
+        usage_metadata={"input_tokens": 50, "output_tokens": 90},
+        response_metadata={
+            "usage": {"input_tokens": 50, "cache_read_input_tokens": 1000},
+        },
+    )
+
+    assert message_token_usage(openai_message) == (1200, 80, 1024)
+    assert message_token_usage(anthropic_message) == (1050, 90, 1000)
+    assert message_token_usage(Mock(usage_metadata=None)) == (0, 0, 0)
+
+
+def test_review_stats_attributes_calls_to_files(tmp_path):
+    stats = ReviewStats()
+    with stats.track_file("a.py"):
+        with stats.time_tokenize():
+            pass
+        stats.add_call(CallStats(llm_seconds=0.5, input_tokens=100, output_tokens=10))
+        with stats.track_file("nested.py"):
+            stats.add_call(CallStats(llm_seconds=1.5, input_tokens=50))
+    stats.add_call(CallStats(llm_seconds=0.1))
+
+    (file_stats,) = stats.files
+    assert file_stats.file_path == "a.py"
+    assert file_stats.calls == 2
+    assert file_stats.llm_seconds == 2.0
+    assert file_stats.input_tokens == 150
+    assert [call.file_path for call in stats.calls] == ["a.py", "a.py", ""]
+
+    summary = stats.summary()
+    assert summary["calls"] == 3
+    assert summary["output_tokens"] == 10
+    assert summary["call_p50_seconds"] == 0.5
+    assert summary["call_p95_seconds"] == 1.5
+
+    stats_file = tmp_path / "stats.jsonl"
+    stats.write_jsonl(stats_file)
+    records = [json.loads(line) for line in stats_file.read_text().splitlines()]
+    assert [record["type"] for record in records] == [
+        "call",
+        "call",
+        "call",
+        "file",
+        "run",
+    ]
+    assert records[-1]["files"] == 1
+
+
+@patch("ai_review_assistant.review.ChatOpenAI")
+def test_code_review_assistant_records_stats(MockChatOpenAI):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value = Mock(
+        content="Looks good",
+        usage_metadata={"input_tokens": 300, "output_tokens": 20},
+        response_metadata={},
+    )
+    MockChatOpenAI.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="openai",
+        model_name="gpt-3.5-turbo",
+        api_key="test_key",
+        program_language=["Python"],
+    )
+
+    assistant.review_changes("a.py", "a = 1\n", "a = 2\n")
+    assistant.review_changes_batch(
+        [
+            FileChange.from_text("b.py", "b = 1\n", "b = 2\n"),
+            FileChange.from_text("c.py", "c = 1\n", "c = 2\n"),
+        ],
+    )
+
+    assert [file_stats.file_path for file_stats in assistant.stats.files] == [
+        "a.py",
+        "b.py, c.py",
+    ]
+    first = assistant.stats.files[0]
+    assert first.calls == 1
+    assert first.input_tokens == 300
+    assert first.output_tokens == 20
+    assert first.tokenize_seconds > 0
+    assert first.total_seconds >= first.llm_seconds + first.tokenize_seconds
+
+
+def test_llm_seconds_leave_out_creating_the_chat_model():
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="fake",
+        model_name="fake",
+        api_key="unused",
+        program_language=["Python"],
+    )
+    mock_llm = Mock()
+    mock_llm.invoke.return_value = Mock(content="Looks good", response_metadata={})
+
+    def slow_initialize_llm():
+        time.sleep(0.3)
+        return mock_llm
+
+    assistant._initialize_llm = slow_initialize_llm
+
+    assistant.review_changes("a.py", "a = 1\n", "a = 2\n")
+
+    assert assistant.stats.calls[0].llm_seconds < 0.3
+    assert assistant.stats.files[0].total_seconds >= 0.3
+
+
+@patch("ai_review_assistant.main.Repo")
+@patch("ai_review_assistant.main.CodeReviewAssistant")
+@patch("ai_review_assistant.main.get_file_changes")
+@patch("ai_review_assistant.main.find_git_root")
+def test_cli_review_command_stats(
+    MockFindGitRoot,
+    MockGetFileChanges,
+    MockCodeReviewAssistant,
+    MockRepo,
+    tmp_path,
+):
+    MockFindGitRoot.return_value = "/mock/git/root"
+    MockGetFileChanges.return_value = [
+        FileChange.from_text("main.py", "old code", "new code"),
+    ]
+    stats = ReviewStats()
+
+    def fake_review(file_path, before, after):
+        with stats.track_file(file_path):
+            stats.add_call(CallStats(llm_seconds=0.25, input_tokens=400))
+        return "Looks good"
+
+    mock_assistant = Mock(stats=stats)
+    mock_assistant.review_changes.side_effect = fake_review
+    MockCodeReviewAssistant.return_value = mock_assistant
+    stats_file = tmp_path / "stats.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "--api-key",
+            "test_key",
+            "review",
+            "--stats",
+            "--stats-file",
+            str(stats_file),
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert "Review stats" in result.output
+    assert "p95 0.25s" in result.output
+    run = json.loads(stats_file.read_text().splitlines()[-1])
+    assert run["type"] == "run"
+    assert run["input_tokens"] == 400
@@ -0,0 +1,81 @@
+from git import Repo
+
+from ai_review_assistant.structure import scan_project_structure
+
+
+def make_tree(root):
+    for directory in ["src/app", "node_modules/left-pad", ".venv/lib", "docs"]:
+        (root / directory).mkdir(parents=True)
+    for file_path in [
+        "src/app/views.py",
+        "src/app/models.py",
+        "src/__init__.py",
+        "node_modules/left-pad/index.js",
+        ".venv/lib/site.py",
+        "docs/index.md",
+        "setup.py",
+        "debug.log",
+    ]:
+        (root / file_path).write_text("")
+
+
+def test_scan_project_structure_outside_git_is_sorted_and_filtered(tmp_path):
+    make_tree(tmp_path)
+
+    structure = scan_project_structure(str(tmp_path), 2)
+
+    assert structure.splitlines() == [
+        "[DIR] docs",
+        "  [FILE] index.md",
+        "[DIR] src",
+        "  [DIR] app",
+        "  [FILE] __init__.py",
+        "[FILE] debug.log",
+        "[FILE] setup.py",
+    ]
+    assert scan_project_structure(str(tmp_path), 0) == ""
+
+
+def test_scan_project_structure_lists_tracked_files_only(tmp_path):
+    make_tree(tmp_path)
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    repo = Repo.init(tmp_path)
+    repo.index.add(
+        [
+            ".gitignore",
+            "setup.py",
+            "src/__init__.py",
+            "src/app/views.py",
+            "docs/index.md",
+        ],
+    )
+
+    structure = scan_project_structure(str(tmp_path), 3)
+
+    assert "node_modules" not in structure
+    assert ".venv" not in structure
+    assert "debug.log" not in structure
+    assert "models.py" not in structure
+    assert "    [FILE] views.py" in structure.splitlines()
+    assert scan_project_structure(str(tmp_path / "src"), 1).splitlines() == [
+        "[DIR] app",
+        "[FILE] __init__.py",
+    ]
+
+
+def test_scan_project_structure_caps_entries_and_tokens(tmp_path):
+    for index in range(50):
+        (tmp_path / f"file_{index:02d}.py").write_text("")
+
+    structure = scan_project_structure(str(tmp_path), 1, max_entries=10)
+    assert structure.splitlines()[:2] == ["[FILE] file_00.py", "[FILE] file_01.py"]
+    assert len(structure.splitlines()) == 11
+    assert structure.endswith("... (40 more entries omitted)")
+
+    structure = scan_project_structure(
+        str(tmp_path),
+        1,
+        max_tokens=20,
+        count_tokens=lambda text: 4,
+    )
+    assert structure.endswith("... (46 more entries omitted)")
@@ -0,0 +1,186 @@
+import time
+from unittest.mock import Mock
+
+from git import Repo
+
+from ai_review_assistant.review import CodeReviewAssistant
+from ai_review_assistant.symbols import (
+    SymbolIndex,
+    changed_lines,
+    parse_python_symbols,
+)
+
+BILLING = """\
+import decimal
+
+
+def apply_discount(amount, rate):
+    return amount * (1 - rate)
+
+
+class Invoice:
+    def total(self, items):
+        return sum(item.price for item in items)
+"""
+
+CHECKOUT = """\
+from billing import Invoice, apply_discount
+
+
+def checkout(cart, rate):
+    invoice = Invoice()
+    total = invoice.total(cart.items)
+    return apply_discount(total, rate)
+"""
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_repo(path):
+    repo = Repo.init(path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (path / "billing.py").write_text(BILLING)
+    (path / "checkout.py").write_text(CHECKOUT)
+    repo.index.add(["billing.py", "checkout.py"])
+    repo.index.commit("Initial commit")
+    return repo
+
+
+def test_parse_python_symbols_finds_definitions_and_calls():
+    definitions, references = parse_python_symbols("billing.py", BILLING)
+
+    assert [(d.qualname, d.line_start, d.line_end) for d in definitions] == [
+        ("apply_discount", 4, 5),
+        ("Invoice", 8, 10),
+        ("Invoice.total", 9, 10),
+    ]
+    assert [(r.name, r.line, r.caller) for r in references] == [
+        ("sum", 10, "Invoice.total"),
+    ]
+    assert parse_python_symbols("broken.py", "def broken(:\n") == ([], [])
+
+
+def test_changed_lines_marks_edited_and_deleted_lines():
+    assert changed_lines("a\nb\nc\n", "a\nB\nc\n") == {2}
+    assert changed_lines("a\nb\nc\n", "a\nc\n") == {2}
+    assert changed_lines("", "a\nb\n") == {1, 2}
+
+
+def test_related_code_adds_callees_of_the_changed_lines(tmp_path):
+    make_repo(tmp_path)
+    index = SymbolIndex.for_repo(tmp_path)
+    after = CHECKOUT.replace(
+        "apply_discount(total, rate)", "apply_discount(total, -rate)"
+    )
+
+    related = index.related_code("checkout.py", CHECKOUT, after, 1000, count_words)
+
+    assert "billing.py lines 4-5, definition of apply_discount" in related
+    assert "return amount * (1 - rate)" in related
+    # Only the names called on changed lines are looked up
+    assert "Invoice.total" not in related
+
+
+def test_related_code_adds_callers_of_the_changed_definitions(tmp_path):
+    make_repo(tmp_path)
+    index = SymbolIndex.for_repo(tmp_path)
+    after = BILLING.replace("(1 - rate)", "(1 - min(rate, 1))")
+
+    related = index.related_code("billing.py", BILLING, after, 1000, count_words)
+
+    assert (
+        "checkout.py lines 4-7, calls the changed apply_discount in checkout" in related
+    )
+    assert "return apply_discount(total, rate)" in related
+
+
+def test_related_code_stays_within_the_token_budget(tmp_path):
+    make_repo(tmp_path)
+    index = SymbolIndex.for_repo(tmp_path)
+    after = BILLING.replace("(1 - rate)", "(1 - min(rate, 1))")
+
+    assert index.related_code("billing.py", BILLING, after, 5, count_words) == ""
+    assert index.related_code("notes.txt", "a\n", "b\n", 1000, count_words) == ""
+
+
+def test_index_reuses_parsed_blobs_and_updates_changed_files(tmp_path):
+    repo = make_repo(tmp_path)
+    index = SymbolIndex.for_repo(tmp_path)
+    index.refresh()
+    assert index.parsed_blobs == 2
+    index.close()
+
+    # A new index of the same repository reads the parsed blobs from disk
+    index = SymbolIndex.for_repo(tmp_path)
+    assert [d.path for d in index.definitions("apply_discount")] == ["billing.py"]
+    assert index.parsed_blobs == 0
+
+    (tmp_path / "shipping.py").write_text("def ship(order):\n    return order\n")
+    (tmp_path / "billing.py").rename(tmp_path / "payments.py")
+    repo.index.remove(["billing.py"])
+    repo.index.add(["shipping.py", "payments.py"])
+    repo.index.commit("Add shipping and move billing")
+
+    index.invalidate()
+    assert [d.path for d in index.definitions("apply_discount")] == ["payments.py"]
+    assert [d.path for d in index.definitions("ship")] == ["shipping.py"]
+    # Only the new file is parsed, the moved one has a known blob
+    assert index.parsed_blobs == 1
+    index.close()
+
+
+def test_review_changes_sends_related_code_with_the_file(tmp_path):
+    make_repo(tmp_path)
+    assistant = CodeReviewAssistant(
+        repo_path=str(tmp_path),
+        vendor_name="fake",
+        model_name="fake",
+        api_key="",
+        symbol_context_tokens=500,
+    )
+    assistant.llm = Mock()
+    assistant.llm.invoke.return_value.content = "Looks good"
+    after = CHECKOUT.replace(
+        "apply_discount(total, rate)", "apply_discount(total, -rate)"
+    )
+
+    assert assistant.review_changes("checkout.py", CHECKOUT, after) == "Looks good"
+    prompt = assistant.llm.invoke.call_args[0][0][-1].content
+    assert "Related code elsewhere in the repository" in prompt
+    assert "return amount * (1 - rate)" in prompt
+
+
+def age_parsed_blobs(path, days):
+    index = SymbolIndex(".", path)
+    index._connect().execute(
+        "UPDATE parsed_blobs SET parsed_at = ?",
+        (time.time() - days * 86400,),
+    )
+    index._connection.commit()
+    index.close()
+
+
+def refreshed(tmp_path, path, **kwargs):
+    index = SymbolIndex(tmp_path, path, **kwargs)
+    index.refresh()
+    index.close()
+    return index.parsed_blobs
+
+
+def test_index_evicts_old_and_excess_parsed_blobs(tmp_path):
+    make_repo(tmp_path)
+    path = tmp_path / "symbols.sqlite3"
+    assert refreshed(tmp_path, path) == 2
+
+    age_parsed_blobs(path, 10)
+    assert refreshed(tmp_path, path, max_age_days=5) == 2
+    assert refreshed(tmp_path, path, max_entries=1) == 1
+
+    # Loading a stored blob counts as using it, so blobs at HEAD do not expire
+    age_parsed_blobs(path, 10)
+    assert refreshed(tmp_path, path) == 0
+    assert refreshed(tmp_path, path, max_age_days=5) == 0
@@ -0,0 +1,87 @@
+from unittest.mock import Mock
+
+import tiktoken
+
+from ai_review_assistant.tokens import TokenCounter, token_upper_bound
+
+
+def make_counter(**kwargs):
+    encoding = Mock()
+    encoding.encode_ordinary.side_effect = lambda text: text.split()
+    return TokenCounter(lambda: encoding, **kwargs), encoding
+
+
+def test_token_counter_caches_short_and_long_texts():
+    counter, encoding = make_counter()
+    long_text = "word " * 1000
+
+    assert counter.count("two words") == 2
+    assert counter.count("two words") == 2
+    assert counter.count(long_text) == 1000
+    assert counter.count("word " * 1000) == 1000
+
+    assert encoding.encode_ordinary.call_count == 2
+    assert (counter.hits, counter.misses) == (2, 2)
+
+
+def test_token_counter_evicts_least_recently_used_counts():
+    counter, encoding = make_counter(max_entries=2)
+
+    counter.count("a")
+    counter.count("b")
+    counter.count("a")
+    counter.count("c")
+    counter.count("a")
+    counter.count("b")
+
+    assert [call.args[0] for call in encoding.encode_ordinary.call_args_list] == [
+        "a",
+        "b",
+        "c",
+        "b",
+    ]
+
+
+def test_token_counter_encodes_each_uncached_text_once():
+    counter, encoding = make_counter()
+    counter.count("cached text here")
+
+    assert counter.count_batch(["a b", "cached text here", "c", "a b"]) == [
+        2,
+        3,
+        1,
+        2,
+    ]
+    assert [call.args[0] for call in encoding.encode_ordinary.call_args_list] == [
+        "cached text here",
+        "a b",
+        "c",
+    ]
+
+
+def test_token_counter_fits_skips_encoding_under_the_upper_bound():
+    counter, encoding = make_counter()
+
+    assert counter.fits(100, "short", "texts")
+    encoding.encode_ordinary.assert_not_called()
+
+    assert counter.fits(10, "a " * 10)
+    assert not counter.fits(10, "a " * 11)
+    assert encoding.encode_ordinary.call_count == 2
+
+
+def test_token_upper_bound_holds_for_real_encodings():
+    encoding = tiktoken.get_encoding("cl100k_base")
+    counter = TokenCounter(lambda: encoding)
+    texts = [
+        "def f(x):\n    return x + 1\n" * 50,
+        "naïve café — ünïcödé 日本語のテキスト 🎉" * 20,
+        "<|endoftext|> is plain text in reviewed code",
+        "",
+    ]
+
+    for text in texts:
+        assert counter.count(text) <= token_upper_bound(text)
+    assert counter.count_batch(texts) == [
+        len(encoding.encode_ordinary(text)) for text in texts
+    ]
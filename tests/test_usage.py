@@ -0,0 +1,72 @@
+from unittest.mock import Mock, patch
+
+from ai_review_assistant.review import (
+    ANTHROPIC_PROMPT_CACHING_BETA,
+    CodeReviewAssistant,
+)
+from ai_review_assistant.usage import PromptCacheUsage, prompt_cache_usage
+
+
+def test_prompt_cache_usage_reads_vendor_metadata():
+    openai_metadata = {
+        "token_usage": {
+            "prompt_tokens": 2000,
+            "completion_tokens": 100,
+            "prompt_tokens_details": {"cached_tokens": 1536},
+        },
+    }
+    anthropic_metadata = {
+        "usage": {
+            "input_tokens": 300,
+            "output_tokens": 100,
+            "cache_read_input_tokens": 1500,
+            "cache_creation_input_tokens": 0,
+        },
+    }
+
+    assert prompt_cache_usage(openai_metadata) == (2000, 1536, 0)
+    assert prompt_cache_usage(anthropic_metadata) == (1800, 1500, 0)
+    assert prompt_cache_usage({"token_usage": {"prompt_tokens": 10}}) == (10, 0, 0)
+    assert prompt_cache_usage(Mock()) == (0, 0, 0)
+
+    usage = PromptCacheUsage()
+    usage.add(openai_metadata)
+    usage.add(anthropic_metadata)
+    usage.add({"usage": {"input_tokens": 200, "cache_creation_input_tokens": 1000}})
+    assert usage.summary() == (
+        "Prompt cache served 3036 of 5000 prompt tokens (61%), "
+        "1000 tokens written to the cache"
+    )
+
+
+@patch("ai_review_assistant.review.ChatAnthropic")
+def test_system_prompt_is_a_stable_cacheable_prefix(MockChatAnthropic):
+    mock_llm = Mock()
+    mock_llm.invoke.return_value.content = "Mocked review"
+    mock_llm.invoke.return_value.response_metadata = {
+        "usage": {"input_tokens": 50, "cache_read_input_tokens": 1000},
+    }
+    MockChatAnthropic.return_value = mock_llm
+    assistant = CodeReviewAssistant(
+        repo_path=".",
+        vendor_name="anthropic",
+        model_name="claude-3",
+        api_key="test_key",
+        program_language=["Python"],
+    )
+
+    assistant.review_changes("a.py", "a = 1\n", "a = 2\n")
+    assistant.review_changes("b.py", "b = 1\n", "b = 2\n")
+
+    (first_system, first_prompt), (second_system, second_prompt) = (
+        call[0][0] for call in mock_llm.invoke.call_args_list
+    )
+    assert first_system.content == second_system.content
+    assert first_system.content[0]["cache_control"] == {"type": "ephemeral"}
+    assert "a.py" not in first_system.content[0]["text"]
+    assert first_prompt.content.strip().startswith("File being reviewed: a.py")
+    assert second_prompt.content.strip().startswith("File being reviewed: b.py")
+    assert MockChatAnthropic.call_args.kwargs["default_headers"] == {
+        "anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA,
+    }
+    assert assistant.prompt_cache_usage.cached_tokens == 2000